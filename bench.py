@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Optional
+
+from swim_planner_llm.fake_provider import synthesize_plan
+from swim_planner_llm.fallback import build_deterministic_fallback
+from swim_planner_llm.formatter import plan_to_canonical_text
+from swim_planner_llm.history import build_history_profile
+from swim_planner_llm.llm_client import _schema_excerpt, build_user_prompt, summarize_history
+from swim_planner_llm.models import LLMPlanDraft, SwimPlanInput
+from swim_planner_llm.v2.prompts import build_user_prompt_v2
+from swim_planner_llm.v2.router import build_generation_spec_v2
+from swim_planner_llm.validator import enforce_and_normalize, validate_invariants, validate_schema
+
+DEFAULT_BASELINE = Path(__file__).with_name("bench_baseline.json")
+HISTORY_SIZES = (0, 30, 1000)
+HISTORY_TAGS = ("fun", "long", "tiring", "steady", "pace-too-fast", "speed", "technique", "mixed")
+
+# Speed is compared after dividing by a fixed pure-Python workload timed right
+# before each benchmark, so a baseline recorded on one machine still gates runs
+# on a faster or slower one. Timings on shared machines still swing by tens of
+# percent, so the speed gate only trips on large slowdowns; peak allocation is
+# deterministic and gated tightly.
+SPEED_TOLERANCE = 0.5
+ALLOC_TOLERANCE = 0.10
+ALLOC_SLACK_BYTES = 1024
+
+Bench = tuple[str, Callable[[], object]]
+
+
+def _calibration_workload() -> None:
+    values = [(i * 7919) % 1009 for i in range(1000)]
+    json.dumps({"values": sorted(values), "total": sum(values)})
+
+
+def _payload(history_items: int, seed: int = 7) -> SwimPlanInput:
+    rng = random.Random(seed)
+    history = []
+    for idx in range(history_items):
+        past = SwimPlanInput.model_validate(
+            {
+                "session_requested": {
+                    "duration_minutes": rng.choice((20, 30, 45)),
+                    "effort": rng.choice(("easy", "medium", "hard")),
+                }
+            }
+        )
+        history.append(
+            {
+                "session_plan": synthesize_plan(past, rng.choice(("v1", "v2")), rng).model_dump(mode="json"),
+                "thumb": int(idx % 3 != 0),
+                "tags": rng.sample(HISTORY_TAGS, 2),
+            }
+        )
+    return SwimPlanInput.model_validate(
+        {
+            "session_requested": {"duration_minutes": 30, "effort": "medium", "requested_tags": ["fun"]},
+            "historic_sessions": history,
+        }
+    )
+
+
+def _cold(payload: SwimPlanInput) -> SwimPlanInput:
+    # history_profile is cached on the payload; drop it so every call digests
+    # the history the way a fresh request does.
+    payload.__dict__.pop("history_profile", None)
+    return payload
+
+
+def build_benchmarks() -> list[Bench]:
+    benches: list[Bench] = []
+    schema = _schema_excerpt()
+    for size in HISTORY_SIZES:
+        payload = _payload(size)
+        summary = summarize_history(payload.historic_sessions)
+        spec = build_generation_spec_v2(payload)
+        benches.append((f"build_history_profile[{size}]", lambda p=payload: build_history_profile(p.historic_sessions)))
+        benches.append((f"summarize_history[{size}]", lambda p=payload: summarize_history(p.historic_sessions)))
+        benches.append(
+            (f"build_user_prompt[{size}]", lambda p=payload, s=summary: build_user_prompt(_cold(p), schema, s))
+        )
+        benches.append(
+            (
+                f"build_user_prompt_v2[{size}]",
+                lambda p=payload, s=summary, sp=spec: build_user_prompt_v2(_cold(p), s, sp),
+            )
+        )
+
+    payload_1000 = _payload(1000)
+
+    payload = _payload(30)
+    spec = build_generation_spec_v2(payload)
+    req = payload.session_requested
+    plan_v1 = synthesize_plan(payload, "v1", random.Random(1))
+    plan_v2 = synthesize_plan(payload, "v2", random.Random(1))
+    draft = LLMPlanDraft.model_validate(plan_v1.model_dump(mode="json"))
+    history = payload.history_profile
+    benches += [
+        ("build_generation_spec_v2[30]", lambda: build_generation_spec_v2(_cold(payload))),
+        ("build_generation_spec_v2[1000]", lambda: build_generation_spec_v2(_cold(payload_1000))),
+        ("enforce_and_normalize", lambda: enforce_and_normalize(draft, req, 42)),
+        ("validate_schema", lambda: validate_schema(plan_v1)),
+        ("validate_invariants[v1]", lambda: validate_invariants(plan_v1, req, history, [], version="v1")),
+        (
+            "validate_invariants[v2]",
+            lambda: validate_invariants(plan_v2, req, history, [], version="v2", v2_spec=spec),
+        ),
+        ("plan_to_canonical_text", lambda: plan_to_canonical_text(plan_v1)),
+        ("build_deterministic_fallback[30]", lambda: build_deterministic_fallback(_cold(payload), 42)),
+    ]
+    return benches
+
+
+def _ops_per_sec(fn: Callable[[], object], repeat: int, min_time_s: float) -> float:
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    if elapsed < min_time_s:
+        number = max(1, int(number * min_time_s / max(elapsed, 1e-9)))
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return number / best
+
+
+def _peak_bytes(fn: Callable[[], object]) -> int:
+    fn()  # warm lru caches and lazy imports outside the trace
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - current
+
+
+def run(benches: list[Bench], *, repeat: int, min_time_s: float) -> dict:
+    calibrations = []
+    results = {}
+    for name, fn in benches:
+        # Calibrate next to each benchmark so CPU frequency drift during the
+        # run cancels out of relative_speed.
+        calibration = _ops_per_sec(_calibration_workload, repeat, min_time_s)
+        ops = _ops_per_sec(fn, repeat, min_time_s)
+        calibrations.append(calibration)
+        results[name] = {
+            "ops_per_sec": round(ops, 1),
+            "relative_speed": round(ops / calibration, 6),
+            "peak_bytes": _peak_bytes(fn),
+        }
+    mean_calibration = sum(calibrations) / len(calibrations) if calibrations else 0.0
+    return {"python": sys.version.split()[0], "calibration_ops_per_sec": round(mean_calibration, 1), "results": results}
+
+
+def compare(current: dict, baseline: dict, *, speed_tolerance: float, alloc_tolerance: float) -> list[str]:
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        floor = base["relative_speed"] * (1 - speed_tolerance)
+        if result["relative_speed"] < floor:
+            regressions.append(
+                f"{name}: relative speed {result['relative_speed']:.4g} < {floor:.4g} "
+                f"(baseline {base['relative_speed']:.4g})"
+            )
+        ceiling = base["peak_bytes"] * (1 + alloc_tolerance) + ALLOC_SLACK_BYTES
+        if result["peak_bytes"] > ceiling:
+            regressions.append(f"{name}: peak {result['peak_bytes']} B > {int(ceiling)} B (baseline {base['peak_bytes']} B)")
+    return regressions
+
+
+def format_report(current: dict, baseline: Optional[dict]) -> str:
+    lines = [
+        f"python {current['python']}, calibration {current['calibration_ops_per_sec']:.0f} ops/s",
+        f"{'benchmark':<34} {'ops/s':>12} {'peak KiB':>10} {'vs baseline':>12}",
+    ]
+    for name, result in current["results"].items():
+        base = (baseline or {}).get("results", {}).get(name)
+        delta = f"{result['relative_speed'] / base['relative_speed'] - 1:+.1%}" if base else "new"
+        lines.append(f"{name:<34} {result['ops_per_sec']:>12.1f} {result['peak_bytes'] / 1024:>10.1f} {delta:>12}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the CPU-bound plan pipeline stages.")
+    parser.add_argument("-k", "--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--speed-tolerance", type=float, default=SPEED_TOLERANCE)
+    parser.add_argument("--alloc-tolerance", type=float, default=ALLOC_TOLERANCE)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timing repeat")
+    parser.add_argument("--output", type=Path, help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    benches = [b for b in build_benchmarks() if args.filter in b[0]]
+    current = run(benches, repeat=args.repeat, min_time_s=args.min_time)
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else None
+
+    report = format_report(current, baseline)
+    regressions = []
+    if args.update_baseline:
+        merged = current
+        if baseline is not None and args.filter:
+            merged = {**current, "results": {**baseline.get("results", {}), **current["results"]}}
+        args.baseline.write_text(json.dumps(merged, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        report += f"\nbaseline written to {args.baseline}"
+    elif baseline is not None:
+        regressions = compare(
+            current, baseline, speed_tolerance=args.speed_tolerance, alloc_tolerance=args.alloc_tolerance
+        )
+        report += "\n" + ("\n".join(["REGRESSIONS:"] + regressions) if regressions else "no regressions")
+
+    print(report)
+    if args.output is not None:
+        args.output.write_text(report + "\n", encoding="utf-8")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,44 @@
+from .batches import BatchJob, generate_swim_plans_batch
+from .bulk import generate_swim_plans, generate_swim_plans_async
+from .cache import MemoryPlanCache, SQLitePlanCache
+from .cassette import register_cassette_provider
+from .fake_provider import FakeProviderConfig, LatencyModel, register_fake_provider
 from .formatter import plan_to_canonical_text
+from .hedging import HedgeBranch, HedgePolicy
+from .history import HistoryProfile, update_history_summary
+from .metrics import disable_metrics, enable_metrics, failure_code, metrics_snapshot, render_prometheus
 from .models import SwimPlanResponse
-from .wrapper import generate_swim_plan
+from .providers import Provider, register_provider
+from .tracing import JsonlTracer, OpenTelemetryTracer, set_tracer
+from .wrapper import generate_swim_plan, generate_swim_plan_async
 
-__all__ = ["generate_swim_plan", "plan_to_canonical_text", "SwimPlanResponse"]
+__all__ = [
+    "BatchJob",
+    "disable_metrics",
+    "enable_metrics",
+    "failure_code",
+    "FakeProviderConfig",
+    "generate_swim_plan",
+    "generate_swim_plan_async",
+    "generate_swim_plans",
+    "generate_swim_plans_async",
+    "generate_swim_plans_batch",
+    "HedgeBranch",
+    "HedgePolicy",
+    "HistoryProfile",
+    "JsonlTracer",
+    "LatencyModel",
+    "MemoryPlanCache",
+    "metrics_snapshot",
+    "OpenTelemetryTracer",
+    "plan_to_canonical_text",
+    "Provider",
+    "register_cassette_provider",
+    "register_fake_provider",
+    "register_provider",
+    "render_prometheus",
+    "set_tracer",
+    "SQLitePlanCache",
+    "SwimPlanResponse",
+    "update_history_summary",
+]
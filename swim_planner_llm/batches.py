@@ -0,0 +1,439 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional, Protocol, Sequence, Union
+from uuid import uuid4
+
+from .bulk import PlanResult
+from .llm_client import OUTPUT_FORMATS, PLAN_TOOL_NAME
+from .llm_client_claude import (
+    _call_options,
+    _claude_model,
+    _plan_prompts,
+    _record_usage,
+    _repair_prompts,
+    _response_text,
+    _sync_client,
+    _tool_input,
+    _user_content,
+    plan_tool,
+)
+from .models import SwimPlanInput, SwimPlanResponse
+from .validator import ValidationIssue, Violation
+from .v2.router import build_generation_spec_v2
+from .wrapper import _build_valid_plan_from_llm, _generation_failed, _raw_text
+
+# (custom_id, message or None, error text or None) for one batch request.
+BatchItemResult = tuple[str, Any, Optional[str]]
+
+# How far before a lost submit() a batch may be stamped and still be matched
+# to it (clock skew between this host and the API).
+SUBMIT_LOOKBACK_S = 300.0
+
+
+class BatchEndpoint(Protocol):
+    def submit(self, requests: list[dict]) -> str: ...
+
+    def status(self, batch_id: str) -> str: ...
+
+    def results(self, batch_id: str) -> Iterator[BatchItemResult]: ...
+
+    def list_batches(self, created_after: float) -> Iterator[tuple[str, str]]:
+        """(batch id, status) of batches created at or after the given epoch time."""
+        ...
+
+
+class AnthropicBatchEndpoint:
+    """Message Batches API on the pooled Anthropic client."""
+
+    def __init__(self, client: Any = None) -> None:
+        self._client = client
+
+    def _batches(self):
+        client = self._client if self._client is not None else _sync_client(None)
+        return client.messages.batches
+
+    def submit(self, requests: list[dict]) -> str:
+        return self._batches().create(requests=requests).id
+
+    def status(self, batch_id: str) -> str:
+        return self._batches().retrieve(batch_id).processing_status
+
+    def list_batches(self, created_after: float) -> Iterator[tuple[str, str]]:
+        # Newest first, so paging stops at the first batch that is too old.
+        for batch in self._batches().list(limit=100):
+            if batch.created_at.timestamp() < created_after:
+                return
+            yield batch.id, batch.processing_status
+
+    def results(self, batch_id: str) -> Iterator[BatchItemResult]:
+        for entry in self._batches().results(batch_id):
+            result = entry.result
+            if result.type == "succeeded":
+                yield entry.custom_id, result.message, None
+            else:
+                error = getattr(getattr(result, "error", None), "error", None)
+                detail = getattr(error, "message", None)
+                yield entry.custom_id, None, f"batch request {result.type}" + (f": {detail}" if detail else "")
+
+
+class LocalBatchEndpoint:
+    """
+    Stand-in endpoint that runs every request through create(**params) at
+    submit time. Batches live in memory only, so a resumed job needs the
+    real endpoint (or a resubmit).
+    """
+
+    def __init__(self, create: Optional[Callable[..., Any]] = None) -> None:
+        self._create = create
+        self._batches: dict[str, list[BatchItemResult]] = {}
+        self._created_at: dict[str, float] = {}
+
+    def submit(self, requests: list[dict]) -> str:
+        create = self._create or _sync_client(None).messages.create
+        results: list[BatchItemResult] = []
+        for request in requests:
+            try:
+                results.append((request["custom_id"], create(**request["params"]), None))
+            except Exception as exc:
+                results.append((request["custom_id"], None, str(exc)))
+        batch_id = f"local_{uuid4().hex}"
+        self._batches[batch_id] = results
+        self._created_at[batch_id] = time.time()
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        if batch_id not in self._batches:
+            raise KeyError(f"unknown local batch '{batch_id}'")
+        return "ended"
+
+    def results(self, batch_id: str) -> Iterator[BatchItemResult]:
+        return iter(self._batches[batch_id])
+
+    def list_batches(self, created_after: float) -> Iterator[tuple[str, str]]:
+        for batch_id, created_at in self._created_at.items():
+            if created_at >= created_after:
+                yield batch_id, "ended"
+
+
+def _request_params(system: str, user, output_format: str, max_tokens: int) -> dict:
+    tools = [plan_tool()] if output_format == "tool" else []
+    params: dict[str, Any] = {
+        "model": _claude_model(),
+        "max_tokens": max_tokens,
+        "system": system,
+        "messages": [{"role": "user", "content": _user_content(user, system, tools)}],
+    }
+    if tools:
+        params["tools"] = tools
+        params["tool_choice"] = {"type": "tool", "name": PLAN_TOOL_NAME}
+    return params
+
+
+def _message_output(message: Any, output_format: str, labels: dict[str, str]) -> Union[str, dict]:
+    _record_usage(message, labels)
+    if output_format == "tool":
+        return _tool_input(message)
+    return _response_text(message)
+
+
+class BatchJob:
+    """
+    Batch generation of many plans with one repair batch for the failures.
+
+    The job state (payloads, batch ids, per-item outcomes) is written to a JSON
+    file after every transition, so BatchJob.load() resumes a job after a
+    restart without resubmitting batches that are already in flight.
+
+    Stages: new -> plan_submitting -> plan_submitted ->
+    [repair_submitting -> repair_submitted ->] done.
+
+    A *_submitting stage is saved before submit() is called, so a crash
+    between the API accepting a batch and the batch id reaching the file is
+    detected on resume. The job then looks for a batch created since that
+    submit whose custom_ids (unique per job) are exactly the ones it sent and
+    adopts it. A candidate batch that has not ended yet cannot be checked, so
+    the job waits for it; only when no candidate can be ours is the batch
+    submitted again.
+    """
+
+    def __init__(self, path: Union[str, Path], state: dict, endpoint: Optional[BatchEndpoint] = None) -> None:
+        self.path = Path(path)
+        self.state = state
+        self.endpoint = endpoint if endpoint is not None else AnthropicBatchEndpoint()
+
+    @classmethod
+    def create(
+        cls,
+        path: Union[str, Path],
+        payloads: Sequence[dict],
+        *,
+        version: str = "v1",
+        seed: Optional[int] = None,
+        output_format: str = "json",
+        endpoint: Optional[BatchEndpoint] = None,
+    ) -> BatchJob:
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output_format '{output_format}'. Use one of {list(OUTPUT_FORMATS)}.")
+        job_id = uuid4().hex[:12]
+        items = {}
+        for idx, payload in enumerate(payloads):
+            parsed = SwimPlanInput.model_validate(payload)
+            items[f"{job_id}-{idx}"] = {
+                "payload": parsed.model_dump(mode="json"),
+                "status": "pending",
+                "plan": None,
+                "raw": None,
+                "error": None,
+                "violations": [],
+            }
+        state = {
+            "job_id": job_id,
+            "version": version,
+            "seed": seed,
+            "output_format": output_format,
+            "stage": "new",
+            "plan_batch_id": None,
+            "repair_batch_id": None,
+            "submitting": None,
+            "items": items,
+        }
+        job = cls(path, state, endpoint)
+        job._save()
+        return job
+
+    @classmethod
+    def load(cls, path: Union[str, Path], *, endpoint: Optional[BatchEndpoint] = None) -> BatchJob:
+        with open(path, encoding="utf-8") as fh:
+            return cls(path, json.load(fh), endpoint)
+
+    @property
+    def stage(self) -> str:
+        return self.state["stage"]
+
+    @property
+    def done(self) -> bool:
+        return self.stage == "done"
+
+    def _save(self) -> None:
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(self.state, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def _payload(self, item: dict) -> SwimPlanInput:
+        return SwimPlanInput.model_validate(item["payload"])
+
+    def _plan_requests(self, custom_ids: list[str]) -> list[dict]:
+        requests = []
+        version = self.state["version"]
+        output_format = self.state["output_format"]
+        for custom_id in custom_ids:
+            item = self.state["items"][custom_id]
+            payload = self._payload(item)
+            system, user = _plan_prompts(payload, version, output_format)
+            max_tokens = _call_options(payload, version, output_format, "plan")["max_tokens"]
+            requests.append({"custom_id": custom_id, "params": _request_params(system, user, output_format, max_tokens)})
+        return requests
+
+    def _repair_requests(self, custom_ids: list[str]) -> list[dict]:
+        version = self.state["version"]
+        output_format = self.state["output_format"]
+        requests = []
+        for custom_id in custom_ids:
+            item = self.state["items"][custom_id]
+            payload = self._payload(item)
+            system, user = _repair_prompts(
+                payload,
+                item["raw"] or "<empty>",
+                item["error"] or "unknown validation failure",
+                version,
+                [Violation(**v) for v in item["violations"]],
+                output_format,
+            )
+            max_tokens = _call_options(payload, version, output_format, "repair")["max_tokens"]
+            requests.append({"custom_id": custom_id, "params": _request_params(system, user, output_format, max_tokens)})
+        return requests
+
+    def _collect(self, batch_id: str) -> list[str]:
+        """Validate every result of a batch; returns the ids that still failed."""
+        version = self.state["version"]
+        output_format = self.state["output_format"]
+        failed: list[str] = []
+        seen: set[str] = set()
+
+        for custom_id, message, error in self.endpoint.results(batch_id):
+            item = self.state["items"].get(custom_id)
+            if item is None:
+                continue
+            seen.add(custom_id)
+            payload = self._payload(item)
+            call = "repair" if item["status"] == "repair_submitted" else "plan"
+            violations: tuple[Violation, ...] = ()
+            raw: Union[str, dict, None] = None
+            try:
+                if message is None:
+                    raise RuntimeError(error or "batch request failed")
+                raw = _message_output(message, output_format, _call_options(payload, version, output_format, call)["labels"])
+                plan, _ = _build_valid_plan_from_llm(
+                    raw,
+                    payload,
+                    self.state["seed"],
+                    version=version,
+                    v2_spec=build_generation_spec_v2(payload) if version == "v2" else None,
+                    output_format=output_format,
+                )
+            except Exception as exc:
+                if isinstance(exc, ValidationIssue):
+                    violations = exc.violations
+                if item["status"] == "repair_submitted":
+                    item["error"] = str(_generation_failed(item["error"], exc))
+                else:
+                    item["error"] = str(exc)
+                if raw is not None:
+                    item["raw"] = _raw_text(raw)
+                item["violations"] = [asdict(v) for v in violations]
+                failed.append(custom_id)
+                continue
+            item["plan"] = plan.model_dump(mode="json")
+            item["status"] = "valid"
+
+        for custom_id, item in self.state["items"].items():
+            if item["status"] in ("plan_submitted", "repair_submitted") and custom_id not in seen:
+                item["error"] = item["error"] or "missing from batch results"
+                failed.append(custom_id)
+        return failed
+
+    def _submit(self, call: str, custom_ids: list[str]) -> None:
+        for custom_id in custom_ids:
+            self.state["items"][custom_id]["status"] = f"{call}_submitted"
+        self.state["stage"] = f"{call}_submitting"
+        self.state["submitting"] = {"custom_ids": custom_ids, "started_at": time.time()}
+        self._save()
+        requests = self._plan_requests(custom_ids) if call == "plan" else self._repair_requests(custom_ids)
+        self._submitted(call, self.endpoint.submit(requests))
+
+    def _submitted(self, call: str, batch_id: str) -> None:
+        self.state[f"{call}_batch_id"] = batch_id
+        self.state["stage"] = f"{call}_submitted"
+        self.state["submitting"] = None
+        self._save()
+
+    def _find_submitted(self) -> tuple[Optional[str], bool]:
+        """(batch id of a submit lost before it was saved, whether any candidate is still undecided)."""
+        submitting = self.state["submitting"]
+        wanted = set(submitting["custom_ids"])
+        known = {self.state["plan_batch_id"], self.state["repair_batch_id"]}
+        undecided = False
+        for batch_id, status in self.endpoint.list_batches(submitting["started_at"] - SUBMIT_LOOKBACK_S):
+            if batch_id in known:
+                continue
+            if status != "ended":
+                undecided = True
+                continue
+            if {custom_id for custom_id, _, _ in self.endpoint.results(batch_id)} == wanted:
+                return batch_id, False
+        return None, undecided
+
+    def _resume_submit(self, call: str) -> bool:
+        batch_id, undecided = self._find_submitted()
+        if batch_id is not None:
+            self._submitted(call, batch_id)
+        elif not undecided:
+            self._submit(call, self.state["submitting"]["custom_ids"])
+        return False
+
+    def step(self) -> bool:
+        """Advance the job as far as it can go without waiting; True once done."""
+        stage = self.stage
+        if stage == "new":
+            self._submit("plan", list(self.state["items"]))
+            return False
+
+        if stage in ("plan_submitting", "repair_submitting"):
+            return self._resume_submit(stage[: -len("_submitting")])
+
+        if stage == "plan_submitted":
+            if self.endpoint.status(self.state["plan_batch_id"]) != "ended":
+                return False
+            failed = self._collect(self.state["plan_batch_id"])
+            if failed:
+                self._submit("repair", failed)
+                return False
+            self.state["stage"] = "done"
+            self._save()
+            return True
+
+        if stage == "repair_submitted":
+            if self.endpoint.status(self.state["repair_batch_id"]) != "ended":
+                return False
+            for custom_id in self._collect(self.state["repair_batch_id"]):
+                self.state["items"][custom_id]["status"] = "failed"
+            self.state["stage"] = "done"
+            self._save()
+
+        return self.done
+
+    def run(self, *, poll_interval_s: float = 30.0, max_wait_s: Optional[float] = None) -> list[PlanResult]:
+        """
+        Drive the job to completion. With max_wait_s set, a job that is still
+        running raises TimeoutError; its state is saved, so run() can be called
+        again later.
+        """
+        deadline = time.monotonic() + max_wait_s if max_wait_s is not None else None
+        while not self.step():
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"batch job still at stage '{self.stage}'")
+            time.sleep(poll_interval_s)
+        return self.results()
+
+    def results(self) -> list[PlanResult]:
+        """Plans in payload order; items that failed (or are unfinished) hold a ValidationIssue."""
+        out: list[PlanResult] = []
+        for item in self.state["items"].values():
+            if item["status"] == "valid":
+                out.append(SwimPlanResponse.model_validate(item["plan"]))
+            else:
+                out.append(ValidationIssue(item["error"] or f"batch item not finished ({item['status']})"))
+        return out
+
+
+def generate_swim_plans_batch(
+    payloads: Sequence[dict],
+    state_path: Union[str, Path],
+    *,
+    version: str = "v1",
+    seed: Optional[int] = None,
+    output_format: str = "json",
+    endpoint: Optional[BatchEndpoint] = None,
+    poll_interval_s: float = 30.0,
+    max_wait_s: Optional[float] = None,
+) -> list[PlanResult]:
+    """
+    Generate plans through the Message Batches API. An existing state file at
+    state_path is resumed (payloads and settings then come from the file).
+    """
+    if Path(state_path).exists():
+        job = BatchJob.load(state_path, endpoint=endpoint)
+    else:
+        job = BatchJob.create(
+            state_path,
+            payloads,
+            version=version,
+            seed=seed,
+            output_format=output_format,
+            endpoint=endpoint,
+        )
+    return job.run(poll_interval_s=poll_interval_s, max_wait_s=max_wait_s)
+
+
+__all__ = [
+    "AnthropicBatchEndpoint",
+    "BatchEndpoint",
+    "BatchJob",
+    "LocalBatchEndpoint",
+    "generate_swim_plans_batch",
+]
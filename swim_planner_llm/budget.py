@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import math
+from typing import Optional
+
+from .llm_client import _requested_tags
+from .models import SwimPlanInput
+from .style_inference import infer_prefer_varied_from_payload
+from .v2.types import GenerationSpecV2
+
+# Output tokens per plan step, and per plan for ids, titles and section
+# wrappers, by output format. Measured on typical plans; descriptions included.
+_STEP_TOKENS = {"json": 140, "tool": 120, "dsl": 35}
+_PLAN_OVERHEAD_TOKENS = {"json": 160, "tool": 120, "dsl": 30}
+
+BUDGET_HEADROOM = 1.5
+MIN_MAX_TOKENS = 512
+MAX_MAX_TOKENS = 4096
+
+
+def expected_step_count(
+    payload: SwimPlanInput,
+    version: str,
+    spec: Optional[GenerationSpecV2] = None,
+) -> int:
+    if version == "v2" and spec is not None:
+        blueprint = spec.blueprint
+        return blueprint.warm_up.steps + blueprint.main_set.steps + blueprint.cool_down.steps
+
+    # v1 caps warm_up and cool_down at 2 steps each; the main set is a 3-5
+    # step drill circuit for technique, 2-3 steps when varied, otherwise ~2.
+    if "technique" in _requested_tags(payload):
+        main_steps = 5
+    elif infer_prefer_varied_from_payload(payload):
+        main_steps = 3
+    else:
+        main_steps = 2
+    return 2 + main_steps + 2
+
+
+def estimate_max_tokens(
+    payload: SwimPlanInput,
+    version: str,
+    output_format: str = "json",
+    spec: Optional[GenerationSpecV2] = None,
+) -> int:
+    """max_tokens for one plan: the expected output size plus headroom, clamped."""
+    steps = expected_step_count(payload, version, spec)
+    expected = _PLAN_OVERHEAD_TOKENS[output_format] + steps * _STEP_TOKENS[output_format]
+    return max(MIN_MAX_TOKENS, min(MAX_MAX_TOKENS, math.ceil(expected * BUDGET_HEADROOM)))
+
+
+def usage_labels(
+    payload: SwimPlanInput,
+    version: str,
+    call: str,
+    spec: Optional[GenerationSpecV2] = None,
+) -> dict[str, str]:
+    """Labels for token accounting: v2 by archetype, v1 by inferred style."""
+    if version == "v2" and spec is not None:
+        archetype = spec.archetype.archetype_id
+    else:
+        archetype = "varied" if infer_prefer_varied_from_payload(payload) else "straightforward"
+    return {"version": version, "archetype": archetype, "call": call}
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Optional, Sequence, Union
+
+from .models import SwimPlanResponse
+from .wrapper import generate_swim_plan_async
+
+PlanResult = Union[SwimPlanResponse, Exception]
+
+
+async def generate_swim_plans_async(
+    payloads: Sequence[dict],
+    *,
+    max_concurrency: int = 8,
+    version: str = "v1",
+    seed: Optional[int] = None,
+    provider: str = "claude",
+) -> list[PlanResult]:
+    """
+    Generate one plan per payload with at most max_concurrency generations in
+    flight. Results keep the input order; a failed item holds its exception
+    instead of aborting the whole batch.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be >= 1")
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _one(payload: dict) -> PlanResult:
+        async with semaphore:
+            try:
+                return await generate_swim_plan_async(
+                    payload,
+                    seed,
+                    provider,
+                    version=version,
+                )
+            except Exception as exc:
+                return exc
+
+    return list(await asyncio.gather(*(_one(p) for p in payloads)))
+
+
+def generate_swim_plans(
+    payloads: Sequence[dict],
+    *,
+    max_concurrency: int = 8,
+    version: str = "v1",
+    seed: Optional[int] = None,
+    provider: str = "claude",
+) -> list[PlanResult]:
+    return asyncio.run(
+        generate_swim_plans_async(
+            payloads,
+            max_concurrency=max_concurrency,
+            version=version,
+            seed=seed,
+            provider=provider,
+        )
+    )
+
+
+__all__ = ["PlanResult", "generate_swim_plans", "generate_swim_plans_async"]
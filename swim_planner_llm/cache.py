@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import hashlib
+import inspect
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Union
+
+from . import budget, dsl, formatter, history, llm_client, llm_client_claude, models, repair, style_inference, validator
+from .fallback import _canonical_payload_json
+from .llm_client_claude import _claude_model
+from .models import SwimPlanInput, SwimPlanResponse
+from .v2 import archetypes, blueprint, prompts, router
+
+# Every module whose source shapes the prompt text, the request options (token
+# budget, tool schema) or the acceptance rules for a plan. Editing any of them
+# changes the fingerprint and retires old entries.
+_FINGERPRINT_MODULES = (
+    llm_client,
+    llm_client_claude,
+    budget,
+    models,
+    history,
+    dsl,
+    formatter,
+    prompts,
+    archetypes,
+    blueprint,
+    router,
+    style_inference,
+    validator,
+    repair,
+)
+
+
+@lru_cache(maxsize=1)
+def prompt_fingerprint() -> str:
+    digest = hashlib.sha256()
+    for module in _FINGERPRINT_MODULES:
+        digest.update(module.__name__.encode("utf-8"))
+        try:
+            digest.update(inspect.getsource(module).encode("utf-8"))
+        except OSError:
+            # No source on disk (e.g. bytecode-only deploy): fall back to the
+            # compiled module file so a redeploy still changes the fingerprint.
+            digest.update(Path(module.__file__ or "").read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def plan_cache_key(
+    payload: SwimPlanInput,
+    seed: int,
+    version: str,
+    output_format: str = "json",
+    provider: str = "claude",
+) -> str:
+    parts = (
+        _canonical_payload_json(payload),
+        str(seed),
+        version,
+        output_format,
+        provider,
+        _claude_model(),
+        prompt_fingerprint(),
+    )
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class PlanCache:
+    """Base class for plan caches; backends implement _get/_set and keep stats here."""
+
+    def __init__(self) -> None:
+        self.stats = CacheStats()
+        self._stats_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[SwimPlanResponse]:
+        plan = self._get(key)
+        with self._stats_lock:
+            if plan is None:
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+        return plan
+
+    def set(self, key: str, plan: SwimPlanResponse) -> None:
+        self._set(key, plan)
+        with self._stats_lock:
+            self.stats.writes += 1
+
+    def _record_evictions(self, count: int) -> None:
+        if count:
+            with self._stats_lock:
+                self.stats.evictions += count
+
+    def _get(self, key: str) -> Optional[SwimPlanResponse]:
+        raise NotImplementedError
+
+    def _set(self, key: str, plan: SwimPlanResponse) -> None:
+        raise NotImplementedError
+
+
+class MemoryPlanCache(PlanCache):
+    def __init__(self, max_entries: int = 1024, ttl_s: Optional[float] = 3600.0) -> None:
+        super().__init__()
+        if max_entries < 1:
+            raise ValueError("max_entries must be >= 1")
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, SwimPlanResponse]] = OrderedDict()
+
+    def _get(self, key: str) -> Optional[SwimPlanResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, plan = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._record_evictions(1)
+                return None
+            self._entries.move_to_end(key)
+        return plan.model_copy(deep=True)
+
+    def _set(self, key: str, plan: SwimPlanResponse) -> None:
+        expires_at = time.monotonic() + self.ttl_s if self.ttl_s is not None else float("inf")
+        with self._lock:
+            self._entries[key] = (expires_at, plan.model_copy(deep=True))
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        self._record_evictions(evicted)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLitePlanCache(PlanCache):
+    """
+    On-disk cache shared across processes on one host. Rows written under a
+    different prompt fingerprint are purged when the cache is opened. Every
+    prune_every writes, expired rows are deleted and the oldest rows beyond
+    max_entries are trimmed, so the file stops growing once full.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        ttl_s: Optional[float] = 7 * 24 * 3600.0,
+        max_entries: Optional[int] = 100_000,
+        prune_every: int = 100,
+    ) -> None:
+        super().__init__()
+        if max_entries is not None and max_entries < 1:
+            raise ValueError("max_entries must be >= 1")
+        if prune_every < 1:
+            raise ValueError("prune_every must be >= 1")
+        self.path = Path(path)
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self._writes_since_prune = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS plan_cache ("
+                "key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, "
+                "plan_json TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS plan_cache_created_at ON plan_cache (created_at)")
+            cursor = self._conn.execute(
+                "DELETE FROM plan_cache WHERE fingerprint != ?",
+                (prompt_fingerprint(),),
+            )
+        self._record_evictions(cursor.rowcount)
+        self.prune()
+
+    def prune(self) -> int:
+        """Deletes expired rows and the oldest rows over max_entries; returns how many went."""
+        evicted = 0
+        with self._lock, self._conn:
+            if self.ttl_s is not None:
+                cursor = self._conn.execute(
+                    "DELETE FROM plan_cache WHERE created_at < ?",
+                    (time.time() - self.ttl_s,),
+                )
+                evicted += cursor.rowcount
+            if self.max_entries is not None:
+                (count,) = self._conn.execute("SELECT COUNT(*) FROM plan_cache").fetchone()
+                if count > self.max_entries:
+                    cursor = self._conn.execute(
+                        "DELETE FROM plan_cache WHERE key IN "
+                        "(SELECT key FROM plan_cache ORDER BY created_at LIMIT ?)",
+                        (count - self.max_entries,),
+                    )
+                    evicted += cursor.rowcount
+            self._writes_since_prune = 0
+        self._record_evictions(evicted)
+        return evicted
+
+    def _get(self, key: str) -> Optional[SwimPlanResponse]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT plan_json, created_at FROM plan_cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            plan_json, created_at = row
+            if self.ttl_s is not None and created_at + self.ttl_s < time.time():
+                with self._conn:
+                    self._conn.execute("DELETE FROM plan_cache WHERE key = ?", (key,))
+                self._record_evictions(1)
+                return None
+        return SwimPlanResponse.model_validate_json(plan_json)
+
+    def _set(self, key: str, plan: SwimPlanResponse) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO plan_cache (key, fingerprint, plan_json, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, prompt_fingerprint(), plan.model_dump_json(), time.time()),
+            )
+            self._writes_since_prune += 1
+            due = self._writes_since_prune >= self.prune_every
+        if due:
+            self.prune()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,438 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterator, Optional, Sequence, Union
+
+from .fallback import _canonical_payload_json
+from .llm_client_claude import UserPrompt, _claude_model, _plan_prompts, _repair_prompts
+from .models import SwimPlanInput
+from .providers import Provider, get_provider, register_provider
+from .streaming import StreamAborted
+from .validator import Violation
+
+CASSETTE_MODES = ("record", "replay", "auto")
+CASSETTE_MATCHES = ("prompt", "request")
+
+
+class CassetteMiss(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class Interaction:
+    call: str
+    version: str
+    output_format: str
+    model: str
+    system: str
+    user: str
+    # Model output as returned (text, or the tool input dict); for a stream
+    # that was aborted, the partial text.
+    response: Union[str, dict, None]
+    error: Optional[str]
+    error_type: Optional[str]
+    elapsed_s: float
+    recorded_at: float
+
+
+def _user_text(user: UserPrompt) -> str:
+    return "".join(user) if isinstance(user, tuple) else user
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    SQLite file of recorded prompt/response pairs. Each interaction is indexed
+    both by the exact prompt (plus request seed) it was sent with and by the
+    request that produced the prompt (payload, seed, version, format), so
+    prompt edits can still be replayed against the recorded responses.
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS interactions ("
+                "prompt_key TEXT PRIMARY KEY, request_key TEXT NOT NULL, "
+                "call TEXT NOT NULL, version TEXT NOT NULL, output_format TEXT NOT NULL, "
+                "model TEXT NOT NULL, system TEXT NOT NULL, user TEXT NOT NULL, "
+                "response TEXT, response_is_json INTEGER NOT NULL, "
+                "error TEXT, error_type TEXT, elapsed_s REAL NOT NULL, recorded_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS interactions_request_key ON interactions (request_key, recorded_at)"
+            )
+
+    _COLUMNS = (
+        "call, version, output_format, model, system, user, "
+        "response, response_is_json, error, error_type, elapsed_s, recorded_at"
+    )
+
+    @staticmethod
+    def _interaction(row: tuple) -> Interaction:
+        call, version, output_format, model, system, user, response, is_json, error, error_type, elapsed_s, recorded_at = row
+        if response is not None and is_json:
+            response = json.loads(response)
+        return Interaction(
+            call, version, output_format, model, system, user, response, error, error_type, elapsed_s, recorded_at
+        )
+
+    def get(self, key: str, *, match: str = "prompt") -> Optional[Interaction]:
+        if match == "prompt":
+            query = f"SELECT {self._COLUMNS} FROM interactions WHERE prompt_key = ?"
+        else:
+            # Latest recording wins when several prompt versions share a request.
+            query = f"SELECT {self._COLUMNS} FROM interactions WHERE request_key = ? ORDER BY recorded_at DESC LIMIT 1"
+        with self._lock:
+            row = self._conn.execute(query, (key,)).fetchone()
+        return self._interaction(row) if row is not None else None
+
+    def put(self, prompt_key: str, request_key: str, interaction: Interaction) -> None:
+        response = interaction.response
+        is_json = isinstance(response, dict)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO interactions (prompt_key, request_key, "
+                f"{self._COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    prompt_key,
+                    request_key,
+                    interaction.call,
+                    interaction.version,
+                    interaction.output_format,
+                    interaction.model,
+                    interaction.system,
+                    interaction.user,
+                    json.dumps(response) if is_json else response,
+                    int(is_json),
+                    interaction.error,
+                    interaction.error_type,
+                    interaction.elapsed_s,
+                    interaction.recorded_at,
+                ),
+            )
+
+    def interactions(self) -> Iterator[Interaction]:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {self._COLUMNS} FROM interactions ORDER BY recorded_at").fetchall()
+        return (self._interaction(row) for row in rows)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM interactions").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+@dataclass(frozen=True)
+class _Request:
+    call: str
+    version: str
+    output_format: str
+    model: str
+    system: str
+    user: str
+    prompt_key: str
+    request_key: str
+
+
+class CassetteProvider:
+    """
+    Wraps another provider: "record" always calls it and stores the result,
+    "replay" only serves the cassette (a miss raises CassetteMiss) and "auto"
+    replays hits and records misses. Replays return the recorded output
+    byte-identically; latency_scale > 0 sleeps for the recorded latency times
+    that factor. Provider errors are recorded and replayed too, timeouts are not.
+    """
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        inner: Union[str, Provider] = "claude",
+        *,
+        mode: str = "auto",
+        match: str = "prompt",
+        latency_scale: float = 0.0,
+    ) -> None:
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode '{mode}'. Use one of {list(CASSETTE_MODES)}.")
+        if match not in CASSETTE_MATCHES:
+            raise ValueError(f"Unknown cassette match '{match}'. Use one of {list(CASSETTE_MATCHES)}.")
+        self.cassette = cassette
+        self.inner = get_provider(inner) if isinstance(inner, str) else inner
+        self.mode = mode
+        self.match = match
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._counts: Counter[str] = Counter()
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counts[key] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+    def _request(
+        self,
+        call: str,
+        payload: SwimPlanInput,
+        seed: Optional[int],
+        version: str,
+        output_format: str,
+        prompts: tuple[str, UserPrompt],
+        bad_output: str = "",
+    ) -> _Request:
+        system, user = prompts
+        user_text = _user_text(user)
+        model = _claude_model()
+        return _Request(
+            call=call,
+            version=version,
+            output_format=output_format,
+            model=model,
+            system=system,
+            user=user_text,
+            prompt_key=_digest(self.inner.name, model, call, output_format, str(seed), system, user_text),
+            request_key=_digest(
+                self.inner.name,
+                model,
+                call,
+                version,
+                output_format,
+                _canonical_payload_json(payload),
+                str(seed),
+                bad_output,
+            ),
+        )
+
+    def _lookup(self, request: _Request) -> Optional[Interaction]:
+        if self.mode == "record":
+            return None
+        key = request.prompt_key if self.match == "prompt" else request.request_key
+        hit = self.cassette.get(key, match=self.match)
+        if hit is None:
+            self._count("miss")
+            if self.mode == "replay":
+                raise CassetteMiss(f"no recorded {request.call} response for {self.match} key {key[:12]}")
+        else:
+            self._count("hit")
+        return hit
+
+    def _replay_delay(self, hit: Interaction, timeout: Optional[float]) -> float:
+        delay = hit.elapsed_s * self.latency_scale
+        if timeout is not None and delay > timeout:
+            time.sleep(max(timeout, 0.0))
+            raise TimeoutError(f"replayed call exceeded timeout of {timeout:.2f}s")
+        return delay
+
+    @staticmethod
+    def _replay(hit: Interaction) -> Union[str, dict]:
+        if hit.error_type == "stream_aborted":
+            raise StreamAborted(hit.error or "stream aborted", hit.response or "")
+        if hit.error is not None:
+            raise RuntimeError(hit.error)
+        return hit.response
+
+    def _store(self, request: _Request, started: float, response: Any, exc: Optional[Exception]) -> None:
+        if isinstance(exc, (TimeoutError, asyncio.CancelledError)):
+            return
+        error_type = None
+        if isinstance(exc, StreamAborted):
+            response, error_type = exc.partial_text, "stream_aborted"
+        elif exc is not None:
+            response, error_type = None, type(exc).__name__
+        self.cassette.put(
+            request.prompt_key,
+            request.request_key,
+            Interaction(
+                call=request.call,
+                version=request.version,
+                output_format=request.output_format,
+                model=request.model,
+                system=request.system,
+                user=request.user,
+                response=response,
+                error=str(exc) if exc is not None else None,
+                error_type=error_type,
+                elapsed_s=time.monotonic() - started,
+                recorded_at=time.time(),
+            ),
+        )
+        self._count("recorded")
+
+    def _call(self, request: _Request, timeout: Optional[float], inner: Callable[[], Union[str, dict]]):
+        hit = self._lookup(request)
+        if hit is not None:
+            time.sleep(self._replay_delay(hit, timeout))
+            return self._replay(hit)
+        started = time.monotonic()
+        try:
+            response = inner()
+        except BaseException as exc:
+            if isinstance(exc, Exception):
+                self._store(request, started, None, exc)
+            raise
+        self._store(request, started, response, None)
+        return response
+
+    async def _call_async(self, request: _Request, inner: Callable[[], Awaitable[Union[str, dict]]]):
+        hit = self._lookup(request)
+        if hit is not None:
+            await asyncio.sleep(self._replay_delay(hit, None))
+            return self._replay(hit)
+        started = time.monotonic()
+        try:
+            response = await inner()
+        except BaseException as exc:
+            if isinstance(exc, Exception):
+                self._store(request, started, None, exc)
+            raise
+        self._store(request, started, response, None)
+        return response
+
+    def _plan_request(self, payload, seed, version, output_format) -> _Request:
+        prompts = _plan_prompts(payload, version, output_format)
+        return self._request("plan", payload, seed, version, output_format, prompts)
+
+    def _repair_request(self, payload, bad_output, error_text, seed, version, violations, output_format) -> _Request:
+        prompts = _repair_prompts(payload, bad_output, error_text, version, violations, output_format)
+        return self._request("repair", payload, seed, version, output_format, prompts, bad_output)
+
+    def request_plan(
+        self,
+        payload: SwimPlanInput,
+        seed: Optional[int],
+        *,
+        version: str = "v1",
+        stream: bool = False,
+        timeout: Optional[float] = None,
+        output_format: str = "json",
+    ) -> Union[str, dict]:
+        request = self._plan_request(payload, seed, version, output_format)
+        return self._call(
+            request,
+            timeout,
+            lambda: self.inner.request_plan(
+                payload, seed, version=version, stream=stream, timeout=timeout, output_format=output_format
+            ),
+        )
+
+    def request_repair(
+        self,
+        payload: SwimPlanInput,
+        bad_output: str,
+        error_text: str,
+        seed: Optional[int],
+        *,
+        version: str = "v1",
+        timeout: Optional[float] = None,
+        violations: Sequence[Violation] = (),
+        output_format: str = "json",
+    ) -> Union[str, dict]:
+        request = self._repair_request(payload, bad_output, error_text, seed, version, violations, output_format)
+        return self._call(
+            request,
+            timeout,
+            lambda: self.inner.request_repair(
+                payload,
+                bad_output,
+                error_text,
+                seed,
+                version=version,
+                timeout=timeout,
+                violations=violations,
+                output_format=output_format,
+            ),
+        )
+
+    async def request_plan_async(
+        self,
+        payload: SwimPlanInput,
+        seed: Optional[int],
+        *,
+        version: str = "v1",
+        stream: bool = False,
+        output_format: str = "json",
+    ) -> Union[str, dict]:
+        request = self._plan_request(payload, seed, version, output_format)
+        return await self._call_async(
+            request,
+            lambda: self.inner.request_plan_async(
+                payload, seed, version=version, stream=stream, output_format=output_format
+            ),
+        )
+
+    async def request_repair_async(
+        self,
+        payload: SwimPlanInput,
+        bad_output: str,
+        error_text: str,
+        seed: Optional[int],
+        *,
+        version: str = "v1",
+        violations: Sequence[Violation] = (),
+        output_format: str = "json",
+    ) -> Union[str, dict]:
+        request = self._repair_request(payload, bad_output, error_text, seed, version, violations, output_format)
+        return await self._call_async(
+            request,
+            lambda: self.inner.request_repair_async(
+                payload,
+                bad_output,
+                error_text,
+                seed,
+                version=version,
+                violations=violations,
+                output_format=output_format,
+            ),
+        )
+
+    def provider(self, name: str = "cassette") -> Provider:
+        return Provider(
+            name=name,
+            request_plan=self.request_plan,
+            request_repair=self.request_repair,
+            request_plan_async=self.request_plan_async,
+            request_repair_async=self.request_repair_async,
+        )
+
+
+def register_cassette_provider(
+    path: Union[str, Path],
+    inner: Union[str, Provider] = "claude",
+    *,
+    mode: str = "auto",
+    match: str = "prompt",
+    latency_scale: float = 0.0,
+    name: str = "cassette",
+) -> CassetteProvider:
+    """Register (or replace) a cassette provider under name, e.g. generate_swim_plan(..., provider="cassette")."""
+    wrapper = CassetteProvider(Cassette(path), inner, mode=mode, match=match, latency_scale=latency_scale)
+    register_provider(wrapper.provider(name), replace=True)
+    return wrapper
+
+
+__all__ = [
+    "Cassette",
+    "CassetteMiss",
+    "CassetteProvider",
+    "Interaction",
+    "register_cassette_provider",
+]
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Optional
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+@dataclass(frozen=True)
+class ClientConfig:
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry_s: float = 60.0
+    connect_timeout_s: float = 10.0
+    read_timeout_s: float = 120.0
+    max_retries: int = 2
+
+    @classmethod
+    def from_env(cls) -> ClientConfig:
+        return cls(
+            max_connections=_env_int("SWIM_PLANNER_CLAUDE_MAX_CONNECTIONS", cls.max_connections),
+            max_keepalive_connections=_env_int(
+                "SWIM_PLANNER_CLAUDE_MAX_KEEPALIVE", cls.max_keepalive_connections
+            ),
+            keepalive_expiry_s=_env_float("SWIM_PLANNER_CLAUDE_KEEPALIVE_S", cls.keepalive_expiry_s),
+            connect_timeout_s=_env_float("SWIM_PLANNER_CLAUDE_CONNECT_TIMEOUT_S", cls.connect_timeout_s),
+            read_timeout_s=_env_float("SWIM_PLANNER_CLAUDE_READ_TIMEOUT_S", cls.read_timeout_s),
+            max_retries=_env_int("SWIM_PLANNER_CLAUDE_MAX_RETRIES", cls.max_retries),
+        )
+
+
+class ConnectionStats:
+    """Counts HTTP requests against freshly opened TCP connections."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.clients_created = 0
+        self.requests = 0
+        self.connections_opened = 0
+
+    def _client_created(self) -> None:
+        with self._lock:
+            self.clients_created += 1
+
+    def _request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def _connection_opened(self) -> None:
+        with self._lock:
+            self.connections_opened += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            reused = max(self.requests - self.connections_opened, 0)
+            return {
+                "clients_created": self.clients_created,
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "connections_reused": reused,
+                "reuse_rate": reused / self.requests if self.requests else 0.0,
+            }
+
+
+STATS = ConnectionStats()
+
+
+def _trace(name: str, info: dict) -> None:
+    if name == "connection.connect_tcp.complete":
+        STATS._connection_opened()
+
+
+async def _atrace(name: str, info: dict) -> None:
+    _trace(name, info)
+
+
+def _on_request(request) -> None:
+    STATS._request()
+    request.extensions["trace"] = _trace
+
+
+async def _on_request_async(request) -> None:
+    STATS._request()
+    request.extensions["trace"] = _atrace
+
+
+async def _close_at_loop_shutdown(client) -> AsyncIterator[None]:
+    # Parked at its yield for the life of the loop. asyncio.run() (like any
+    # loop.shutdown_asyncgens()) finalizes it while the loop can still do I/O,
+    # which is the last moment the client's connection pool can be closed.
+    try:
+        yield
+    finally:
+        await client.close()
+
+
+def _park(agen) -> None:
+    # Drive the generator to its yield without awaiting; no I/O happens before it.
+    try:
+        agen.asend(None).send(None)
+    except StopIteration:
+        pass
+
+
+def _http_options(config: ClientConfig) -> dict[str, Any]:
+    import httpx
+
+    return {
+        "limits": httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry_s,
+        ),
+        "timeout": httpx.Timeout(config.read_timeout_s, connect=config.connect_timeout_s),
+    }
+
+
+class ClaudeClientManager:
+    """
+    Owns the process-wide Anthropic clients.
+
+    The sync client is created once per process and dropped after fork, so a
+    pre-fork server's workers never share sockets with the parent. Async clients
+    are bound to the event loop that created them, so one is kept per loop and
+    closed when that loop shuts down its async generators (asyncio.run does).
+    A loop closed without that step leaves its client for the GC, so callers
+    should keep one long-lived loop rather than a loop per request.
+    """
+
+    def __init__(self, config: Optional[ClientConfig] = None) -> None:
+        self._config = config
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._sync: Any = None
+        # id(loop) -> (loop ref, client, the async generator that closes it)
+        self._async: dict[int, tuple[weakref.ref, Any, Any]] = {}
+
+    @property
+    def config(self) -> ClientConfig:
+        if self._config is None:
+            self._config = ClientConfig.from_env()
+        return self._config
+
+    def configure(self, config: ClientConfig) -> None:
+        """Replace the pool settings; existing clients are closed and rebuilt lazily."""
+        self._config = config
+        self.close()
+
+    def _check_fork(self) -> None:
+        if os.getpid() != self._pid:
+            self._after_fork()
+
+    def _after_fork(self) -> None:
+        # The inherited sockets belong to the parent: drop them without closing.
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._sync = None
+        self._async = {}
+
+    def get_sync(self, api_key: Callable[[], str]):
+        self._check_fork()
+        client = self._sync
+        if client is not None:
+            return client
+        with self._lock:
+            if self._sync is None:
+                import anthropic
+
+                config = self.config
+                self._sync = anthropic.Anthropic(
+                    api_key=api_key(),
+                    max_retries=config.max_retries,
+                    http_client=anthropic.DefaultHttpxClient(
+                        event_hooks={"request": [_on_request]},
+                        **_http_options(config),
+                    ),
+                )
+                STATS._client_created()
+            return self._sync
+
+    def get_async(self, api_key: Callable[[], str]):
+        self._check_fork()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._async.get(id(loop))
+            if entry is not None and entry[0]() is loop:
+                return entry[1]
+
+            # Forget clients whose loop has gone away before adding a new one.
+            for key, (ref, _, _) in list(self._async.items()):
+                old = ref()
+                if old is None or old.is_closed():
+                    del self._async[key]
+
+            import anthropic
+
+            config = self.config
+            client = anthropic.AsyncAnthropic(
+                api_key=api_key(),
+                max_retries=config.max_retries,
+                http_client=anthropic.DefaultAsyncHttpxClient(
+                    event_hooks={"request": [_on_request_async]},
+                    **_http_options(config),
+                ),
+            )
+            closer = _close_at_loop_shutdown(client)
+            _park(closer)
+            self._async[id(loop)] = (weakref.ref(loop), client, closer)
+            STATS._client_created()
+            return client
+
+    def close(self) -> None:
+        with self._lock:
+            client, self._sync = self._sync, None
+            async_entries, self._async = list(self._async.values()), {}
+        if client is not None:
+            client.close()
+        for ref, async_client, _ in async_entries:
+            loop = ref()
+            if loop is not None and not loop.is_closed():
+                loop.call_soon_threadsafe(loop.create_task, async_client.close())
+
+
+CLIENTS = ClaudeClientManager()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=CLIENTS._after_fork)
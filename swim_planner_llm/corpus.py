@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import random
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Sequence, TypeVar, Union
+
+from .fake_provider import synthesize_plan
+from .history import RISK_TAGS
+from .models import SwimPlanInput
+from .v2.archetypes import ARCHETYPES
+from .v2.router import build_generation_spec_v2
+
+T = TypeVar("T")
+
+# Traffic mix estimates, not measurements: adjust them when request logs
+# disagree. Durations follow DURATION_MINUTES_OPTIONS in lib/request-options.ts.
+DURATION_WEIGHTS = {15: 2, 20: 8, 25: 8, 30: 20, 35: 10, 40: 14, 45: 16, 50: 6, 55: 4, 60: 12}
+EFFORT_WEIGHTS = {"easy": 30, "medium": 45, "hard": 25}
+LEVEL_WEIGHTS = {None: 20, "beginner": 20, "intermediate": 40, "advanced": 20}
+TAG_COUNT_WEIGHTS = {0: 40, 1: 35, 2: 20, 3: 5}
+
+# UI chips (REQUESTED_TAG_OPTIONS) are picked far more often than the API-only
+# tags; every archetype trigger tag is included so each route gets traffic.
+UI_TAGS = (
+    "technique", "speed", "endurance", "recovery", "fun", "steady", "freestyle", "mixed",
+    "kick", "fins", "pull", "paddles", "golf", "broken", "fartlek", "time_trial",
+)
+TRIGGER_TAGS = tuple(sorted({tag for contract in ARCHETYPES.values() for tag in contract.trigger_tags}))
+REQUEST_TAG_WEIGHTS = {
+    **{tag: 1 for tag in TRIGGER_TAGS},
+    **{tag: 1 for tag in ("sprints", "hypoxic", "underwater", "choice", "benchmark")},
+    **{tag: 3 for tag in UI_TAGS},
+}
+
+# (min, max, weight) history-size buckets: many new users, a long tail of
+# swimmers with years of sessions.
+HISTORY_SIZE_BUCKETS = ((0, 0, 25), (1, 10, 35), (11, 50, 25), (51, 300, 12), (301, 3000, 3))
+FEEDBACK_UP_TAGS = ("fun", "easy", "short")
+FEEDBACK_DOWN_TAGS = ("easy", "short", "boring")
+
+
+def _weighted(rng: random.Random, weights: dict[T, float]) -> T:
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _requested_tags(rng: random.Random) -> list[str]:
+    count = _weighted(rng, TAG_COUNT_WEIGHTS)
+    tags: list[str] = []
+    while len(tags) < count:
+        tag = _weighted(rng, REQUEST_TAG_WEIGHTS)
+        if tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def _history_size(rng: random.Random, max_history: int) -> int:
+    lo, hi, _ = rng.choices(HISTORY_SIZE_BUCKETS, weights=[b[2] for b in HISTORY_SIZE_BUCKETS])[0]
+    return min(rng.randint(lo, hi), max_history)
+
+
+def _compact_plan(plan: dict) -> dict:
+    # Only what history summaries, routing and fallback targets read.
+    main = plan["sections"]["main_set"]
+    return {
+        "duration_minutes": plan["duration_minutes"],
+        "estimated_distance_m": plan["estimated_distance_m"],
+        "sections": {
+            "main_set": {
+                "title": main["title"],
+                "steps": [
+                    {"kind": s["kind"], "stroke": s["stroke"], "effort": s["effort"]} for s in main["steps"]
+                ],
+            }
+        },
+    }
+
+
+def _history(rng: random.Random, size: int, *, full_plans: bool) -> list[dict]:
+    # Per-swimmer tendencies, so some histories are mostly thumbs-down or risky.
+    up_rate = rng.uniform(0.5, 0.95)
+    risk_rate = rng.uniform(0.0, 0.5)
+    history = []
+    for _ in range(size):
+        past = SwimPlanInput.model_validate(
+            {
+                "session_requested": {
+                    "duration_minutes": _weighted(rng, DURATION_WEIGHTS),
+                    "effort": _weighted(rng, EFFORT_WEIGHTS),
+                    "requested_tags": _requested_tags(rng),
+                }
+            }
+        )
+        version = "v2" if rng.random() < 0.7 else "v1"
+        plan = synthesize_plan(past, version, rng).model_dump(mode="json", exclude_none=True)
+        if version == "v2":
+            display = build_generation_spec_v2(past).archetype.display_name
+            plan["sections"]["main_set"]["title"] = f"Main Set — {display}"
+
+        thumb = int(rng.random() < up_rate)
+        if thumb:
+            tags = rng.sample(FEEDBACK_UP_TAGS, rng.randint(0, 2))
+        else:
+            tags = rng.sample(FEEDBACK_DOWN_TAGS, rng.randint(0, 1))
+            if rng.random() < risk_rate:
+                tags.append(rng.choice(sorted(RISK_TAGS)))
+        history.append(
+            {"session_plan": plan if full_plans else _compact_plan(plan), "thumb": thumb, "tags": tags}
+        )
+    return history
+
+
+def _payload(
+    duration: int,
+    effort: str,
+    level: Optional[str],
+    tags: Sequence[str],
+    history: list[dict],
+) -> dict:
+    session = {"duration_minutes": duration, "effort": effort, "requested_tags": list(tags)}
+    if level is not None:
+        session["swim_level"] = level
+    return {"session_requested": session, "historic_sessions": history}
+
+
+def sample_payload(rng: random.Random, *, max_history: int = 3000, full_plans: bool = False) -> dict:
+    return _payload(
+        _weighted(rng, DURATION_WEIGHTS),
+        _weighted(rng, EFFORT_WEIGHTS),
+        _weighted(rng, LEVEL_WEIGHTS),
+        _requested_tags(rng),
+        _history(rng, _history_size(rng, max_history), full_plans=full_plans),
+    )
+
+
+def sample_corpus(
+    n: int,
+    *,
+    seed: int = 0,
+    max_history: int = 3000,
+    full_plans: bool = False,
+) -> Iterator[dict]:
+    """n payloads drawn from the traffic mix; record i depends only on (seed, i)."""
+    for idx in range(n):
+        rng = random.Random(f"{seed}:{idx}")
+        yield {"id": f"s{idx:06d}", "weight": 1.0, "payload": sample_payload(rng, max_history=max_history, full_plans=full_plans)}
+
+
+def enumerate_corpus(
+    *,
+    history_sizes: Sequence[int] = (0, 30),
+    seed: int = 0,
+    full_plans: bool = False,
+) -> Iterator[dict]:
+    """
+    Every duration x effort x level x (no tag or one trigger tag) x history
+    size. Weights are each cell's share of the traffic mix and sum to 1, so
+    aggregates over the grid can be reweighted to production.
+    """
+    tagged = sum(TAG_COUNT_WEIGHTS.values()) - TAG_COUNT_WEIGHTS[0]
+    trigger_total = sum(REQUEST_TAG_WEIGHTS[tag] for tag in TRIGGER_TAGS)
+    tag_weights: dict[tuple[str, ...], float] = {(): TAG_COUNT_WEIGHTS[0]}
+    tag_weights.update({(tag,): tagged * REQUEST_TAG_WEIGHTS[tag] / trigger_total for tag in TRIGGER_TAGS})
+    axes = (DURATION_WEIGHTS, EFFORT_WEIGHTS, LEVEL_WEIGHTS, tag_weights)
+    totals = [sum(axis.values()) for axis in axes]
+    grid = itertools.product(*axes, history_sizes)
+    for idx, (duration, effort, level, tags, size) in enumerate(grid):
+        rng = random.Random(f"{seed}:grid:{idx}")
+        weight = 1.0 / len(history_sizes)
+        for axis, total, key in zip(axes, totals, (duration, effort, level, tags)):
+            weight *= axis[key] / total
+        yield {
+            "id": f"g{idx:06d}",
+            "weight": round(weight, 8),
+            "payload": _payload(duration, effort, level, tags, _history(rng, size, full_plans=full_plans)),
+        }
+
+
+def write_corpus(path: Union[str, Path], records: Iterable[dict]) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as fh:
+        for record in records:
+            fh.write(json.dumps(record, separators=(",", ":"), ensure_ascii=False))
+            fh.write("\n")
+            count += 1
+    return count
+
+
+def read_corpus(path: Union[str, Path]) -> list[dict]:
+    """Payload dicts from a corpus file; bare payload lines are accepted too."""
+    payloads = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                record = json.loads(line)
+                payloads.append(record.get("payload", record))
+    return payloads
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Write a synthetic SwimPlanInput corpus as JSONL.")
+    parser.add_argument("output", type=Path)
+    parser.add_argument("-n", "--count", type=int, default=1000, help="payloads to sample")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-history", type=int, default=3000)
+    parser.add_argument("--enumerate", action="store_true", help="write the full grid instead of sampling")
+    parser.add_argument("--history-sizes", default="0,30", help="grid history sizes with --enumerate")
+    parser.add_argument("--full-plans", action="store_true", help="keep whole history plans, not the compact form")
+    args = parser.parse_args(argv)
+
+    if args.enumerate:
+        sizes = [int(v) for v in args.history_sizes.split(",") if v.strip()]
+        records = enumerate_corpus(history_sizes=sizes, seed=args.seed, full_plans=args.full_plans)
+    else:
+        records = sample_corpus(args.count, seed=args.seed, max_history=args.max_history, full_plans=args.full_plans)
+    print(f"wrote {write_corpus(args.output, records)} payloads to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
+
+
+__all__ = [
+    "enumerate_corpus",
+    "read_corpus",
+    "sample_corpus",
+    "sample_payload",
+    "write_corpus",
+]
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import re
+from typing import Any, Optional
+
+from pydantic import ValidationError
+
+from .formatter import DSL_GEAR, DSL_KIND_LABELS, DSL_SECTIONS
+from .models import LLMPlanDraft, LLMPlanDraftSection
+from .validator import ValidationIssue
+
+# Step line grammar (one step per line, under its section header):
+#
+#   [#step_id] [REPS x ]DISTm [KIND] [[SEQ]m] [(Ns pause)] STROKE EFFORT
+#   [(target M:SS)] [@ TIMING ...] [[GEAR, ...]] [| description] [| split: text]
+#
+# KIND defaults to intervals (REPS > 1) or continuous. Pyramid kinds may omit
+# "REPS x DISTm", which then default to len(SEQ) and min(SEQ). In the
+# description and split text a backslash escapes the next character, so
+# plan_to_dsl_text writes "|" as "\|" and a leading "split:" as "\split:".
+
+DSL_FORMAT_GUIDE = (
+    "Write the plan as plain text lines. No JSON, no markdown.\n"
+    "- Section headers, in this order, each on its own line: WARM-UP, MAIN SET, COOL-DOWN "
+    "(optionally 'HEADER: Title').\n"
+    "- One line per step under its header:\n"
+    "  [REPS x ]DISTm [KIND] [[SEQ]m] [(Ns pause)] STROKE EFFORT [(target M:SS)] [@ TIMING] [[GEAR]] | DESCRIPTION\n"
+    "- Omit 'REPS x ' for a single rep.\n"
+    "- KIND: omit for continuous (1 rep) and intervals (2+ reps); otherwise one of build, negative split, "
+    "broken, fartlek, time trial, pyramid, descending, ascending.\n"
+    "- Pyramid/descending/ascending: write the kind and the sequence only, e.g. 'pyramid [50-100-150-100-50]m'.\n"
+    "- TIMING: '@ M:SS' sendoff, '@ Ns rest' rest, '@ [M:SS-M:SS-...]' sendoff per pyramid rep, "
+    "'@ [N-N-...]s rest' rest per pyramid rep.\n"
+    "- (Ns pause) is the broken pause; (target M:SS) is a time-trial target.\n"
+    "- GEAR: comma-separated from pull, paddles, fins, underwater, hypoxic; omit when none.\n"
+    "- Append ' | split: TEXT' to add a split instruction.\n"
+    "- All field rules still apply to the values these lines encode.\n\n"
+    "EXAMPLE:\n"
+    "WARM-UP: Warm-up\n"
+    "200m freestyle easy | Easy relaxed warm-up swim.\n\n"
+    "MAIN SET\n"
+    "4 x 100m freestyle hard @ 2:00 | Hold a strong controlled pace off the 2-minute clock.\n"
+    "pyramid [50-100-150-100-50]m freestyle medium @ [10-15-20-15-10]s rest | Build up and back down.\n\n"
+    "COOL-DOWN: Cool-down\n"
+    "100m choice easy | Easy cooldown."
+)
+
+_KIND_BY_LABEL = {
+    DSL_KIND_LABELS.get(kind, kind): kind
+    for kind in (
+        "continuous",
+        "intervals",
+        "pyramid",
+        "descending",
+        "ascending",
+        "build",
+        "negative_split",
+        "broken",
+        "fartlek",
+        "time_trial",
+    )
+}
+
+_HEADER_RE = re.compile(
+    r"^(?P<header>WARM-UP|MAIN SET|COOL-DOWN)\s*(?::\s*(?P<title>.*))?$",
+    re.IGNORECASE,
+)
+
+_CLOCK = r"\d+:\d{2}"
+_STEP_RE = re.compile(
+    r"^(?:#(?P<step_id>\S+) )?"
+    r"(?:(?P<reps>\d+) x )?"
+    r"(?:(?P<distance>\d+)m )?"
+    r"(?:(?P<kind>" + "|".join(sorted(_KIND_BY_LABEL, key=len, reverse=True)) + r") )?"
+    r"(?:\[(?P<sequence>\d+(?:-\d+)*)\]m )?"
+    r"(?:\((?:(?P<pause>\d+)s )?pause\) )?"
+    r"(?P<stroke>freestyle|backstroke|breaststroke|butterfly|mixed|choice) "
+    r"(?P<effort>easy|medium|hard)"
+    r"(?: \(target (?P<target>" + _CLOCK + r")\))?"
+    r"(?P<timing>(?: @ (?:" + _CLOCK + r"|\d+s rest|\[" + _CLOCK + r"(?:-" + _CLOCK + r")*\]|\[\d+(?:-\d+)*\]s rest))*)"
+    r"(?: \[(?P<gear>[a-z]+(?:, ?[a-z]+)*)\])?$",
+    re.IGNORECASE,
+)
+_TIMING_RE = re.compile(
+    r" @ (?:(?P<sendoff>" + _CLOCK + r")"
+    r"|(?P<rest>\d+)s rest"
+    r"|\[(?P<sendoff_seq>" + _CLOCK + r"(?:-" + _CLOCK + r")*)\]"
+    r"|\[(?P<rest_seq>\d+(?:-\d+)*)\]s rest)",
+    re.IGNORECASE,
+)
+
+
+def _seconds(clock: str) -> int:
+    mins, secs = clock.split(":")
+    return int(mins) * 60 + int(secs)
+
+
+_ESCAPED_RE = re.compile(r"\\(.)")
+
+
+def _unescape(text: str) -> str:
+    return _ESCAPED_RE.sub(r"\1", text)
+
+
+def _parse_step(line: str) -> dict[str, Any]:
+    fields = line.split(" | ")
+    spec = " ".join(fields[0].split())
+    split_instruction: Optional[str] = None
+    if len(fields) > 1 and fields[-1].lower().startswith("split:"):
+        split_instruction = _unescape(fields.pop()[len("split:"):].strip())
+    description = " | ".join(_unescape(field) for field in fields[1:]).strip()
+
+    match = _STEP_RE.match(spec)
+    if match is None:
+        raise ValueError(f"unrecognised step '{spec}'")
+
+    label = (match["kind"] or "").lower()
+    sequence = [int(d) for d in match["sequence"].split("-")] if match["sequence"] else None
+    if match["reps"]:
+        reps = int(match["reps"])
+    elif label in {"pyramid", "descending", "ascending"} and sequence:
+        reps = len(sequence)
+    else:
+        reps = 1
+    if match["distance"]:
+        distance = int(match["distance"])
+    elif sequence:
+        distance = min(sequence)
+    else:
+        raise ValueError(f"missing distance in '{spec}'")
+
+    step: dict[str, Any] = {
+        "kind": _KIND_BY_LABEL[label] if label else ("intervals" if reps > 1 else "continuous"),
+        "reps": reps,
+        "distance_per_rep_m": distance,
+        "pyramid_sequence_m": sequence,
+        "stroke": match["stroke"].lower(),
+        "effort": match["effort"].lower(),
+        "description": description,
+        "split_instruction": split_instruction,
+    }
+    if match["step_id"]:
+        step["step_id"] = match["step_id"]
+    if match["pause"]:
+        step["broken_pause_s"] = int(match["pause"])
+    if match["target"]:
+        step["target_time_s"] = _seconds(match["target"])
+
+    for timing in _TIMING_RE.finditer(match["timing"]):
+        if timing["sendoff"]:
+            step["sendoff_seconds"] = _seconds(timing["sendoff"])
+        elif timing["rest"]:
+            step["rest_seconds"] = int(timing["rest"])
+        elif timing["sendoff_seq"]:
+            step["sendoff_sequence_s"] = [_seconds(v) for v in timing["sendoff_seq"].split("-")]
+        else:
+            step["rest_sequence_s"] = [int(v) for v in timing["rest_seq"].split("-")]
+
+    if match["gear"]:
+        for name in (g.strip().lower() for g in match["gear"].split(",")):
+            if name not in DSL_GEAR:
+                raise ValueError(f"unknown gear '{name}'")
+            step[name] = True
+
+    return step
+
+
+_ATTR_BY_HEADER = {header: attr for attr, header, _, _ in DSL_SECTIONS}
+
+
+def _clean_line(raw_line: str) -> str:
+    line = raw_line.strip()
+    if line.startswith("```"):
+        return ""
+    if line[:2] in ("- ", "* "):
+        line = line[2:].lstrip()
+    return line
+
+
+def dsl_section_header(line: str) -> Optional[str]:
+    """Section attribute (e.g. "main_set") if line is a section header, else None."""
+    header = _HEADER_RE.match(_clean_line(line))
+    return _ATTR_BY_HEADER[header["header"].upper()] if header is not None else None
+
+
+def _parse_sections(text: str) -> dict[str, dict[str, Any]]:
+    sections: dict[str, dict[str, Any]] = {}
+    current: Optional[dict[str, Any]] = None
+
+    for lineno, raw_line in enumerate(text.splitlines(), start=1):
+        line = _clean_line(raw_line)
+        if not line:
+            continue
+
+        header = _HEADER_RE.match(line)
+        if header is not None:
+            attr = _ATTR_BY_HEADER[header["header"].upper()]
+            if attr in sections:
+                raise ValidationIssue(
+                    f"dsl parse failed: line {lineno}: duplicate section {header['header']}", code="dsl_parse_failed"
+                )
+            current = {"title": (header["title"] or "").strip(), "steps": []}
+            sections[attr] = current
+            continue
+
+        if current is None:
+            raise ValidationIssue(
+                f"dsl parse failed: line {lineno}: step before any section header", code="dsl_parse_failed"
+            )
+        try:
+            current["steps"].append(_parse_step(line))
+        except ValueError as exc:
+            raise ValidationIssue(f"dsl parse failed: line {lineno}: {exc}", code="dsl_parse_failed") from exc
+
+    return sections
+
+
+def parse_dsl_section(text: str) -> LLMPlanDraftSection:
+    """Parse one section (its header line and step lines), as seen mid-stream."""
+    sections = _parse_sections(text)
+    if len(sections) != 1:
+        raise ValidationIssue("dsl parse failed: expected exactly one section", code="dsl_parse_failed")
+    try:
+        return LLMPlanDraftSection.model_validate(next(iter(sections.values())))
+    except ValidationError as exc:
+        raise ValidationIssue(f"draft schema failed: {exc}", code="draft_schema_invalid") from exc
+
+
+def parse_plan_dsl(text: str) -> LLMPlanDraft:
+    """Parse the compact plan line format back into an LLMPlanDraft."""
+    sections = _parse_sections(text)
+    missing = [header for attr, header, _, _ in DSL_SECTIONS if attr not in sections]
+    if missing:
+        raise ValidationIssue(f"dsl parse failed: missing section(s) {', '.join(missing)}", code="dsl_parse_failed")
+
+    try:
+        return LLMPlanDraft.model_validate({"sections": sections})
+    except ValidationError as exc:
+        raise ValidationIssue(f"draft schema failed: {exc}", code="draft_schema_invalid") from exc
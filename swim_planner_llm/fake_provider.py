@@ -0,0 +1,485 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Sequence, Union
+from uuid import UUID
+
+from .fallback import _canonical_payload_json, _compute_target_distance
+from .formatter import plan_to_dsl_text
+from .llm_client import ProviderError
+from .llm_client_claude import USAGE, TokenUsage, _call_options, _plan_prompts, _repair_prompts, _stream_monitor
+from .models import PYRAMID_KINDS, Section, Sections, Step, SwimPlanInput, SwimPlanResponse
+from .providers import Provider, register_provider
+from .streaming import StreamAborted
+from .style_inference import infer_prefer_varied_from_payload
+from .validator import Violation
+from .v2.router import build_generation_spec_v2
+
+_LATENCY_KINDS = ("fixed", "uniform", "lognormal")
+_CHALLENGE_KINDS = frozenset({"broken", "time_trial"})
+_GEAR = ("pull", "paddles", "fins")
+_VARIED_STROKES = ("backstroke", "breaststroke", "choice", "mixed")
+_BREAKAGES = ("off_grid_distance", "single_rep_intervals", "empty_section")
+_STREAM_CHUNK_CHARS = 64
+
+
+@dataclass(frozen=True)
+class LatencyModel:
+    """Seconds per simulated call: fixed(a), uniform(a, b) or lognormal(median a, sigma b)."""
+
+    kind: str = "fixed"
+    a: float = 0.0
+    b: float = 0.0
+
+    def __post_init__(self) -> None:
+        if self.kind not in _LATENCY_KINDS:
+            raise ValueError(f"Unknown latency kind '{self.kind}'. Use one of {list(_LATENCY_KINDS)}.")
+
+    @classmethod
+    def fixed(cls, seconds: float) -> LatencyModel:
+        return cls("fixed", seconds)
+
+    @classmethod
+    def uniform(cls, low_s: float, high_s: float) -> LatencyModel:
+        return cls("uniform", low_s, high_s)
+
+    @classmethod
+    def lognormal(cls, median_s: float, sigma: float) -> LatencyModel:
+        return cls("lognormal", median_s, sigma)
+
+    @classmethod
+    def parse(cls, spec: str) -> LatencyModel:
+        """'0.5', 'uniform:0.2:1.5' or 'lognormal:0.8:0.4'."""
+        kind, _, rest = spec.strip().partition(":")
+        if not rest:
+            return cls.fixed(float(kind))
+        values = [float(v) for v in rest.split(":")]
+        if len(values) != 2:
+            raise ValueError(f"Latency spec '{spec}' needs two parameters.")
+        return cls(kind, *values)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "uniform":
+            return rng.uniform(self.a, self.b)
+        if self.kind == "lognormal":
+            return rng.lognormvariate(math.log(self.a), self.b) if self.a > 0 else 0.0
+        return self.a
+
+
+def _env_rate(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number, got {value!r}") from None
+
+
+@dataclass(frozen=True)
+class FakeProviderConfig:
+    """
+    Behaviour of the fake provider. Rates are per call: error_rate raises a
+    provider error, malformed_rate returns unparseable output and invalid_rate
+    a parseable plan that fails validation. Repair calls skip malformed/invalid
+    and return a valid plan with probability repair_success_rate.
+    """
+
+    latency: LatencyModel = LatencyModel()
+    repair_latency: Optional[LatencyModel] = None
+    error_rate: float = 0.0
+    malformed_rate: float = 0.0
+    invalid_rate: float = 0.0
+    repair_success_rate: float = 1.0
+    seed: int = 0
+
+    @classmethod
+    def from_env(cls) -> FakeProviderConfig:
+        repair_latency = os.getenv("SWIM_PLANNER_FAKE_REPAIR_LATENCY")
+        return cls(
+            latency=LatencyModel.parse(os.getenv("SWIM_PLANNER_FAKE_LATENCY") or "0"),
+            repair_latency=LatencyModel.parse(repair_latency) if repair_latency else None,
+            error_rate=_env_rate("SWIM_PLANNER_FAKE_ERROR_RATE", cls.error_rate),
+            malformed_rate=_env_rate("SWIM_PLANNER_FAKE_MALFORMED_RATE", cls.malformed_rate),
+            invalid_rate=_env_rate("SWIM_PLANNER_FAKE_INVALID_RATE", cls.invalid_rate),
+            repair_success_rate=_env_rate("SWIM_PLANNER_FAKE_REPAIR_SUCCESS_RATE", cls.repair_success_rate),
+            seed=int(os.getenv("SWIM_PLANNER_FAKE_SEED") or cls.seed),
+        )
+
+
+def _ladder(units: int) -> list[int]:
+    # 1, 2, 3, ... pool-lengths of 50m, the remainder added to the last rep.
+    seq: list[int] = []
+    n = 1
+    while sum(seq) + n <= units:
+        seq.append(n)
+        n += 1
+    seq[-1] += units - sum(seq)
+    return seq
+
+
+def _pyramid_sequence(kind: str, units: int) -> list[int]:
+    if kind == "ascending":
+        seq = _ladder(units)
+    elif kind == "descending":
+        seq = _ladder(units)[::-1]
+    else:
+        half = units // 2
+        seq = _ladder(half) + _ladder(units - half)[::-1]
+    return [u * 50 for u in seq]
+
+
+def _split_units(units: int, parts: int) -> list[int]:
+    base, extra = divmod(units, parts)
+    return [base + (1 if idx < extra else 0) for idx in range(parts)]
+
+
+def _fake_step(
+    step_id: str,
+    kind: str,
+    units: int,
+    stroke: str,
+    effort: str,
+    rng: random.Random,
+    gear: Optional[str] = None,
+) -> Step:
+    distance = units * 50
+    fields: dict = {
+        "step_id": step_id,
+        "kind": kind,
+        "stroke": stroke,
+        "effort": effort,
+        "description": f"{kind.replace('_', ' ').capitalize()} {stroke}, {effort} effort.",
+    }
+    if kind in PYRAMID_KINDS:
+        seq = _pyramid_sequence(kind, units)
+        fields.update(reps=len(seq), distance_per_rep_m=min(seq), pyramid_sequence_m=seq, rest_sequence_s=[15] * len(seq))
+    elif kind == "intervals":
+        rep = 100 if units % 2 == 0 and units >= 4 else 50
+        fields.update(reps=distance // rep, distance_per_rep_m=rep, rest_seconds=rng.choice((15, 20)))
+    else:
+        fields.update(reps=1, distance_per_rep_m=distance)
+        if kind == "broken":
+            fields["broken_pause_s"] = 10
+        elif kind == "negative_split":
+            fields["split_instruction"] = "Swim the second half faster than the first."
+    if gear is not None:
+        fields[gear] = True
+    return Step(**fields)
+
+
+def _main_shape(payload: SwimPlanInput, version: str, rng: random.Random) -> list[tuple[str, str, Optional[str]]]:
+    """(kind, stroke, gear) per main_set step, following the v2 blueprint or the v1 style."""
+    if version != "v2":
+        if infer_prefer_varied_from_payload(payload):
+            return [("intervals", "freestyle", None), (rng.choice(("build", "continuous")), rng.choice(_VARIED_STROKES), None)]
+        return [("intervals", "freestyle", None)]
+
+    spec = build_generation_spec_v2(payload)
+    archetype_id = spec.archetype.archetype_id
+    gear = next((g for g in _GEAR if g in spec.requested_tags), None)
+    shape: list[tuple[str, str, Optional[str]]] = []
+    for idx, allowed in enumerate(spec.blueprint.main_set.allowed_kinds_by_step):
+        options = allowed
+        if archetype_id == "benchmark_lite":
+            options = allowed & _CHALLENGE_KINDS if idx == 0 else allowed - _CHALLENGE_KINDS
+        elif archetype_id == "stroke_switch_ladder" and idx == 0:
+            options = allowed & PYRAMID_KINDS
+        kind = rng.choice(sorted(options or allowed))
+        stroke = "choice" if archetype_id == "choice_session" and idx == 0 else "freestyle"
+        step_gear = gear if archetype_id == "gear_change_up" and idx == 0 else None
+        shape.append((kind, stroke, step_gear))
+    return shape
+
+
+def synthesize_plan(payload: SwimPlanInput, version: str, rng: random.Random) -> SwimPlanResponse:
+    """A plan that passes validation for the payload's v1 style or v2 blueprint."""
+    req = payload.session_requested
+    warm_kinds = ["continuous", "intervals"] if req.effort == "hard" else ["continuous"]
+    main_shape = _main_shape(payload, version, rng)
+
+    total_units = max(6, _compute_target_distance(payload) // 50)
+    warm_units = max(2 * len(warm_kinds), round(total_units * 0.25))
+    cool_units = max(2, round(total_units * 0.15))
+    main_units = max(2 * len(main_shape), total_units - warm_units - cool_units)
+
+    warm_steps = [
+        _fake_step(f"wu-{idx}", kind, units, "freestyle", "easy", rng)
+        for idx, (kind, units) in enumerate(zip(warm_kinds, _split_units(warm_units, len(warm_kinds))), start=1)
+    ]
+    main_steps = [
+        # Continuous main steps stay easy: that is the playful_alternator reset
+        # and never trips the long-hard-continuous history rule.
+        _fake_step(f"main-{idx}", kind, units, stroke, "easy" if kind == "continuous" else req.effort, rng, gear)
+        for idx, ((kind, stroke, gear), units) in enumerate(
+            zip(main_shape, _split_units(main_units, len(main_shape))), start=1
+        )
+    ]
+    cool_steps = [_fake_step("cd-1", "continuous", cool_units, "choice", "easy", rng)]
+
+    sections = Sections(
+        warm_up=Section(title="Warm-Up", section_distance_m=sum(s.step_distance_m for s in warm_steps), steps=warm_steps),
+        main_set=Section(title="Main Set", section_distance_m=sum(s.step_distance_m for s in main_steps), steps=main_steps),
+        cool_down=Section(title="Cool-Down", section_distance_m=sum(s.step_distance_m for s in cool_steps), steps=cool_steps),
+    )
+    return SwimPlanResponse(
+        plan_id=UUID(int=rng.getrandbits(128)),
+        created_at=datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=rng.randrange(86400)),
+        duration_minutes=req.duration_minutes,
+        estimated_distance_m=sum(s.section_distance_m for s in (sections.warm_up, sections.main_set, sections.cool_down)),
+        sections=sections,
+    )
+
+
+def _break_plan(plan: SwimPlanResponse, rng: random.Random) -> SwimPlanResponse:
+    """Copy of the plan with one invariant violated (model_copy skips validation)."""
+    breakage = rng.choice(_BREAKAGES)
+    sections = plan.sections
+    if breakage == "empty_section":
+        broken = sections.model_copy(update={"cool_down": sections.cool_down.model_copy(update={"steps": []})})
+    else:
+        step = sections.main_set.steps[0]
+        if breakage == "off_grid_distance" and step.kind not in PYRAMID_KINDS:
+            update = {"distance_per_rep_m": step.distance_per_rep_m + 25}
+        else:
+            update = {
+                "kind": "intervals",
+                "reps": 1,
+                "distance_per_rep_m": step.step_distance_m,
+                "pyramid_sequence_m": None,
+                "rest_sequence_s": None,
+                "sendoff_sequence_s": None,
+            }
+        steps = [step.model_copy(update=update)] + sections.main_set.steps[1:]
+        broken = sections.model_copy(update={"main_set": sections.main_set.model_copy(update={"steps": steps})})
+    return plan.model_copy(update={"sections": broken})
+
+
+def _render(plan: SwimPlanResponse, output_format: str) -> Union[str, dict]:
+    if output_format == "dsl":
+        return plan_to_dsl_text(plan)
+    data = plan.model_dump(mode="json", exclude_none=True, exclude={"is_fallback"})
+    return data if output_format == "tool" else json.dumps(data, indent=2)
+
+
+def _malformed(output: Union[str, dict], output_format: str, rng: random.Random) -> Union[str, dict]:
+    if output_format == "tool":
+        return {"sections": {"warm_up": output["sections"]["warm_up"]}}
+    if output_format == "dsl":
+        return output[: output.index("COOL-DOWN")].rstrip()
+    return output[: int(len(output) * rng.uniform(0.3, 0.9))]
+
+
+@dataclass(frozen=True)
+class _Outcome:
+    latency_s: float
+    output: Union[str, dict, None]
+    error: Optional[str]
+    usage: TokenUsage
+    labels: dict
+    aborted: Optional[StreamAborted] = None
+
+
+class FakeProvider:
+    """
+    Local stand-in for the Claude provider: no network, the prompts are still
+    built (so CPU profiles stay realistic) and the plan comes from
+    synthesize_plan. Each outcome is drawn from an RNG keyed on the config seed,
+    payload, request seed, version and call, so seeded runs replay exactly;
+    unseeded calls take a per-provider counter instead.
+    """
+
+    def __init__(self, config: Optional[FakeProviderConfig] = None) -> None:
+        self.config = config if config is not None else FakeProviderConfig()
+        self._unseeded = itertools.count()
+        self._lock = threading.Lock()
+        self._counts: Counter[str] = Counter()
+
+    def _count(self, *keys: str) -> None:
+        with self._lock:
+            self._counts.update(keys)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+    def _rng(self, payload: SwimPlanInput, seed: Optional[int], version: str, call: str) -> random.Random:
+        nonce = str(seed) if seed is not None else f"unseeded-{next(self._unseeded)}"
+        return random.Random("|".join((str(self.config.seed), _canonical_payload_json(payload), nonce, version, call)))
+
+    def _outcome(
+        self,
+        payload: SwimPlanInput,
+        seed: Optional[int],
+        version: str,
+        output_format: str,
+        call: str,
+        prompts: tuple,
+    ) -> _Outcome:
+        config = self.config
+        rng = self._rng(payload, seed, version, call)
+        system, user = prompts
+        user_text = "".join(user) if isinstance(user, tuple) else user
+        labels = _call_options(payload, version, output_format, call)["labels"]
+
+        latency_model = config.repair_latency if call == "repair" and config.repair_latency else config.latency
+        latency_s = max(0.0, latency_model.sample(rng))
+        self._count(call)
+        if rng.random() < config.error_rate:
+            self._count("error")
+            return _Outcome(latency_s, None, "simulated provider error", TokenUsage(), labels)
+
+        plan = synthesize_plan(payload, version, rng)
+        roll = rng.random()
+        if call == "repair":
+            malformed, invalid = False, roll >= config.repair_success_rate
+        else:
+            malformed = roll < config.malformed_rate
+            invalid = not malformed and roll < config.malformed_rate + config.invalid_rate
+        if invalid:
+            self._count("invalid")
+            plan = _break_plan(plan, rng)
+        output = _render(plan, output_format)
+        if malformed:
+            self._count("malformed")
+            output = _malformed(output, output_format, rng)
+
+        text = output if isinstance(output, str) else json.dumps(output)
+        usage = TokenUsage(input_tokens=(len(system) + len(user_text)) // 4, output_tokens=len(text) // 4)
+        return _Outcome(latency_s, output, None, usage, labels)
+
+    def _finish(self, outcome: _Outcome) -> Union[str, dict]:
+        if outcome.error is not None:
+            raise ProviderError(f"fake provider: {outcome.error}", code="provider_error")
+        USAGE.record(outcome.usage, outcome.labels)
+        if outcome.aborted is not None:
+            raise outcome.aborted
+        return outcome.output
+
+    def _deliver(self, outcome: _Outcome, timeout: Optional[float]) -> Union[str, dict]:
+        if timeout is not None and outcome.latency_s > timeout:
+            time.sleep(max(timeout, 0.0))
+            self._count("timeout")
+            raise TimeoutError(f"fake provider call exceeded timeout of {timeout:.2f}s")
+        time.sleep(outcome.latency_s)
+        return self._finish(outcome)
+
+    async def _deliver_async(self, outcome: _Outcome) -> Union[str, dict]:
+        await asyncio.sleep(outcome.latency_s)
+        return self._finish(outcome)
+
+    def _plan_outcome(self, payload, seed, version, output_format, stream: bool = False) -> _Outcome:
+        prompts = _plan_prompts(payload, version, output_format)
+        outcome = self._outcome(payload, seed, version, output_format, "plan", prompts)
+        if stream and isinstance(outcome.output, str):
+            outcome = self._streamed(outcome, payload, version, output_format)
+        return outcome
+
+    def _streamed(self, outcome: _Outcome, payload, version, output_format) -> _Outcome:
+        # Same monitor as the Claude stream: a plan it rejects is cut off there,
+        # after the matching share of the call's latency.
+        monitor = _stream_monitor(payload, version, output_format)
+        text = outcome.output
+        for start in range(0, len(text), _STREAM_CHUNK_CHARS):
+            try:
+                monitor.on_text(text[start : start + _STREAM_CHUNK_CHARS])
+            except StreamAborted as exc:
+                self._count("stream_aborted")
+                share = len(exc.partial_text) / len(text)
+                return replace(outcome, latency_s=outcome.latency_s * share, aborted=exc)
+        return outcome
+
+    def _repair_outcome(self, payload, bad_output, error_text, seed, version, violations, output_format) -> _Outcome:
+        prompts = _repair_prompts(payload, bad_output, error_text, version, violations, output_format)
+        return self._outcome(payload, seed, version, output_format, "repair", prompts)
+
+    def request_plan(
+        self,
+        payload: SwimPlanInput,
+        seed: Optional[int],
+        *,
+        version: str = "v1",
+        stream: bool = False,
+        timeout: Optional[float] = None,
+        output_format: str = "json",
+    ) -> Union[str, dict]:
+        return self._deliver(self._plan_outcome(payload, seed, version, output_format, stream), timeout)
+
+    def request_repair(
+        self,
+        payload: SwimPlanInput,
+        bad_output: str,
+        error_text: str,
+        seed: Optional[int],
+        *,
+        version: str = "v1",
+        timeout: Optional[float] = None,
+        violations: Sequence[Violation] = (),
+        output_format: str = "json",
+    ) -> Union[str, dict]:
+        outcome = self._repair_outcome(payload, bad_output, error_text, seed, version, violations, output_format)
+        return self._deliver(outcome, timeout)
+
+    async def request_plan_async(
+        self,
+        payload: SwimPlanInput,
+        seed: Optional[int],
+        *,
+        version: str = "v1",
+        stream: bool = False,
+        output_format: str = "json",
+    ) -> Union[str, dict]:
+        return await self._deliver_async(self._plan_outcome(payload, seed, version, output_format, stream))
+
+    async def request_repair_async(
+        self,
+        payload: SwimPlanInput,
+        bad_output: str,
+        error_text: str,
+        seed: Optional[int],
+        *,
+        version: str = "v1",
+        violations: Sequence[Violation] = (),
+        output_format: str = "json",
+    ) -> Union[str, dict]:
+        outcome = self._repair_outcome(payload, bad_output, error_text, seed, version, violations, output_format)
+        return await self._deliver_async(outcome)
+
+    def provider(self, name: str = "fake") -> Provider:
+        return Provider(
+            name=name,
+            request_plan=self.request_plan,
+            request_repair=self.request_repair,
+            request_plan_async=self.request_plan_async,
+            request_repair_async=self.request_repair_async,
+        )
+
+
+def register_fake_provider(config: Optional[FakeProviderConfig] = None, *, name: str = "fake") -> FakeProvider:
+    """
+    Register (or replace) a fake provider under name; the default reads
+    SWIM_PLANNER_FAKE_* env vars. get_provider("fake") calls this on first
+    use when nothing is registered yet.
+    """
+    fake = FakeProvider(config if config is not None else FakeProviderConfig.from_env())
+    register_provider(fake.provider(name), replace=True)
+    return fake
+
+
+__all__ = [
+    "FakeProvider",
+    "FakeProviderConfig",
+    "LatencyModel",
+    "register_fake_provider",
+    "synthesize_plan",
+]
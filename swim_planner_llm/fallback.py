@@ -8,7 +8,6 @@ from typing import Optional
 from uuid import UUID, uuid5
 
 from .models import (
-    HistoricSession,
     Section,
     Sections,
     SessionRequested,
@@ -19,7 +18,6 @@ from .models import (
 from .style_inference import infer_prefer_varied_from_payload
 
 NAMESPACE_DNS = UUID("6ba7b810-9dad-11d1-80b4-00c04fd430c8")
-RISK_TAGS = {"pace-too-fast", "long", "tiring"}
 
 
 def _round_to_multiple(value: int, multiple: int) -> int:
@@ -28,30 +26,6 @@ def _round_to_multiple(value: int, multiple: int) -> int:
     return max(multiple, int(round(value / multiple)) * multiple)
 
 
-def _plan_distance(plan: dict) -> Optional[int]:
-    distance = plan.get("estimated_distance_m")
-    return distance if isinstance(distance, int) and distance > 0 else None
-
-
-def _historical_ranges(history: list[HistoricSession]) -> tuple[list[int], list[int], bool]:
-    ups: list[int] = []
-    downs: list[int] = []
-    risk_down = False
-
-    for item in history:
-        d = _plan_distance(item.session_plan or {})
-        if item.thumb == 1:
-            if d:
-                ups.append(d)
-        else:
-            if d:
-                downs.append(d)
-            tags = {t.strip().lower() for t in item.tags}
-            if tags.intersection(RISK_TAGS):
-                risk_down = True
-    return ups, downs, risk_down
-
-
 def _base_target(req: SessionRequested) -> int:
     base = 650 if req.duration_minutes <= 20 else 950
     effort_offset = {"easy": -50, "medium": 0, "hard": 50}[req.effort]
@@ -60,24 +34,17 @@ def _base_target(req: SessionRequested) -> int:
 
 def _compute_target_distance(payload: SwimPlanInput) -> int:
     req = payload.session_requested
-    ups, downs, _ = _historical_ranges(payload.historic_sessions)
+    history = payload.history_profile
 
     target = _base_target(req)
-    if ups:
-        lo, hi = min(ups), max(ups)
+    if history.up_distance_range:
+        lo, hi = history.up_distance_range
         target = min(max(target, lo), hi)
 
-    risky_downs = [
-        _plan_distance(item.session_plan or {})
-        for item in payload.historic_sessions
-        if item.thumb == 0
-        and {t.strip().lower() for t in item.tags}.intersection(RISK_TAGS)
-    ]
-    risky_downs = [d for d in risky_downs if d]
-    if risky_downs:
-        target = min(target, max(400, min(risky_downs)))
-    elif downs:
-        target = min(target, max(downs))
+    if history.risky_down_min_distance:
+        target = min(target, max(400, history.risky_down_min_distance))
+    elif history.down_distance_range:
+        target = min(target, history.down_distance_range[1])
 
     target = _round_to_multiple(target, 25)
     return max(300, target)
@@ -280,8 +247,17 @@ def _main_steps(
     ]
 
 
+def _canonical_payload_json(payload: SwimPlanInput) -> str:
+    # pydantic's model_dump_json has no sort_keys; go through json.dumps instead.
+    data = payload.model_dump(mode="json")
+    if data.get("history_summary") is None:
+        # Payloads without a summary keep the seeds and cache keys they always had.
+        data.pop("history_summary", None)
+    return json.dumps(data, sort_keys=True, separators=(",", ":"))
+
+
 def _seed_from_payload(payload: SwimPlanInput) -> int:
-    digest = hashlib.sha256(payload.model_dump_json(sort_keys=True).encode("utf-8")).hexdigest()
+    digest = hashlib.sha256(_canonical_payload_json(payload).encode("utf-8")).hexdigest()
     return int(digest[:8], 16)
 
 
@@ -295,7 +271,7 @@ def build_deterministic_fallback(payload: SwimPlanInput, seed: Optional[int]) ->
     target_distance = _compute_target_distance(payload)
     warm_dist, main_dist, cool_dist = _split_distance(target_distance, pool_length)
 
-    _, _, risk_down = _historical_ranges(payload.historic_sessions)
+    risk_down = payload.history_profile.risk_down
 
     warm_steps = [
         _step("wu-1", "continuous", 1, warm_dist, "freestyle", None, "easy", "Easy warm-up")
@@ -94,3 +94,89 @@ def plan_to_canonical_text(plan: SwimPlanResponse) -> str:
         lines.append(_line_for_step(step))
 
     return "\n".join(lines)
+
+
+# Extended, lossless line format used as a compact LLM output mode; see dsl.py
+# for the grammar and the parser back to LLMPlanDraft.
+# (section attribute, header, default title, default step_id prefix)
+DSL_SECTIONS = (
+    ("warm_up", "WARM-UP", "Warm-Up", "wu"),
+    ("main_set", "MAIN SET", "Main Set", "main"),
+    ("cool_down", "COOL-DOWN", "Cool-Down", "cd"),
+)
+DSL_KIND_LABELS = {"negative_split": "negative split", "time_trial": "time trial"}
+DSL_GEAR = ("pull", "paddles", "fins", "underwater", "hypoxic")
+
+
+def dsl_escape(text: str) -> str:
+    """Backslash-escape free text for a step line: no bare '|' and no leading 'split:'."""
+    escaped = text.replace("\\", "\\\\").replace("|", "\\|")
+    if escaped.lower().startswith("split:"):
+        escaped = "\\" + escaped
+    return escaped
+
+
+def _clock(seconds: int) -> str:
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def _dsl_line_for_step(step: Step, default_step_id: str) -> str:
+    parts: list[str] = []
+    if step.step_id != default_step_id:
+        parts.append(f"#{step.step_id}")
+
+    seq = step.pyramid_sequence_m
+    if step.kind in _PYRAMID_KINDS and seq:
+        # reps and distance_per_rep_m default to len(seq) and min(seq).
+        if step.reps != len(seq) or step.distance_per_rep_m != min(seq):
+            parts.append(f"{step.reps} x {step.distance_per_rep_m}m")
+        parts.append(step.kind)
+    else:
+        if step.reps > 1:
+            parts.append(f"{step.reps} x {step.distance_per_rep_m}m")
+        else:
+            parts.append(f"{step.distance_per_rep_m}m")
+        if step.kind != ("intervals" if step.reps > 1 else "continuous"):
+            parts.append(DSL_KIND_LABELS.get(step.kind, step.kind))
+    if seq:
+        parts.append(f"[{'-'.join(str(d) for d in seq)}]m")
+    if step.broken_pause_s is not None:
+        parts.append(f"({step.broken_pause_s}s pause)")
+
+    parts.append(step.stroke)
+    parts.append(step.effort)
+    if step.target_time_s is not None:
+        parts.append(f"(target {_clock(step.target_time_s)})")
+
+    if step.sendoff_sequence_s:
+        parts.append(f"@ [{'-'.join(_clock(v) for v in step.sendoff_sequence_s)}]")
+    if step.rest_sequence_s:
+        parts.append(f"@ [{'-'.join(str(v) for v in step.rest_sequence_s)}]s rest")
+    if step.sendoff_seconds is not None:
+        parts.append(f"@ {_clock(step.sendoff_seconds)}")
+    if step.rest_seconds is not None:
+        parts.append(f"@ {step.rest_seconds}s rest")
+
+    gear = [name for name in DSL_GEAR if getattr(step, name)]
+    if gear:
+        parts.append(f"[{', '.join(gear)}]")
+
+    line = " ".join(parts)
+    if step.description:
+        line = f"{line} | {dsl_escape(step.description)}"
+    if step.split_instruction:
+        line = f"{line} | split: {dsl_escape(step.split_instruction)}"
+    return line
+
+
+def plan_to_dsl_text(plan: SwimPlanResponse) -> str:
+    """Every step field survives; gear flags set to False are written like None."""
+    lines: list[str] = []
+    for attr, header, default_title, id_prefix in DSL_SECTIONS:
+        section = getattr(plan.sections, attr)
+        if lines:
+            lines.append("")
+        lines.append(header if section.title == default_title else f"{header}: {section.title}")
+        for idx, step in enumerate(section.steps, start=1):
+            lines.append(_dsl_line_for_step(step, f"{id_prefix}-{idx}"))
+    return "\n".join(lines)
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import contextvars
+import math
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Coroutine, Optional, TypeVar
+
+from .models import SwimPlanResponse
+from .validator import ValidationIssue
+
+
+@dataclass(frozen=True)
+class HedgeBranch:
+    version: str
+    seed_offset: int = 0
+
+    @property
+    def label(self) -> str:
+        if self.seed_offset:
+            return f"{self.version}+seed{self.seed_offset}"
+        return self.version
+
+    def seed_for(self, seed: Optional[int]) -> Optional[int]:
+        if seed is None or not self.seed_offset:
+            return seed
+        return seed + self.seed_offset
+
+
+T = TypeVar("T")
+
+
+class HedgeStats:
+    """
+    Thread-safe record of first-call latencies and branch wins for one policy.
+    A branch cancelled before its first call returned contributes its elapsed
+    time, a lower bound on its latency, so slow calls still pull the p90 up.
+    """
+
+    def __init__(self, window: int = 200) -> None:
+        self._lock = threading.Lock()
+        self._latencies: deque[float] = deque(maxlen=window)
+        self.wins: Counter[str] = Counter()
+        self.last_winner: Optional[str] = None
+
+    def record_first_call(self, elapsed_s: float) -> None:
+        with self._lock:
+            self._latencies.append(elapsed_s)
+
+    def record_win(self, label: str) -> None:
+        with self._lock:
+            self.wins[label] += 1
+            self.last_winner = label
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples:
+            return None
+        idx = min(len(samples) - 1, max(0, math.ceil(pct * len(samples)) - 1))
+        return samples[idx]
+
+    @property
+    def sample_count(self) -> int:
+        with self._lock:
+            return len(self._latencies)
+
+
+@dataclass
+class HedgePolicy:
+    """
+    hedges are launched in order after the primary request. delays_s gives
+    the launch time of each hedge measured from the start of the request; when
+    omitted, hedges fire at multiples of the observed first-call p90 (or
+    default_delay_s until min_samples latencies have been seen). A primary
+    whose first response fails validation triggers the next hedge at once.
+    """
+
+    hedges: Optional[tuple[HedgeBranch, ...]] = None
+    delays_s: Optional[tuple[float, ...]] = None
+    percentile: float = 0.9
+    default_delay_s: float = 6.0
+    min_samples: int = 20
+    stats: HedgeStats = field(default_factory=HedgeStats)
+
+    def branches_for(self, version: str) -> list[HedgeBranch]:
+        primary = HedgeBranch(version)
+        if self.hedges is not None:
+            return [primary, *self.hedges]
+        other = "v1" if version == "v2" else "v2"
+        return [primary, HedgeBranch(other)]
+
+    def launch_offsets(self, hedge_count: int) -> list[float]:
+        if self.delays_s is not None:
+            if len(self.delays_s) < hedge_count:
+                raise ValueError("delays_s must provide a delay for every hedge branch")
+            return list(self.delays_s[:hedge_count])
+
+        delay = self.default_delay_s
+        if self.stats.sample_count >= self.min_samples:
+            delay = self.stats.percentile(self.percentile) or delay
+        return [delay * (i + 1) for i in range(hedge_count)]
+
+
+# A branch resolves to its plan and the outcome label it reached it by.
+BranchResult = tuple[SwimPlanResponse, str]
+BranchRunner = Callable[[HedgeBranch, Callable[[bool, float], None]], Awaitable[BranchResult]]
+
+
+async def race_branches(
+    policy: HedgePolicy,
+    version: str,
+    run_branch: BranchRunner,
+) -> BranchResult:
+    """
+    Runs the primary branch and staggers hedges after it. The first branch to
+    return a real plan wins and every other branch is cancelled; a deadline
+    fallback is only returned once no branch is left that could beat it.
+    """
+    branches = policy.branches_for(version)
+    offsets = policy.launch_offsets(len(branches) - 1)
+    start = time.monotonic()
+    early_hedge = asyncio.Event()
+
+    pending: dict[asyncio.Task, HedgeBranch] = {}
+    launched_at: dict[asyncio.Task, float] = {}
+    first_call_done: set[asyncio.Task] = set()
+    errors: list[str] = []
+    fallback: Optional[BranchResult] = None
+    next_idx = 0
+
+    def _launch() -> None:
+        nonlocal next_idx
+        branch = branches[next_idx]
+        next_idx += 1
+        early_hedge.clear()
+        task: Optional[asyncio.Task] = None
+
+        def _on_first_attempt(valid: bool, elapsed_s: float) -> None:
+            first_call_done.add(task)
+            policy.stats.record_first_call(elapsed_s)
+            if not valid:
+                early_hedge.set()
+
+        task = asyncio.ensure_future(run_branch(branch, _on_first_attempt))
+        pending[task] = branch
+        launched_at[task] = time.monotonic()
+
+    _launch()
+    try:
+        while pending:
+            timeout: Optional[float] = None
+            waiters: set[asyncio.Future] = set(pending)
+            early_waiter: Optional[asyncio.Task] = None
+            # Once a fallback is held nothing new launches, so wait on the
+            # running branches alone instead of spinning on a spent timer.
+            if fallback is None and next_idx < len(branches):
+                timeout = max(0.0, start + offsets[next_idx - 1] - time.monotonic())
+                early_waiter = asyncio.ensure_future(early_hedge.wait())
+                waiters.add(early_waiter)
+
+            done, _ = await asyncio.wait(
+                waiters,
+                timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if early_waiter is not None and not early_waiter.done():
+                early_waiter.cancel()
+
+            for task in done:
+                if task is early_waiter:
+                    continue
+                branch = pending.pop(task)
+                exc = task.exception()
+                if exc is not None:
+                    errors.append(f"[{branch.label}] {exc}")
+                elif task.result()[0].is_fallback:
+                    # The shared deadline is nearly spent: keep the fallback in
+                    # hand, let running branches finish, launch no new ones.
+                    fallback = fallback or task.result()
+                else:
+                    policy.stats.record_win(branch.label)
+                    return task.result()
+
+            if fallback is None and next_idx < len(branches) and (
+                not done or early_hedge.is_set() or not pending
+            ):
+                _launch()
+    finally:
+        now = time.monotonic()
+        for task in pending:
+            task.cancel()
+            if task not in first_call_done:
+                policy.stats.record_first_call(now - launched_at[task])
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    if fallback is not None:
+        return fallback
+    raise ValidationIssue("All hedged branches failed. " + " ".join(errors), code="hedge_failed")
+
+
+def _copy_outcome(task: asyncio.Task, future: concurrent.futures.Future) -> None:
+    if task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
+
+
+class _LoopThread:
+    """
+    One event loop on a daemon thread for sync callers of async code. Keeping a
+    single loop keeps its pooled AsyncAnthropic client alive across requests,
+    and works whether or not the calling thread already runs a loop.
+    """
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            # A dead thread also covers a fork: only the forking thread survives.
+            if self._loop is None or self._thread is None or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name=self._name, daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        loop = self._ensure()
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("cannot block on the hedge loop from inside it; await the coroutine instead")
+        # Run in the caller's context so spans nest under the caller's span.
+        context = contextvars.copy_context()
+        future: concurrent.futures.Future = concurrent.futures.Future()
+
+        def _start() -> None:
+            task = loop.create_task(coro, context=context)
+            task.add_done_callback(lambda t: _copy_outcome(t, future))
+
+        loop.call_soon_threadsafe(_start)
+        return future.result()
+
+
+HEDGE_LOOP = _LoopThread("swim-plan-hedge")
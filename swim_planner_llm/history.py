@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Mapping, Optional, Sequence, Union
+
+from .models import HistoricSession
+
+RISK_TAGS = frozenset({"pace-too-fast", "long", "tiring"})
+VARIED_HISTORY_TAGS = frozenset({"fun", "mixed", "varied", "technique"})
+# Bump when the to_summary() layout changes; older summaries are then rejected.
+SUMMARY_VERSION = 1
+
+
+@dataclass(frozen=True)
+class HistoryProfile:
+    """
+    Everything the planner reads from historic_sessions, gathered in one pass.
+    Distance ranges are (min, max) over sessions with a positive distance.
+    """
+
+    sessions: int = 0
+    up_distance_range: Optional[tuple[int, int]] = None
+    down_distance_range: Optional[tuple[int, int]] = None
+    # Shortest thumbs-down session that carried a risk tag.
+    risky_down_min_distance: Optional[int] = None
+    up_tags: frozenset[str] = frozenset()
+    down_tags: frozenset[str] = frozenset()
+    risk_down: bool = False
+    liked_interval_sessions: int = 0
+    liked_continuous_sessions: int = 0
+    # In first-seen order, so ties rank the way they always have.
+    liked_stroke_counts: dict[str, int] = field(default_factory=dict)
+    # Net thumbs on sessions tagged like a varied workout (see style_inference).
+    varied_history_score: int = 0
+    last_archetype_id: Optional[str] = None
+
+    def extend(self, historic_sessions: Iterable[HistoricSession]) -> "HistoryProfile":
+        """This history followed by historic_sessions, oldest first."""
+        return _accumulate(self, historic_sessions)
+
+    def add(self, session: HistoricSession) -> "HistoryProfile":
+        return _accumulate(self, (session,))
+
+    def to_summary(self) -> dict[str, Any]:
+        """JSON-ready form for SwimPlanInput.history_summary; its size does not grow with sessions."""
+        return {
+            "v": SUMMARY_VERSION,
+            "sessions": self.sessions,
+            "up_distance_range": list(self.up_distance_range) if self.up_distance_range else None,
+            "down_distance_range": list(self.down_distance_range) if self.down_distance_range else None,
+            "risky_down_min_distance": self.risky_down_min_distance,
+            "up_tags": sorted(self.up_tags),
+            "down_tags": sorted(self.down_tags),
+            "risk_down": self.risk_down,
+            "liked_interval_sessions": self.liked_interval_sessions,
+            "liked_continuous_sessions": self.liked_continuous_sessions,
+            "liked_stroke_counts": dict(self.liked_stroke_counts),
+            "varied_history_score": self.varied_history_score,
+            "last_archetype_id": self.last_archetype_id,
+        }
+
+    @classmethod
+    def from_summary(cls, summary: Mapping[str, Any]) -> "HistoryProfile":
+        if not isinstance(summary, Mapping):
+            raise ValueError("history summary must be an object")
+        if summary.get("v") != SUMMARY_VERSION:
+            raise ValueError(f"unsupported history summary version {summary.get('v')!r}, expected {SUMMARY_VERSION}")
+        # Deferred for the same reason as in _accumulate.
+        from .v2.archetypes import ARCHETYPES
+
+        last_archetype_id = _optional(summary, "last_archetype_id", str)
+        if last_archetype_id not in ARCHETYPES:
+            # Retired archetype: only rotation reads it, so forget it rather than fail.
+            last_archetype_id = None
+        strokes = summary.get("liked_stroke_counts") or {}
+        if not isinstance(strokes, Mapping) or not all(
+            isinstance(k, str) and _is_count(v) for k, v in strokes.items()
+        ):
+            raise ValueError("history summary liked_stroke_counts must map strokes to counts")
+        return cls(
+            sessions=_count(summary, "sessions"),
+            up_distance_range=_distance_range(summary, "up_distance_range"),
+            down_distance_range=_distance_range(summary, "down_distance_range"),
+            risky_down_min_distance=_optional(summary, "risky_down_min_distance", int),
+            up_tags=_tag_set(summary, "up_tags"),
+            down_tags=_tag_set(summary, "down_tags"),
+            risk_down=_optional(summary, "risk_down", bool) or False,
+            liked_interval_sessions=_count(summary, "liked_interval_sessions"),
+            liked_continuous_sessions=_count(summary, "liked_continuous_sessions"),
+            liked_stroke_counts=dict(strokes),
+            varied_history_score=_optional(summary, "varied_history_score", int) or 0,
+            last_archetype_id=last_archetype_id,
+        )
+
+
+HistoryLike = Union[HistoryProfile, Sequence[HistoricSession]]
+
+
+def _is_count(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+def _count(summary: Mapping[str, Any], key: str) -> int:
+    value = summary.get(key, 0)
+    if not _is_count(value):
+        raise ValueError(f"history summary {key} must be a non-negative integer")
+    return value
+
+
+def _optional(summary: Mapping[str, Any], key: str, kind: type) -> Any:
+    value = summary.get(key)
+    # bool is an int subclass; only accept it where a bool is expected.
+    if value is not None and (not isinstance(value, kind) or (kind is int and isinstance(value, bool))):
+        raise ValueError(f"history summary {key} must be {kind.__name__} or null")
+    return value
+
+
+def _distance_range(summary: Mapping[str, Any], key: str) -> Optional[tuple[int, int]]:
+    value = summary.get(key)
+    if value is None:
+        return None
+    valid = isinstance(value, (list, tuple)) and len(value) == 2 and all(_is_count(v) for v in value)
+    if not valid or value[0] > value[1]:
+        raise ValueError(f"history summary {key} must be [min, max] or null")
+    return value[0], value[1]
+
+
+def _tag_set(summary: Mapping[str, Any], key: str) -> frozenset[str]:
+    value = summary.get(key) or ()
+    if not isinstance(value, (list, tuple)) or not all(isinstance(v, str) for v in value):
+        raise ValueError(f"history summary {key} must be a list of tags")
+    return frozenset(value)
+
+
+def _widen(bounds: Optional[tuple[int, int]], value: int) -> tuple[int, int]:
+    if bounds is None:
+        return value, value
+    return min(bounds[0], value), max(bounds[1], value)
+
+
+def _main_set(plan: Any) -> dict:
+    sections = plan.get("sections") if isinstance(plan, dict) else None
+    main = sections.get("main_set") if isinstance(sections, dict) else None
+    return main if isinstance(main, dict) else {}
+
+
+EMPTY_HISTORY_PROFILE = HistoryProfile()
+
+
+def _accumulate(base: HistoryProfile, historic_sessions: Iterable[HistoricSession]) -> HistoryProfile:
+    up_range = base.up_distance_range
+    down_range = base.down_distance_range
+    risky_down_min = base.risky_down_min_distance
+    up_tags: set[str] = set(base.up_tags)
+    down_tags: set[str] = set(base.down_tags)
+    risk_down = base.risk_down
+    liked_intervals = base.liked_interval_sessions
+    liked_continuous = base.liked_continuous_sessions
+    stroke_counts = dict(base.liked_stroke_counts)
+    varied_score = base.varied_history_score
+    last_archetype_id = base.last_archetype_id
+    count = base.sessions
+    display_names: Optional[Mapping[str, str]] = None
+
+    for session in historic_sessions:
+        count += 1
+        plan = session.session_plan or {}
+        tags = {t.strip().lower() for t in session.tags if t and t.strip()}
+        distance = plan.get("estimated_distance_m")
+        if not (isinstance(distance, int) and distance > 0):
+            distance = None
+        main = _main_set(plan)
+
+        if session.thumb == 1:
+            if distance:
+                up_range = _widen(up_range, distance)
+            up_tags.update(tags)
+            steps = [s for s in main.get("steps") or () if isinstance(s, dict)]
+            kinds = {s.get("kind") for s in steps if s.get("kind")}
+            if "intervals" in kinds:
+                liked_intervals += 1
+            elif "continuous" in kinds:
+                liked_continuous += 1
+            for stroke in {s.get("stroke") for s in steps if s.get("stroke")}:
+                if stroke not in ("mixed", "choice"):
+                    stroke_counts[stroke] = stroke_counts.get(stroke, 0) + 1
+        else:
+            if distance:
+                down_range = _widen(down_range, distance)
+            down_tags.update(tags)
+            if tags & RISK_TAGS:
+                risk_down = True
+                if distance:
+                    risky_down_min = distance if risky_down_min is None else min(risky_down_min, distance)
+
+        if tags & VARIED_HISTORY_TAGS:
+            varied_score += 1 if session.thumb == 1 else -1
+
+        title = main.get("title", "")
+        if isinstance(title, str) and "—" in title:
+            if display_names is None:
+                # Deferred, and once per call rather than per session:
+                # v2.archetypes loads the v2 package, whose router reads profiles.
+                from .v2.archetypes import DISPLAY_NAME_TO_ID as display_names
+
+            name = title.partition("—")[2].strip().lower()
+            archetype_id = display_names.get(name) if name else None
+            if archetype_id:
+                last_archetype_id = archetype_id
+
+    return HistoryProfile(
+        sessions=count,
+        up_distance_range=up_range,
+        down_distance_range=down_range,
+        risky_down_min_distance=risky_down_min,
+        up_tags=frozenset(up_tags),
+        down_tags=frozenset(down_tags),
+        risk_down=risk_down,
+        liked_interval_sessions=liked_intervals,
+        liked_continuous_sessions=liked_continuous,
+        liked_stroke_counts=stroke_counts,
+        varied_history_score=varied_score,
+        last_archetype_id=last_archetype_id,
+    )
+
+
+def build_history_profile(historic_sessions: Sequence[HistoricSession]) -> HistoryProfile:
+    if not historic_sessions:
+        return EMPTY_HISTORY_PROFILE
+    return _accumulate(EMPTY_HISTORY_PROFILE, historic_sessions)
+
+
+def as_history_profile(history: HistoryLike) -> HistoryProfile:
+    if isinstance(history, HistoryProfile):
+        return history
+    return build_history_profile(history)
+
+
+def update_history_summary(
+    summary: Optional[Mapping[str, Any]],
+    session: Union[HistoricSession, Mapping[str, Any]],
+) -> dict[str, Any]:
+    """
+    Folds one completed session into a stored history summary (None starts a
+    new one) and returns the summary to store in its place.
+    """
+    profile = EMPTY_HISTORY_PROFILE if summary is None else HistoryProfile.from_summary(summary)
+    if not isinstance(session, HistoricSession):
+        session = HistoricSession.model_validate(session)
+    return profile.add(session).to_summary()
+
+
+__all__ = [
+    "EMPTY_HISTORY_PROFILE",
+    "HistoryLike",
+    "HistoryProfile",
+    "RISK_TAGS",
+    "SUMMARY_VERSION",
+    "VARIED_HISTORY_TAGS",
+    "as_history_profile",
+    "build_history_profile",
+    "update_history_summary",
+]
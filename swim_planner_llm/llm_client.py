@@ -4,11 +4,43 @@ import json
 import os
 from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Optional, Sequence
 
-from .models import HistoricSession, SwimPlanInput
+from .dsl import DSL_FORMAT_GUIDE
+from .history import HistoryLike, as_history_profile
+from .models import SwimPlanInput
 from .style_inference import infer_prefer_varied_from_payload
 
+if TYPE_CHECKING:
+    from .validator import Violation
+
+# Output formats the model can be asked for: "json" (the draft schema as free
+# text), "dsl" (the compact line format parsed by dsl.parse_plan_dsl) or "tool"
+# (the draft schema as the input of a forced tool call).
+OUTPUT_FORMATS = ("json", "dsl", "tool")
+PLAN_TOOL_NAME = "submit_swim_plan"
+
+
+class ProviderError(RuntimeError):
+    """A provider call that failed without a usable response; code is a stable snake_case label."""
+
+    def __init__(self, message: str, *, code: str) -> None:
+        super().__init__(message)
+        self.code = code
+
+_JSON_OUTPUT_RULE = (
+    "You must return valid JSON matching the provided schema exactly. "
+    "Do not include markdown, comments, explanations, or extra keys. "
+)
+_DSL_OUTPUT_RULE = (
+    "You must return the plan in the compact line format described in the request. "
+    "Do not include JSON, markdown, comments, or explanations. "
+)
+_TOOL_OUTPUT_RULE = (
+    f"You must submit the plan by calling the {PLAN_TOOL_NAME} tool with input matching its schema exactly. "
+    "Do not include extra keys. "
+)
+
 SYSTEM_PROMPT = (
     "You are an expert and fun swimming coach with deep knowledge of energy systems, periodization, "
     "and effective swim session design. You know how to make people enjoy swimming. "
@@ -16,17 +48,34 @@ SYSTEM_PROMPT = (
     "Your plans follow sound coaching principles: "
     "progressive warm-ups that prime the body for work, main sets matched to the target energy "
     "system, and genuine cool-downs that aid recovery and lactate clearance. "
-    "You must return valid JSON matching the provided schema exactly. "
-    "Do not include markdown, comments, explanations, or extra keys. "
+    f"{_JSON_OUTPUT_RULE}"
     "Sessions should feel engaging and varied — use pyramids, builds, descending sets, and mixed "
     "formats where appropriate to keep the swimmer interested and motivated."
 )
 
 
-def build_system_prompt() -> str:
+def build_system_prompt(output_format: str = "json") -> str:
+    if output_format == "dsl":
+        return SYSTEM_PROMPT.replace(_JSON_OUTPUT_RULE, _DSL_OUTPUT_RULE)
+    if output_format == "tool":
+        return SYSTEM_PROMPT.replace(_JSON_OUTPUT_RULE, _TOOL_OUTPUT_RULE)
     return SYSTEM_PROMPT
 
 
+def _output_shape_block(schema_excerpt: str, output_format: str) -> str:
+    if output_format == "dsl":
+        return f"OUTPUT FORMAT (replaces the JSON output rules above):\n{DSL_FORMAT_GUIDE}\n\n"
+    return f"OUTPUT SHAPE EXAMPLE:\n{schema_excerpt}\n\n"
+
+
+def _final_instruction(output_format: str) -> str:
+    if output_format == "dsl":
+        return "Return the plan lines only."
+    if output_format == "tool":
+        return f"Call the {PLAN_TOOL_NAME} tool with the final plan."
+    return "Return the final JSON object only."
+
+
 @lru_cache(maxsize=1)
 def _load_dotenv() -> None:
     for env_path in (Path(".env"), Path(".env.local")):
@@ -135,103 +184,41 @@ def _schema_excerpt() -> str:
     return json.dumps(example, indent=2)
 
 
-def _extract_distance(history: HistoricSession) -> Optional[int]:
-    plan = history.session_plan or {}
-    value = plan.get("estimated_distance_m")
-    return value if isinstance(value, int) and value > 0 else None
+def summarize_history(historic_sessions: HistoryLike) -> str:
+    profile = as_history_profile(historic_sessions)
 
-
-def _extract_main_set_kinds(history: HistoricSession) -> set[str]:
-    steps = (
-        (history.session_plan or {})
-        .get("sections", {})
-        .get("main_set", {})
-        .get("steps", [])
-    )
-    return {s.get("kind") for s in steps if isinstance(s, dict) and s.get("kind")}
-
-
-def _extract_main_set_strokes(history: HistoricSession) -> set[str]:
-    steps = (
-        (history.session_plan or {})
-        .get("sections", {})
-        .get("main_set", {})
-        .get("steps", [])
-    )
-    return {s.get("stroke") for s in steps if isinstance(s, dict) and s.get("stroke")}
-
-
-def summarize_history(historic_sessions: list[HistoricSession]) -> str:
-    up_distances: list[int] = []
-    down_distances: list[int] = []
-    up_tags: set[str] = set()
-    down_tags: set[str] = set()
-    disliked_long_hard_continuous = False
-    liked_interval_sessions = 0
-    liked_continuous_sessions = 0
-    liked_stroke_counts: dict[str, int] = {}
-
-    for item in historic_sessions:
-        d = _extract_distance(item)
-        tags = {t.strip().lower() for t in item.tags if t and t.strip()}
-        kinds = _extract_main_set_kinds(item)
-        strokes = _extract_main_set_strokes(item)
-
-        if item.thumb == 1:
-            if d:
-                up_distances.append(d)
-            up_tags.update(tags)
-            if "intervals" in kinds:
-                liked_interval_sessions += 1
-            elif "continuous" in kinds:
-                liked_continuous_sessions += 1
-            for stroke in strokes:
-                if stroke not in ("mixed", "choice"):
-                    liked_stroke_counts[stroke] = liked_stroke_counts.get(stroke, 0) + 1
-        else:
-            if d:
-                down_distances.append(d)
-            down_tags.update(tags)
-            if {"pace-too-fast", "long", "tiring"} & tags:
-                disliked_long_hard_continuous = True
-
-    def _range(values: list[int]) -> str:
-        if not values:
-            return "none"
-        return f"{min(values)}-{max(values)}m"
+    def _range(bounds: tuple[int, int]) -> str:
+        return f"{bounds[0]}-{bounds[1]}m"
 
     guidance: list[str] = []
 
-    if up_distances:
-        guidance.append(f"Prefer volume near {_range(up_distances)}.")
+    if profile.up_distance_range:
+        guidance.append(f"Prefer volume near {_range(profile.up_distance_range)}.")
     else:
         guidance.append("No positive volume signal available.")
 
-    if down_distances:
+    if profile.down_distance_range:
         guidance.append(
-            f"Avoid volume near {_range(down_distances)} unless strongly required."
+            f"Avoid volume near {_range(profile.down_distance_range)} unless strongly required."
         )
 
-    if up_tags:
-        guidance.append(f"Positive themes: {sorted(up_tags)}.")
+    if profile.up_tags:
+        guidance.append(f"Positive themes: {sorted(profile.up_tags)}.")
 
-    if down_tags:
-        guidance.append(f"Negative themes: {sorted(down_tags)}.")
+    if profile.down_tags:
+        guidance.append(f"Negative themes: {sorted(profile.down_tags)}.")
 
-    if disliked_long_hard_continuous:
+    if profile.risk_down:
         guidance.append("Avoid long hard continuous main sets; prefer intervals instead.")
 
-    if liked_interval_sessions > liked_continuous_sessions:
+    if profile.liked_interval_sessions > profile.liked_continuous_sessions:
         guidance.append("Historic preference: interval-based main sets over continuous.")
-    elif liked_continuous_sessions > liked_interval_sessions:
+    elif profile.liked_continuous_sessions > profile.liked_interval_sessions:
         guidance.append("Historic preference: continuous main sets over intervals.")
 
-    if liked_stroke_counts:
-        top_strokes = sorted(
-            liked_stroke_counts.keys(),
-            key=lambda s: liked_stroke_counts[s],
-            reverse=True,
-        )[:2]
+    stroke_counts = profile.liked_stroke_counts
+    if stroke_counts:
+        top_strokes = sorted(stroke_counts.keys(), key=lambda s: stroke_counts[s], reverse=True)[:2]
         guidance.append(f"Preferred strokes in liked sessions: {top_strokes}.")
 
     return " ".join(guidance)
@@ -546,49 +533,8 @@ def _style_hint(prefer_varied: bool) -> str:
     return "Inferred preferred style is straightforward. Keep the main set to one clear pattern."
 
 
-def build_user_prompt(
-    payload: SwimPlanInput,
-    schema_excerpt: str,
-    history_summary: str,
-) -> str:
-    requested_tags = _requested_tags(payload)
-    effort = payload.session_requested.effort
-    duration = payload.session_requested.duration_minutes
-    prefer_varied = infer_prefer_varied_from_payload(payload)
-
-    effort_hint = _effort_hint(effort)
-    style_hint = _style_hint(prefer_varied)
-    distance_guidance = _distance_guidance(duration, effort)
-    tag_hints = _requested_tag_hints(requested_tags)
-    section_proportions = _section_proportion_guidance(effort, duration)
-    session_override = _session_type_override(requested_tags, effort)
-    inferred_style = "varied" if prefer_varied else "straightforward"
-
-    swim_level = getattr(payload.session_requested, "swim_level", None)
-    swim_level_block = (
-        f"SWIM LEVEL:\n"
-        f"The swimmer's level is '{swim_level}'.\n"
-        f"{_swim_level_hint(swim_level)}\n\n"
-        if swim_level
-        else ""
-    )
-
-    override_block = (
-        f"SESSION OVERRIDE (takes precedence over EFFORT GUIDANCE for main_set structure):\n"
-        f"{session_override}\n\n"
-        if session_override
-        else ""
-    )
-
-    effort_block = (
-        f"EFFORT GUIDANCE:\n"
-        f"main_set structure is defined by the SESSION OVERRIDE — apply effort '{effort}' "
-        f"as described there.\n"
-        f"For warm_up and cool_down sections: {effort_hint}\n\n"
-        if session_override
-        else f"EFFORT GUIDANCE:\n{effort_hint}\n\n"
-    )
-
+@lru_cache(maxsize=4)
+def _user_prompt_prefix(schema_excerpt: str, output_format: str) -> str:
     return (
         "Generate a personalised swim session plan.\n\n"
         "DECISION PRIORITY (follow in this order):\n"
@@ -599,24 +545,6 @@ def build_user_prompt(
         "5. Match inferred session style from requested tags + history.\n"
         "6. Use history to prefer previously successful structure and volume.\n"
         "7. Apply remaining requested tags where compatible.\n\n"
-        "REQUEST:\n"
-        f"{json.dumps(payload.session_requested.model_dump(), sort_keys=True)}\n\n"
-        f"{swim_level_block}"
-        f"{override_block}"
-        "INFERRED STYLE:\n"
-        f"{inferred_style}\n\n"
-        "REQUESTED TAGS:\n"
-        f"{json.dumps(requested_tags)}\n"
-        f"{tag_hints}\n\n"
-        "HISTORIC GUIDANCE:\n"
-        f"{history_summary}\n\n"
-        f"{effort_block}"
-        "STYLE GUIDANCE:\n"
-        f"{style_hint}\n\n"
-        "DISTANCE GUIDANCE:\n"
-        f"{distance_guidance}\n\n"
-        "SECTION PROPORTIONS:\n"
-        f"{section_proportions}\n\n"
         "HARD CONSTRAINTS:\n"
         "- Return exactly ONE JSON object.\n"
         "- Do not include markdown.\n"
@@ -699,13 +627,132 @@ def build_user_prompt(
         "- For hard effort without a SESSION OVERRIDE, increase intensity using interval density or shorter rest, not excessive distance.\n"
         "- For hard sessions, warm_up must include a short activation piece before the main set.\n"
         "- Prefer expressing requested tag intent in the main_set first.\n\n"
-        "OUTPUT SHAPE EXAMPLE:\n"
-        f"{schema_excerpt}\n\n"
-        "Return the final JSON object only."
+        f"{_output_shape_block(schema_excerpt, output_format)}"
+    )
+
+
+def build_user_prompt(
+    payload: SwimPlanInput,
+    schema_excerpt: str,
+    history_summary: str,
+    output_format: str = "json",
+) -> str:
+    return "".join(build_user_prompt_parts(payload, schema_excerpt, history_summary, output_format))
+
+
+def build_user_prompt_parts(
+    payload: SwimPlanInput,
+    schema_excerpt: str,
+    history_summary: str,
+    output_format: str = "json",
+) -> tuple[str, str]:
+    """
+    Returns (prefix, suffix). The prefix holds the rules and schema shared by
+    every request and is byte-identical across calls, so it can be sent as a
+    prompt-cache breakpoint; the suffix carries everything request-specific.
+    """
+    requested_tags = _requested_tags(payload)
+    effort = payload.session_requested.effort
+    duration = payload.session_requested.duration_minutes
+    prefer_varied = infer_prefer_varied_from_payload(payload)
+
+    effort_hint = _effort_hint(effort)
+    style_hint = _style_hint(prefer_varied)
+    distance_guidance = _distance_guidance(duration, effort)
+    tag_hints = _requested_tag_hints(requested_tags)
+    section_proportions = _section_proportion_guidance(effort, duration)
+    session_override = _session_type_override(requested_tags, effort)
+    inferred_style = "varied" if prefer_varied else "straightforward"
+
+    swim_level = getattr(payload.session_requested, "swim_level", None)
+    swim_level_block = (
+        f"SWIM LEVEL:\n"
+        f"The swimmer's level is '{swim_level}'.\n"
+        f"{_swim_level_hint(swim_level)}\n\n"
+        if swim_level
+        else ""
+    )
+
+    override_block = (
+        f"SESSION OVERRIDE (takes precedence over EFFORT GUIDANCE for main_set structure):\n"
+        f"{session_override}\n\n"
+        if session_override
+        else ""
+    )
+
+    effort_block = (
+        f"EFFORT GUIDANCE:\n"
+        f"main_set structure is defined by the SESSION OVERRIDE — apply effort '{effort}' "
+        f"as described there.\n"
+        f"For warm_up and cool_down sections: {effort_hint}\n\n"
+        if session_override
+        else f"EFFORT GUIDANCE:\n{effort_hint}\n\n"
+    )
+
+    suffix = (
+        "REQUEST:\n"
+        f"{json.dumps(payload.session_requested.model_dump(), sort_keys=True)}\n\n"
+        f"{swim_level_block}"
+        f"{override_block}"
+        "INFERRED STYLE:\n"
+        f"{inferred_style}\n\n"
+        "REQUESTED TAGS:\n"
+        f"{json.dumps(requested_tags)}\n"
+        f"{tag_hints}\n\n"
+        "HISTORIC GUIDANCE:\n"
+        f"{history_summary}\n\n"
+        f"{effort_block}"
+        "STYLE GUIDANCE:\n"
+        f"{style_hint}\n\n"
+        "DISTANCE GUIDANCE:\n"
+        f"{distance_guidance}\n\n"
+        "SECTION PROPORTIONS:\n"
+        f"{section_proportions}\n\n"
+        f"{_final_instruction(output_format)}"
+    )
+    return _user_prompt_prefix(schema_excerpt, output_format), suffix
+
+
+def _validation_error_block(error_text: str, violations: Sequence[Violation]) -> str:
+    if not violations:
+        return f"VALIDATION ERROR:\n{error_text}\n\n"
+    lines = [f"- [{v.code}] {v.message} (at {v.path or 'plan'})" for v in violations]
+    return (
+        f"VALIDATION ERRORS ({len(violations)}; fix every one in a single pass):\n"
+        + "\n".join(lines)
+        + "\n\n"
     )
 
 
-def build_repair_prompt(original_text: str, error_text: str, schema_excerpt: str) -> str:
+def build_repair_prompt(
+    original_text: str,
+    error_text: str,
+    schema_excerpt: str,
+    violations: Sequence[Violation] = (),
+    output_format: str = "json",
+) -> str:
+    return "".join(
+        build_repair_prompt_parts(original_text, error_text, schema_excerpt, violations, output_format)
+    )
+
+
+def _repair_task_block(output_format: str) -> str:
+    if output_format == "dsl":
+        return (
+            "Your previous response was invalid.\n\n"
+            "TASK:\n"
+            "Return a corrected version of the plan lines only.\n"
+            "Do not explain the error.\n"
+            "Do not include markdown or JSON.\n"
+            "Do not include any text before or after the plan lines.\n\n"
+        )
+    if output_format == "tool":
+        return (
+            "Your previous response was invalid.\n\n"
+            "TASK:\n"
+            f"Call the {PLAN_TOOL_NAME} tool again with a corrected plan.\n"
+            "Do not explain the error.\n\n"
+        )
     return (
         "Your previous response was invalid.\n\n"
         "TASK:\n"
@@ -713,26 +760,52 @@ def build_repair_prompt(original_text: str, error_text: str, schema_excerpt: str
         "Do not explain the error.\n"
         "Do not include markdown.\n"
         "Do not include any text before or after the JSON.\n\n"
-        "VALIDATION ERROR:\n"
-        f"{error_text}\n\n"
+    )
+
+
+def _repair_final_instruction(output_format: str) -> str:
+    if output_format == "dsl":
+        return "Return the corrected plan lines only."
+    if output_format == "tool":
+        return f"Call the {PLAN_TOOL_NAME} tool with the corrected plan only."
+    return "Return one corrected JSON object only."
+
+
+@lru_cache(maxsize=4)
+def _repair_prompt_prefix(schema_excerpt: str, output_format: str) -> str:
+    if output_format == "dsl":
+        shape = f"REQUIRED FORMAT:\n{DSL_FORMAT_GUIDE}\n\n"
+    else:
+        shape = f"REQUIRED SHAPE:\n{schema_excerpt}\n\n"
+    return _repair_task_block(output_format) + shape
+
+
+def build_repair_prompt_parts(
+    original_text: str,
+    error_text: str,
+    schema_excerpt: str,
+    violations: Sequence[Violation] = (),
+    output_format: str = "json",
+) -> tuple[str, str]:
+    suffix = (
+        f"{_validation_error_block(error_text, violations)}"
         "PREVIOUS OUTPUT:\n"
         f"{original_text}\n\n"
-        "REQUIRED SHAPE:\n"
-        f"{schema_excerpt}\n\n"
-        "Return one corrected JSON object only."
+        f"{_repair_final_instruction(output_format)}"
     )
+    return _repair_prompt_prefix(schema_excerpt, output_format), suffix
 
 
 def _chat_completion(messages: list[dict[str, str]], seed: Optional[int]) -> str:
     _load_dotenv()
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
-        raise RuntimeError("OPENAI_API_KEY is missing")
+        raise ProviderError("OPENAI_API_KEY is missing", code="missing_api_key")
 
     try:
         from openai import OpenAI
     except Exception as exc:  # pragma: no cover
-        raise RuntimeError("openai package not available") from exc
+        raise ProviderError("openai package not available", code="provider_unavailable") from exc
 
     client = OpenAI(api_key=api_key)
     model = os.getenv("SWIM_PLANNER_MODEL", "gpt-4.1-mini")
@@ -749,13 +822,13 @@ def _chat_completion(messages: list[dict[str, str]], seed: Optional[int]) -> str
     response = client.chat.completions.create(**params)
     content = response.choices[0].message.content
     if not content:
-        raise RuntimeError("Model returned empty response")
+        raise ProviderError("Model returned empty response", code="empty_response")
     return content
 
 
 def request_plan_json(payload: SwimPlanInput, seed: Optional[int]) -> str:
     schema_excerpt = _schema_excerpt()
-    history_summary = summarize_history(payload.historic_sessions)
+    history_summary = summarize_history(payload.history_profile)
 
     messages = [
         {"role": "system", "content": build_system_prompt()},
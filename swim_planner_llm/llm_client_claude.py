@@ -1,25 +1,217 @@
 from __future__ import annotations
 
+import json
 import os
-from typing import Optional
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Mapping, Optional, Protocol, Sequence, Union
 
+from .budget import estimate_max_tokens, usage_labels
+from .claude_client import CLIENTS
 from .llm_client import (
+    PLAN_TOOL_NAME,
+    ProviderError,
     _load_dotenv,
     _schema_excerpt,
     build_system_prompt,
-    build_user_prompt,
-    build_repair_prompt,
+    build_user_prompt_parts,
+    build_repair_prompt_parts,
     summarize_history,
 )
-from .models import SwimPlanInput
+from .models import LLMPlanDraft, SwimPlanInput
+from .profiling import local_work
+from .streaming import StreamMonitor
+from .tracing import current_span, span
+from .validator import Violation
 from .v2.prompts import (
     build_repair_prompt_v2,
     build_system_prompt_v2,
-    build_user_prompt_v2,
+    build_user_prompt_v2_parts,
 )
 from .v2.router import build_generation_spec_v2
 
 
+# A user prompt is either one string or a (static prefix, per-request suffix)
+# pair; the prefix is marked as a prompt-cache breakpoint when it is long
+# enough to be cached.
+UserPrompt = Union[str, tuple[str, str]]
+
+# Shortest prefix (tools + system + marked block) each model family will
+# cache; a breakpoint below it is ignored and cache_creation_input_tokens
+# stays 0. Unlisted models get the largest minimum; first matching prefix wins.
+_MIN_CACHEABLE_TOKENS: tuple[tuple[str, int], ...] = (
+    ("claude-haiku-4-5", 4096),
+    ("claude-opus-4-5", 4096),
+    ("claude-3-5-haiku", 2048),
+    ("claude-3-haiku", 2048),
+    ("claude-sonnet-4", 1024),
+    ("claude-opus-4", 1024),
+    ("claude-3-7-sonnet", 1024),
+)
+# Conservative for these prompts (they measure about 4 chars per token), so a
+# prefix near the minimum still gets its breakpoint.
+_CHARS_PER_TOKEN = 3.5
+
+
+@dataclass(frozen=True)
+class TokenUsage:
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_creation_input_tokens: int = 0
+    cache_read_input_tokens: int = 0
+
+    @classmethod
+    def from_usage(cls, usage) -> "TokenUsage":
+        if usage is None:
+            return cls()
+        return cls(
+            input_tokens=getattr(usage, "input_tokens", 0) or 0,
+            output_tokens=getattr(usage, "output_tokens", 0) or 0,
+            cache_creation_input_tokens=getattr(usage, "cache_creation_input_tokens", 0) or 0,
+            cache_read_input_tokens=getattr(usage, "cache_read_input_tokens", 0) or 0,
+        )
+
+    def __add__(self, other: "TokenUsage") -> "TokenUsage":
+        return TokenUsage(
+            input_tokens=self.input_tokens + other.input_tokens,
+            output_tokens=self.output_tokens + other.output_tokens,
+            cache_creation_input_tokens=self.cache_creation_input_tokens + other.cache_creation_input_tokens,
+            cache_read_input_tokens=self.cache_read_input_tokens + other.cache_read_input_tokens,
+        )
+
+
+class UsageSink(Protocol):
+    def record_usage(self, usage: TokenUsage, labels: Mapping[str, str]) -> None: ...
+
+
+def _usage_fields(usage: TokenUsage) -> dict:
+    cached_input = usage.cache_read_input_tokens + usage.cache_creation_input_tokens
+    return {
+        "input_tokens": usage.input_tokens,
+        "output_tokens": usage.output_tokens,
+        "cache_creation_input_tokens": usage.cache_creation_input_tokens,
+        "cache_read_input_tokens": usage.cache_read_input_tokens,
+        "cache_read_ratio": (
+            usage.cache_read_input_tokens / (cached_input + usage.input_tokens)
+            if cached_input + usage.input_tokens
+            else 0.0
+        ),
+    }
+
+
+class UsageRecorder:
+    """
+    Accumulates token usage (including prompt-cache reads/writes) across Claude
+    calls, in total and per (version, archetype), and forwards every call with
+    its labels to the registered sinks.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.truncated = 0
+        self.total = TokenUsage()
+        self.last: Optional[TokenUsage] = None
+        self.by_label: dict[tuple[str, str], TokenUsage] = {}
+        self.calls_by_label: Counter[tuple[str, str]] = Counter()
+        self._sinks: list[UsageSink] = []
+
+    def add_sink(self, sink: UsageSink) -> None:
+        with self._lock:
+            self._sinks.append(sink)
+
+    def remove_sink(self, sink: UsageSink) -> None:
+        with self._lock:
+            self._sinks.remove(sink)
+
+    def record(
+        self,
+        usage: TokenUsage,
+        labels: Optional[Mapping[str, str]] = None,
+        *,
+        truncated: bool = False,
+    ) -> None:
+        labels = dict(labels or {})
+        key = (labels.get("version", "unknown"), labels.get("archetype", "unknown"))
+        with self._lock:
+            self.calls += 1
+            self.truncated += int(truncated)
+            self.total = self.total + usage
+            self.last = usage
+            self.by_label[key] = self.by_label.get(key, TokenUsage()) + usage
+            self.calls_by_label[key] += 1
+            sinks = list(self._sinks)
+        for sink in sinks:
+            sink.record_usage(usage, labels)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "truncated": self.truncated,
+                **_usage_fields(self.total),
+                "by_archetype": {
+                    f"{version}/{archetype}": {
+                        "calls": self.calls_by_label[(version, archetype)],
+                        **_usage_fields(usage),
+                    }
+                    for (version, archetype), usage in sorted(self.by_label.items())
+                },
+            }
+
+
+USAGE = UsageRecorder()
+
+
+def _record_usage(message, labels: Optional[Mapping[str, str]] = None) -> None:
+    if message is not None:
+        usage = TokenUsage.from_usage(getattr(message, "usage", None))
+        truncated = getattr(message, "stop_reason", None) == "max_tokens"
+        USAGE.record(usage, labels, truncated=truncated)
+        llm_span = current_span()
+        if llm_span.recording:
+            llm_span.set_attribute("llm.input_tokens", usage.input_tokens)
+            llm_span.set_attribute("llm.output_tokens", usage.output_tokens)
+            llm_span.set_attribute("llm.cache_read_input_tokens", usage.cache_read_input_tokens)
+            llm_span.set_attribute("llm.cache_creation_input_tokens", usage.cache_creation_input_tokens)
+            llm_span.set_attribute("llm.truncated", truncated)
+
+
+def _stream_snapshot(stream):
+    try:
+        return stream.current_message_snapshot
+    except Exception:  # no message_start received yet
+        return None
+
+
+def _min_cacheable_tokens(model: str) -> int:
+    for family, tokens in _MIN_CACHEABLE_TOKENS:
+        if model.startswith(family):
+            return tokens
+    return max(tokens for _, tokens in _MIN_CACHEABLE_TOKENS)
+
+
+def _user_content(user: UserPrompt, system: str, tools: Sequence[dict] = ()):
+    if isinstance(user, str):
+        return user
+    prefix, suffix = user
+    # Only content up to and including the marked block is cached, so the
+    # system prompt and tools ride along with the static prefix. Today's v1
+    # plan prefix (~2.7k tokens) and repair prefixes (~0.8k) are below the
+    # haiku-4-5 minimum, so they go unmarked there rather than pay for a
+    # breakpoint that never writes.
+    cached_chars = len(system) + len(prefix) + sum(len(json.dumps(tool)) for tool in tools)
+    if cached_chars / _CHARS_PER_TOKEN < _min_cacheable_tokens(_claude_model()):
+        return prefix + suffix
+    return [
+        {"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": suffix},
+    ]
+
+
 def _strip_markdown_fences(text: str) -> str:
     """Remove ```json ... ``` or ``` ... ``` wrappers Claude sometimes adds."""
     stripped = text.strip()
@@ -34,31 +226,290 @@ def _strip_markdown_fences(text: str) -> str:
     return stripped.strip()
 
 
-def _chat_completion_claude(system: str, user: str) -> str:
+def _claude_api_key() -> str:
     _load_dotenv()
     api_key = os.getenv("ANTHROPIC_API_KEY")
     if not api_key:
-        raise RuntimeError("ANTHROPIC_API_KEY is missing")
+        raise ProviderError("ANTHROPIC_API_KEY is missing", code="missing_api_key")
+    return api_key
+
+
+def _claude_model() -> str:
+    return os.getenv("SWIM_PLANNER_CLAUDE_MODEL", "claude-haiku-4-5-20251001")
+
+
+def _response_text(response) -> str:
+    content = response.content[0].text if response.content else ""
+    if not content:
+        raise ProviderError("Model returned empty response", code="empty_response")
+    return _strip_markdown_fences(content)
 
+
+def _anthropic():
     try:
         import anthropic
     except Exception as exc:  # pragma: no cover
-        raise RuntimeError("anthropic package not available") from exc
+        raise ProviderError("anthropic package not available", code="provider_unavailable") from exc
+    return anthropic
+
+
+def _sync_client(timeout: Optional[float]):
+    _anthropic()
+    client = CLIENTS.get_sync(_claude_api_key)
+    if timeout is not None:
+        # A deadline-bound call must not be stretched by SDK-level retries.
+        client = client.with_options(timeout=timeout, max_retries=0)
+    return client
+
 
-    client = anthropic.Anthropic(api_key=api_key)
-    model = os.getenv("SWIM_PLANNER_CLAUDE_MODEL", "claude-haiku-4-5-20251001")
+def _async_client():
+    _anthropic()
+    return CLIENTS.get_async(_claude_api_key)
 
-    response = client.messages.create(
-        model=model,
-        max_tokens=4096,
+
+def _chat_completion_claude(
+    system: str,
+    user: UserPrompt,
+    *,
+    timeout: Optional[float] = None,
+    max_tokens: int = 4096,
+    labels: Optional[Mapping[str, str]] = None,
+) -> str:
+    client = _sync_client(timeout)
+
+    try:
+        response = client.messages.create(
+            model=_claude_model(),
+            max_tokens=max_tokens,
+            system=system,
+            messages=[{"role": "user", "content": _user_content(user, system)}],
+        )
+    except _anthropic().APITimeoutError as exc:
+        raise TimeoutError("Claude request timed out") from exc
+    _record_usage(response, labels)
+    return _response_text(response)
+
+
+async def _chat_completion_claude_async(
+    system: str,
+    user: UserPrompt,
+    *,
+    max_tokens: int = 4096,
+    labels: Optional[Mapping[str, str]] = None,
+) -> str:
+    client = _async_client()
+
+    response = await client.messages.create(
+        model=_claude_model(),
+        max_tokens=max_tokens,
         system=system,
-        messages=[{"role": "user", "content": user}],
+        messages=[{"role": "user", "content": _user_content(user, system)}],
     )
+    _record_usage(response, labels)
+    return _response_text(response)
 
-    content = response.content[0].text if response.content else ""
+
+def _chat_completion_claude_stream(
+    system: str,
+    user: UserPrompt,
+    monitor: StreamMonitor,
+    *,
+    timeout: Optional[float] = None,
+    max_tokens: int = 4096,
+    labels: Optional[Mapping[str, str]] = None,
+) -> str:
+    client = _sync_client(timeout)
+    # httpx timeouts bound each read, not the call: a stream that keeps
+    # producing tokens would never trip them, so the budget is checked here.
+    deadline = time.monotonic() + timeout if timeout is not None else None
+
+    # Leaving the context manager early (monitor raised) closes the HTTP
+    # stream, so we stop paying for tokens of a plan we already rejected.
+    try:
+        with client.messages.stream(
+            model=_claude_model(),
+            max_tokens=max_tokens,
+            system=system,
+            messages=[{"role": "user", "content": _user_content(user, system)}],
+        ) as stream:
+            try:
+                for text in stream.text_stream:
+                    monitor.on_text(text)
+                    if deadline is not None and time.monotonic() > deadline:
+                        raise TimeoutError("Claude stream ran past its deadline")
+            finally:
+                # An aborted stream still reports the input/cache usage it billed.
+                _record_usage(_stream_snapshot(stream), labels)
+    except _anthropic().APITimeoutError as exc:
+        raise TimeoutError("Claude request timed out") from exc
+
+    content = _strip_markdown_fences(monitor.text)
     if not content:
-        raise RuntimeError("Model returned empty response")
-    return _strip_markdown_fences(content)
+        raise ProviderError("Model returned empty response", code="empty_response")
+    return content
+
+
+async def _chat_completion_claude_stream_async(
+    system: str,
+    user: UserPrompt,
+    monitor: StreamMonitor,
+    *,
+    max_tokens: int = 4096,
+    labels: Optional[Mapping[str, str]] = None,
+) -> str:
+    client = _async_client()
+
+    async with client.messages.stream(
+        model=_claude_model(),
+        max_tokens=max_tokens,
+        system=system,
+        messages=[{"role": "user", "content": _user_content(user, system)}],
+    ) as stream:
+        try:
+            async for text in stream.text_stream:
+                monitor.on_text(text)
+        finally:
+            _record_usage(_stream_snapshot(stream), labels)
+
+    content = _strip_markdown_fences(monitor.text)
+    if not content:
+        raise ProviderError("Model returned empty response", code="empty_response")
+    return content
+
+
+def _inline_refs(node: Any, defs: dict[str, Any]) -> Any:
+    if isinstance(node, dict):
+        ref = node.get("$ref")
+        if isinstance(ref, str) and ref.startswith("#/$defs/"):
+            return _inline_refs(defs[ref[len("#/$defs/"):]], defs)
+        return {k: _inline_refs(v, defs) for k, v in node.items() if k != "$defs"}
+    if isinstance(node, list):
+        return [_inline_refs(v, defs) for v in node]
+    return node
+
+
+@lru_cache(maxsize=1)
+def plan_tool() -> dict:
+    """Tool definition whose input schema is LLMPlanDraft, with $refs inlined."""
+    schema = LLMPlanDraft.model_json_schema()
+    return {
+        "name": PLAN_TOOL_NAME,
+        "description": "Submit the complete swim session plan.",
+        "input_schema": _inline_refs(schema, schema.get("$defs", {})),
+    }
+
+
+def _tool_input(response) -> dict:
+    for block in response.content or ():
+        if getattr(block, "type", None) == "tool_use" and block.name == PLAN_TOOL_NAME:
+            if not isinstance(block.input, dict):
+                raise ProviderError("Model returned a non-object tool input", code="tool_input_invalid")
+            return block.input
+    raise ProviderError("Model returned no tool call", code="no_tool_call")
+
+
+def _chat_completion_claude_tool(
+    system: str,
+    user: UserPrompt,
+    *,
+    timeout: Optional[float] = None,
+    max_tokens: int = 4096,
+    labels: Optional[Mapping[str, str]] = None,
+) -> dict:
+    client = _sync_client(timeout)
+
+    try:
+        response = client.messages.create(
+            model=_claude_model(),
+            max_tokens=max_tokens,
+            system=system,
+            messages=[{"role": "user", "content": _user_content(user, system, [plan_tool()])}],
+            tools=[plan_tool()],
+            tool_choice={"type": "tool", "name": PLAN_TOOL_NAME},
+        )
+    except _anthropic().APITimeoutError as exc:
+        raise TimeoutError("Claude request timed out") from exc
+    _record_usage(response, labels)
+    return _tool_input(response)
+
+
+async def _chat_completion_claude_tool_async(
+    system: str,
+    user: UserPrompt,
+    *,
+    max_tokens: int = 4096,
+    labels: Optional[Mapping[str, str]] = None,
+) -> dict:
+    client = _async_client()
+
+    response = await client.messages.create(
+        model=_claude_model(),
+        max_tokens=max_tokens,
+        system=system,
+        messages=[{"role": "user", "content": _user_content(user, system, [plan_tool()])}],
+        tools=[plan_tool()],
+        tool_choice={"type": "tool", "name": PLAN_TOOL_NAME},
+    )
+    _record_usage(response, labels)
+    return _tool_input(response)
+
+
+def _stream_monitor(payload: SwimPlanInput, version: str, output_format: str = "json") -> StreamMonitor:
+    spec = build_generation_spec_v2(payload) if version == "v2" else None
+    return StreamMonitor(v2_spec=spec, output_format=output_format)
+
+
+def _call_options(payload: SwimPlanInput, version: str, output_format: str, call: str) -> dict:
+    spec = build_generation_spec_v2(payload) if version == "v2" else None
+    return {
+        "max_tokens": estimate_max_tokens(payload, version, output_format, spec),
+        "labels": usage_labels(payload, version, call, spec),
+    }
+
+
+def _plan_prompts(
+    payload: SwimPlanInput,
+    version: str,
+    output_format: str = "json",
+) -> tuple[str, UserPrompt]:
+    with span("swim_plan.build_prompt", call="plan", version=version), local_work():
+        history_summary = summarize_history(payload.history_profile)
+
+        if version == "v1":
+            system = build_system_prompt(output_format)
+            user = build_user_prompt_parts(payload, _schema_excerpt(), history_summary, output_format)
+        elif version == "v2":
+            spec = build_generation_spec_v2(payload)
+            system = build_system_prompt_v2(output_format)
+            user = build_user_prompt_v2_parts(payload, history_summary, spec, output_format)
+        else:
+            raise ValueError(f"Unknown version '{version}'. Use 'v1' or 'v2'.")
+
+    return system, user
+
+
+def _repair_prompts(
+    payload: SwimPlanInput,
+    bad_output: str,
+    error_text: str,
+    version: str,
+    violations: Sequence[Violation] = (),
+    output_format: str = "json",
+) -> tuple[str, UserPrompt]:
+    with span("swim_plan.build_prompt", call="repair", version=version), local_work():
+        if version == "v1":
+            system = build_system_prompt(output_format)
+            user = build_repair_prompt_parts(
+                bad_output, error_text, _schema_excerpt(), violations, output_format
+            )
+        elif version == "v2":
+            spec = build_generation_spec_v2(payload)
+            system = build_system_prompt_v2(output_format)
+            user = build_repair_prompt_v2(bad_output, error_text, spec, violations, output_format)
+        else:
+            raise ValueError(f"Unknown version '{version}'. Use 'v1' or 'v2'.")
+
+    return system, user
 
 
 def request_plan_json_claude(
@@ -66,38 +517,77 @@ def request_plan_json_claude(
     seed: Optional[int],
     *,
     version: str = "v1",
-) -> str:
-    history_summary = summarize_history(payload.historic_sessions)
+    stream: bool = False,
+    timeout: Optional[float] = None,
+    output_format: str = "json",
+) -> Union[str, dict]:
+    system, user = _plan_prompts(payload, version, output_format)
+    options = _call_options(payload, version, output_format, "plan")
+    if output_format == "tool":
+        return _chat_completion_claude_tool(system, user, timeout=timeout, **options)
+    if stream:
+        return _chat_completion_claude_stream(
+            system,
+            user,
+            _stream_monitor(payload, version, output_format),
+            timeout=timeout,
+            **options,
+        )
+    return _chat_completion_claude(system, user, timeout=timeout, **options)
+
 
-    if version == "v1":
-        system = build_system_prompt()
-        user = build_user_prompt(payload, _schema_excerpt(), history_summary)
-    elif version == "v2":
-        spec = build_generation_spec_v2(payload)
-        system = build_system_prompt_v2()
-        user = build_user_prompt_v2(payload, history_summary, spec)
-    else:
-        raise ValueError(f"Unknown version '{version}'. Use 'v1' or 'v2'.")
+def request_repair_json_claude(
+    payload: SwimPlanInput,
+    bad_output: str,
+    error_text: str,
+    seed: Optional[int],
+    *,
+    version: str = "v1",
+    timeout: Optional[float] = None,
+    violations: Sequence[Violation] = (),
+    output_format: str = "json",
+) -> Union[str, dict]:
+    system, user = _repair_prompts(payload, bad_output, error_text, version, violations, output_format)
+    options = _call_options(payload, version, output_format, "repair")
+    if output_format == "tool":
+        return _chat_completion_claude_tool(system, user, timeout=timeout, **options)
+    return _chat_completion_claude(system, user, timeout=timeout, **options)
 
-    return _chat_completion_claude(system, user)
 
+async def request_plan_json_claude_async(
+    payload: SwimPlanInput,
+    seed: Optional[int],
+    *,
+    version: str = "v1",
+    stream: bool = False,
+    output_format: str = "json",
+) -> Union[str, dict]:
+    system, user = _plan_prompts(payload, version, output_format)
+    options = _call_options(payload, version, output_format, "plan")
+    if output_format == "tool":
+        return await _chat_completion_claude_tool_async(system, user, **options)
+    if stream:
+        return await _chat_completion_claude_stream_async(
+            system,
+            user,
+            _stream_monitor(payload, version, output_format),
+            **options,
+        )
+    return await _chat_completion_claude_async(system, user, **options)
 
-def request_repair_json_claude(
+
+async def request_repair_json_claude_async(
     payload: SwimPlanInput,
     bad_output: str,
     error_text: str,
     seed: Optional[int],
     *,
     version: str = "v1",
-) -> str:
-    if version == "v1":
-        system = build_system_prompt()
-        user = build_repair_prompt(bad_output, error_text, _schema_excerpt())
-    elif version == "v2":
-        spec = build_generation_spec_v2(payload)
-        system = build_system_prompt_v2()
-        user = build_repair_prompt_v2(bad_output, error_text, spec)
-    else:
-        raise ValueError(f"Unknown version '{version}'. Use 'v1' or 'v2'.")
-
-    return _chat_completion_claude(system, user)
+    violations: Sequence[Violation] = (),
+    output_format: str = "json",
+) -> Union[str, dict]:
+    system, user = _repair_prompts(payload, bad_output, error_text, version, violations, output_format)
+    options = _call_options(payload, version, output_format, "repair")
+    if output_format == "tool":
+        return await _chat_completion_claude_tool_async(system, user, **options)
+    return await _chat_completion_claude_async(system, user, **options)
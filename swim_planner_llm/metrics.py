@@ -0,0 +1,389 @@
+from __future__ import annotations
+
+import math
+import os
+import threading
+from bisect import bisect_left
+from typing import Mapping, Optional, Sequence, Union
+
+from .llm_client import ProviderError
+from .llm_client_claude import USAGE, TokenUsage
+from .tracing import add_span_sink, remove_span_sink
+from .validator import ValidationIssue
+
+# SWIM_PLANNER_METRICS=0 turns collection off (the registry stays empty). It is
+# read on the first generate call, not at import: until metrics are installed
+# no span sink is registered and span() stays a no-op.
+METRICS_ENV = "SWIM_PLANNER_METRICS"
+
+LATENCY_BUCKETS_S = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+LabelValues = tuple[str, ...]
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> list[tuple[LabelValues, float]]:
+        with self._lock:
+            return sorted(self._values.items())
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS_S,
+    ):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # labels -> [per-bucket counts (last slot is +Inf), sum, count]
+        self._values: dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][idx] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self) -> list[tuple[LabelValues, dict]]:
+        with self._lock:
+            out = []
+            for labels, (counts, total, count) in sorted(self._values.items()):
+                cumulative, running = [], 0
+                for c in counts:
+                    running += c
+                    cumulative.append(running)
+                out.append((labels, {"buckets": cumulative, "sum": total, "count": count}))
+            return out
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+Metric = Union[Counter, Histogram]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: Optional[tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.label_names != metric.label_names:
+                    raise ValueError(f"Metric '{metric.name}' is already registered with a different shape.")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, label_names))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS_S,
+    ) -> Histogram:
+        return self._register(Histogram(name, help_text, label_names, buckets))
+
+    def metrics(self) -> list[Metric]:
+        with self._lock:
+            return [self._metrics[name] for name in sorted(self._metrics)]
+
+    def reset(self) -> None:
+        for metric in self.metrics():
+            metric.reset()
+
+    def snapshot(self) -> dict:
+        out: dict[str, dict] = {}
+        for metric in self.metrics():
+            samples = []
+            for values, value in metric.samples():
+                labels = dict(zip(metric.label_names, values))
+                if isinstance(metric, Histogram):
+                    bounds = [*metric.buckets, math.inf]
+                    samples.append(
+                        {
+                            "labels": labels,
+                            "count": value["count"],
+                            "sum": value["sum"],
+                            "buckets": {_number(b): c for b, c in zip(bounds, value["buckets"])},
+                        }
+                    )
+                else:
+                    samples.append({"labels": labels, "value": value})
+            out[metric.name] = {"type": metric.kind, "help": metric.help, "samples": samples}
+        return out
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines: list[str] = []
+        for metric in self.metrics():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for values, value in metric.samples():
+                if isinstance(metric, Histogram):
+                    bounds = [*metric.buckets, math.inf]
+                    for bound, count in zip(bounds, value["buckets"]):
+                        labels = _label_text(metric.label_names, values, ("le", _number(bound)))
+                        lines.append(f"{metric.name}_bucket{labels} {count}")
+                    labels = _label_text(metric.label_names, values)
+                    lines.append(f"{metric.name}_sum{labels} {_number(value['sum'])}")
+                    lines.append(f"{metric.name}_count{labels} {value['count']}")
+                else:
+                    lines.append(f"{metric.name}{_label_text(metric.label_names, values)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Raise sites attach a code; these message fragments only classify errors that
+# arrive without one (e.g. replayed from a cassette), in match order.
+_ISSUE_CODES = (
+    ("json parse failed", "json_parse_failed"),
+    ("must be a single JSON object", "json_not_object"),
+    ("dsl parse failed", "dsl_parse_failed"),
+    ("draft schema failed", "draft_schema_invalid"),
+    ("schema validation failed", "schema_invalid"),
+    ("v2 blueprint mismatch", "blueprint_step_count"),
+    ("v2 blueprint violation", "blueprint_kind"),
+    ("no steps provided", "section_empty"),
+    ("normalization failed", "normalization_failed"),
+    ("All hedged branches failed", "hedge_failed"),
+)
+_RUNTIME_CODES = (
+    ("API_KEY is missing", "missing_api_key"),
+    ("empty response", "empty_response"),
+    ("no tool call", "no_tool_call"),
+    ("non-object tool input", "tool_input_invalid"),
+    ("not available", "provider_unavailable"),
+)
+# anthropic/openai exception class names -> code
+_ERROR_CLASS_CODES = (
+    ("Timeout", "timeout"),
+    ("Connection", "connection_error"),
+    ("RateLimit", "rate_limited"),
+    ("Authentication", "auth_error"),
+    ("PermissionDenied", "auth_error"),
+    ("Overloaded", "overloaded"),
+    ("InternalServer", "api_error"),
+    ("APIStatus", "api_error"),
+    ("BadRequest", "bad_request"),
+)
+
+
+def failure_code(exc: BaseException) -> str:
+    """
+    Stable snake_case code for an exception raised while generating a plan, so
+    failures can be aggregated instead of matched on message text.
+    """
+    # SDK errors may carry a .code of their own; only trust ours.
+    code = exc.code if isinstance(exc, (ValidationIssue, ProviderError)) else None
+    if code == "generation_failed" and exc.__cause__ is not None:
+        # The wrapper's give-up error; classify by what sank the repair.
+        return failure_code(exc.__cause__)
+    if code:
+        return code
+    if isinstance(exc, ValidationIssue):
+        message = str(exc)
+        for fragment, code in _ISSUE_CODES:
+            if fragment in message:
+                return code
+        return "validation_failed"
+    if isinstance(exc, TimeoutError):
+        return "timeout"
+    name = type(exc).__name__
+    for fragment, code in _ERROR_CLASS_CODES:
+        if fragment in name:
+            return code
+    if isinstance(exc, RuntimeError):
+        message = str(exc)
+        for fragment, code in _RUNTIME_CODES:
+            if fragment in message:
+                return code
+        return "provider_error"
+    return "other"
+
+
+class PipelineMetrics:
+    """The planner's metrics on a registry, fed by span timings, USAGE and the wrapper."""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY):
+        self.registry = registry
+        self.stage_seconds = registry.histogram(
+            "swim_plan_stage_duration_seconds",
+            "Pipeline stage latency; stage=generate is the end-to-end request.",
+            ("stage", "status"),
+        )
+        self.outcomes = registry.counter(
+            "swim_plan_outcomes_total",
+            "Generation attempts by result: first_pass, local_repair, repaired, fallback, failed or cache_hit.",
+            ("version", "outcome"),
+        )
+        self.issues = registry.counter(
+            "swim_plan_validation_failures_total",
+            "Rejected model outputs and call errors by stable failure code.",
+            ("call", "code"),
+        )
+        self.local_repairs = registry.counter(
+            "swim_plan_local_repairs_total",
+            "Local (no model call) repair attempts.",
+            ("fixed",),
+        )
+        self.routes = registry.counter(
+            "swim_plan_v2_routes_total",
+            "v2 requests routed to each archetype.",
+            ("archetype",),
+        )
+        self.tokens = registry.histogram(
+            "swim_plan_llm_tokens",
+            "Tokens per model call.",
+            ("version", "archetype", "call", "direction"),
+            TOKEN_BUCKETS,
+        )
+        self._installed = False
+        self._configured = False
+        self._lock = threading.Lock()
+
+    def on_span(self, name: str, elapsed_s: float, error: Optional[BaseException]) -> None:
+        stage = name[len("swim_plan."):] if name.startswith("swim_plan.") else name
+        self.stage_seconds.observe(elapsed_s, stage, "ok" if error is None else "error")
+
+    def record_usage(self, usage: TokenUsage, labels: Mapping[str, str]) -> None:
+        key = (labels.get("version", "unknown"), labels.get("archetype", "unknown"), labels.get("call", "unknown"))
+        self.tokens.observe(usage.input_tokens + usage.cache_read_input_tokens + usage.cache_creation_input_tokens, *key, "input")
+        self.tokens.observe(usage.output_tokens, *key, "output")
+
+    def install(self) -> None:
+        with self._lock:
+            self._configured = True
+            if not self._installed:
+                add_span_sink(self.on_span)
+                USAGE.add_sink(self)
+                self._installed = True
+
+    def uninstall(self) -> None:
+        with self._lock:
+            self._configured = True
+            if self._installed:
+                remove_span_sink(self.on_span)
+                USAGE.remove_sink(self)
+                self._installed = False
+
+    def install_from_env(self) -> None:
+        """Install per SWIM_PLANNER_METRICS unless install()/uninstall() already decided."""
+        if self._configured:
+            return
+        if metrics_enabled_from_env():
+            self.install()
+        else:
+            with self._lock:
+                self._configured = True
+
+    @property
+    def enabled(self) -> bool:
+        return self._installed
+
+    def outcome(self, version: str, outcome: str) -> None:
+        if self._installed:
+            self.outcomes.inc(version, outcome)
+
+    def issue(self, call: str, exc: BaseException) -> None:
+        if self._installed:
+            self.issues.inc(call, failure_code(exc))
+
+    def local_repair(self, fixed: bool) -> None:
+        if self._installed:
+            self.local_repairs.inc("true" if fixed else "false")
+
+    def route(self, archetype_id: str) -> None:
+        if self._installed:
+            self.routes.inc(archetype_id)
+
+
+METRICS = PipelineMetrics()
+
+
+def metrics_enabled_from_env() -> bool:
+    return os.getenv(METRICS_ENV, "1").strip().lower() not in {"0", "false", "no", "off"}
+
+
+def enable_metrics() -> None:
+    METRICS.install()
+
+
+def disable_metrics() -> None:
+    METRICS.uninstall()
+
+
+def render_prometheus() -> str:
+    return REGISTRY.render_prometheus()
+
+
+def metrics_snapshot() -> dict:
+    return REGISTRY.snapshot()
+
+
+__all__ = [
+    "Counter",
+    "Histogram",
+    "METRICS",
+    "MetricsRegistry",
+    "PipelineMetrics",
+    "REGISTRY",
+    "disable_metrics",
+    "enable_metrics",
+    "failure_code",
+    "metrics_snapshot",
+    "render_prometheus",
+]
@@ -1,10 +1,14 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Any, Literal, Optional
+from functools import cached_property
+from typing import TYPE_CHECKING, Any, Literal, Optional
 from uuid import UUID
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+if TYPE_CHECKING:
+    from .history import HistoryProfile
 
 Effort = Literal["easy", "medium", "hard"]
 Stroke = Literal["freestyle", "backstroke", "breaststroke", "butterfly", "mixed", "choice"]
@@ -89,6 +93,7 @@ class SwimPlanResponse(BaseModel):
     duration_minutes: int = Field(gt=0)
     estimated_distance_m: int = Field(ge=0)
     sections: Sections
+    is_fallback: bool = False
 
 
 class HistoricSession(BaseModel):
@@ -105,6 +110,33 @@ class SwimPlanInput(BaseModel):
     session_requested: SessionRequested
     historic_sessions: list[HistoricSession] = Field(default_factory=list)
     requested_tags: list[str] = Field(default_factory=list)
+    # Stored HistoryProfile.to_summary() of the swimmer's past sessions. When
+    # set, historic_sessions only lists sessions completed since it was saved.
+    history_summary: Optional[dict[str, Any]] = None
+
+    @field_validator("history_summary")
+    @classmethod
+    def _check_history_summary(cls, value: Optional[dict[str, Any]]) -> Optional[dict[str, Any]]:
+        if value is not None:
+            from .history import HistoryProfile
+
+            HistoryProfile.from_summary(value)
+        return value
+
+    @cached_property
+    def history_profile(self) -> "HistoryProfile":
+        """History digested once per payload; treat the payload as read-only after this."""
+        from .history import HistoryProfile, build_history_profile
+
+        if self.history_summary is None:
+            return build_history_profile(self.historic_sessions)
+        return HistoryProfile.from_summary(self.history_summary).extend(self.historic_sessions)
+
+    def model_copy(self, *, update: Optional[dict[str, Any]] = None, deep: bool = False) -> "SwimPlanInput":
+        # model_copy carries __dict__ over, cached history_profile included.
+        copied = super().model_copy(update=update, deep=deep)
+        copied.__dict__.pop("history_profile", None)
+        return copied
 
 
 class LLMPlanDraftStep(BaseModel):
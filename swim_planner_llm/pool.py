@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional, Sequence, Union
+
+from .models import SwimPlanInput, SwimPlanResponse
+from .validator import ValidationIssue, validate_invariants, validate_schema
+from .v2.router import build_generation_spec_v2
+from .v2.types import GenerationSpecV2
+from .wrapper import generate_swim_plan_async
+
+BucketKey = tuple[int, str, Optional[str], str]
+PlanFilter = Callable[[SwimPlanResponse, SwimPlanInput], bool]
+
+
+def bucket_key(payload: SwimPlanInput, spec: Optional[GenerationSpecV2] = None) -> BucketKey:
+    req = payload.session_requested
+    spec = spec if spec is not None else build_generation_spec_v2(payload)
+    return (req.duration_minutes, req.effort, req.swim_level, spec.archetype.archetype_id)
+
+
+def risk_history_filter(plan: SwimPlanResponse, payload: SwimPlanInput) -> bool:
+    """Reject pooled plans at or above the shortest distance the swimmer thumbed down as too much."""
+    risky = payload.history_profile.risky_down_min_distance
+    return not risky or plan.estimated_distance_m < risky
+
+
+@dataclass
+class _PooledPlan:
+    plan: SwimPlanResponse
+    created_at: float
+
+
+@dataclass
+class PoolStats:
+    hits: int = 0
+    misses: int = 0
+    rejections: int = 0
+    evictions: int = 0
+    generated: int = 0
+    generation_failures: int = 0
+
+
+class PlanPool:
+    """
+    Keeps `size` validated plans ready for each hot bucket, where a bucket is
+    (duration_minutes, effort, swim_level, v2 archetype). Buckets are declared
+    by history-free template payloads. take() hands out a pooled plan only if
+    it validates against the caller's own payload (history included) and
+    passes every filter; otherwise it returns None and the caller generates as
+    usual. Consumed and stale plans are replaced by refill(), which the
+    background worker started by start() runs whenever a plan is taken.
+    """
+
+    def __init__(
+        self,
+        templates: Iterable[dict],
+        *,
+        size: int = 3,
+        max_age_s: Optional[float] = 6 * 3600.0,
+        version: str = "v2",
+        provider: str = "claude",
+        max_concurrency: int = 4,
+        filters: Sequence[PlanFilter] = (risk_history_filter,),
+    ) -> None:
+        if size < 1:
+            raise ValueError("size must be >= 1")
+        self.size = size
+        self.max_age_s = max_age_s
+        self.version = version
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.filters = tuple(filters)
+        self.stats = PoolStats()
+
+        self._lock = threading.Lock()
+        self._templates: dict[BucketKey, SwimPlanInput] = {}
+        self._plans: dict[BucketKey, deque[_PooledPlan]] = {}
+        for template in templates:
+            parsed = SwimPlanInput.model_validate(template)
+            if parsed.historic_sessions or parsed.history_summary is not None:
+                raise ValueError("pool templates must not carry historic_sessions or history_summary")
+            key = bucket_key(parsed)
+            self._templates[key] = parsed
+            self._plans[key] = deque()
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+    @property
+    def buckets(self) -> list[BucketKey]:
+        return list(self._templates)
+
+    def available(self, key: BucketKey) -> int:
+        with self._lock:
+            return len(self._plans.get(key, ()))
+
+    def _is_stale(self, item: _PooledPlan, now: float) -> bool:
+        return self.max_age_s is not None and now - item.created_at > self.max_age_s
+
+    def evict_stale(self) -> int:
+        now = time.monotonic()
+        evicted = 0
+        with self._lock:
+            for plans in self._plans.values():
+                # Filtered in place: take() holds on to the deque between locks.
+                fresh = [p for p in plans if not self._is_stale(p, now)]
+                evicted += len(plans) - len(fresh)
+                plans.clear()
+                plans.extend(fresh)
+            self.stats.evictions += evicted
+        return evicted
+
+    def _accepts(self, plan: SwimPlanResponse, payload: SwimPlanInput, v2_spec: Optional[GenerationSpecV2]) -> bool:
+        try:
+            validate_schema(plan)
+            validate_invariants(
+                plan,
+                payload.session_requested,
+                payload.history_profile,
+                payload.requested_tags,
+                version=self.version,
+                v2_spec=v2_spec,
+            )
+        except ValidationIssue:
+            return False
+        return all(check(plan, payload) for check in self.filters)
+
+    def take(self, payload: Union[dict, SwimPlanInput]) -> Optional[SwimPlanResponse]:
+        parsed = payload if isinstance(payload, SwimPlanInput) else SwimPlanInput.model_validate(payload)
+        spec = build_generation_spec_v2(parsed)
+        plans = self._plans.get(bucket_key(parsed, spec))
+        if plans is None:
+            with self._lock:
+                self.stats.misses += 1
+            return None
+
+        v2_spec = spec if self.version == "v2" else None
+        now = time.monotonic()
+        skipped: list[_PooledPlan] = []
+        chosen: Optional[_PooledPlan] = None
+        # Candidates are popped under the lock but validated outside it, so
+        # concurrent takers and the refill worker are not held up by it.
+        while chosen is None:
+            with self._lock:
+                item = plans.popleft() if plans else None
+                while item is not None and self._is_stale(item, now):
+                    self.stats.evictions += 1
+                    item = plans.popleft() if plans else None
+            if item is None:
+                break
+            if self._accepts(item.plan, parsed, v2_spec):
+                chosen = item
+            else:
+                skipped.append(item)
+
+        with self._lock:
+            # Unsuitable for this swimmer, but may suit the next one.
+            plans.extendleft(reversed(skipped))
+            self.stats.rejections += len(skipped)
+            if chosen is None:
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+
+        self._wake.set()
+        return chosen.plan.model_copy(deep=True) if chosen is not None else None
+
+    def _deficits(self) -> list[tuple[BucketKey, SwimPlanInput]]:
+        with self._lock:
+            return [
+                (key, template)
+                for key, template in self._templates.items()
+                for _ in range(self.size - len(self._plans[key]))
+            ]
+
+    async def refill_async(self) -> int:
+        self.evict_stale()
+        jobs = self._deficits()
+        if not jobs:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def _one(template: SwimPlanInput) -> Optional[SwimPlanResponse]:
+            async with semaphore:
+                try:
+                    return await generate_swim_plan_async(
+                        template.model_dump(),
+                        None,
+                        self.provider,
+                        version=self.version,
+                    )
+                except Exception:
+                    return None
+
+        results = await asyncio.gather(*(_one(template) for _, template in jobs))
+
+        added = 0
+        now = time.monotonic()
+        with self._lock:
+            for (key, _), plan in zip(jobs, results):
+                if plan is None or plan.is_fallback:
+                    self.stats.generation_failures += 1
+                    continue
+                if len(self._plans[key]) >= self.size:
+                    continue
+                self._plans[key].append(_PooledPlan(plan=plan, created_at=now))
+                added += 1
+            self.stats.generated += added
+        return added
+
+    def refill(self) -> int:
+        """One-off refill on a throwaway loop; the start() worker keeps its own loop instead."""
+        return asyncio.run(self.refill_async())
+
+    def _run(self, interval_s: float) -> None:
+        # One loop for the worker's lifetime, so its pooled async client and
+        # connections are reused from round to round.
+        loop = asyncio.new_event_loop()
+        try:
+            while not self._stop.is_set():
+                try:
+                    loop.run_until_complete(self.refill_async())
+                except Exception:
+                    # A failed round is retried on the next wake-up.
+                    pass
+                self._wake.wait(timeout=interval_s)
+                self._wake.clear()
+        finally:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    def start(self, interval_s: float = 60.0) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._stop.clear()
+        self._worker = threading.Thread(
+            target=self._run,
+            args=(interval_s,),
+            name="swim-plan-pool",
+            daemon=True,
+        )
+        self._worker.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+            self._worker = None
+
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import cProfile
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+# SWIM_PLANNER_PROFILE_RATE: fraction of requests to profile (default 0).
+# SWIM_PLANNER_PROFILE_DIR: where reports go (default ./swim_plan_profiles).
+PROFILE_RATE_ENV = "SWIM_PLANNER_PROFILE_RATE"
+PROFILE_DIR_ENV = "SWIM_PLANNER_PROFILE_DIR"
+
+# Allocations made by the model SDK happen while we wait on the network, not
+# in planner code, so they are left out of the allocation report.
+_WAIT_ALLOCATION_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "*/anthropic/*"),
+    tracemalloc.Filter(False, "*/openai/*"),
+    tracemalloc.Filter(False, "*/httpx/*"),
+    tracemalloc.Filter(False, "*/httpcore/*"),
+    tracemalloc.Filter(False, "*/asyncio/*"),
+    tracemalloc.Filter(False, "*/ssl.py"),
+)
+
+
+@dataclass(frozen=True)
+class ProfileConfig:
+    rate: float = 0.0
+    output_dir: Path = Path("swim_plan_profiles")
+    top: int = 25
+
+    @classmethod
+    def from_env(cls) -> "ProfileConfig":
+        rate = float(os.getenv(PROFILE_RATE_ENV) or 0.0)
+        if not 0.0 <= rate <= 1.0:
+            raise ValueError(f"{PROFILE_RATE_ENV} must be between 0 and 1, got {rate}.")
+        return cls(rate=rate, output_dir=Path(os.getenv(PROFILE_DIR_ENV) or cls.output_dir))
+
+
+class ProfileSession:
+    """
+    cProfile and tracemalloc for one request, switched off while the request
+    waits on the model (see paused()) so only local work is measured.
+    """
+
+    def __init__(self, config: ProfileConfig):
+        self.config = config
+        self._profile = cProfile.Profile()
+        self._paused = 0
+        self._local_s = 0.0
+        self._resumed_at = 0.0
+        self._peak_bytes = 0
+        self._region_base = 0
+        self._owns_tracemalloc = False
+        self._start_snapshot: Optional[tracemalloc.Snapshot] = None
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+        self._start_snapshot = tracemalloc.take_snapshot()
+        self._resume()
+
+    def _resume(self) -> None:
+        tracemalloc.reset_peak()
+        self._region_base = tracemalloc.get_traced_memory()[0]
+        self._resumed_at = time.perf_counter()
+        self._profile.enable()
+
+    def _suspend(self) -> None:
+        self._profile.disable()
+        self._local_s += time.perf_counter() - self._resumed_at
+        self._peak_bytes = max(self._peak_bytes, tracemalloc.get_traced_memory()[1] - self._region_base)
+
+    def pause(self) -> None:
+        if self._paused == 0:
+            self._suspend()
+        self._paused += 1
+
+    @property
+    def is_paused(self) -> bool:
+        return self._paused > 0
+
+    def resume(self) -> None:
+        self._paused -= 1
+        if self._paused == 0:
+            self._resume()
+
+    def finish(self, plan_id: str, meta: dict) -> dict:
+        if self._paused == 0:
+            self._suspend()
+        end_snapshot = tracemalloc.take_snapshot()
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+        report = {
+            "plan_id": plan_id,
+            **meta,
+            "local_ms": round(self._local_s * 1000, 3),
+            "alloc_peak_bytes": self._peak_bytes,
+            "cpu_top": self._cpu_top(),
+            "alloc_top": self._alloc_top(end_snapshot),
+        }
+        self.config.output_dir.mkdir(parents=True, exist_ok=True)
+        path = self.config.output_dir / f"{plan_id}.json"
+        path.write_text(json.dumps(report, separators=(",", ":")) + "\n", encoding="utf-8")
+        return report
+
+    def _cpu_top(self) -> list[dict]:
+        stats = pstats.Stats(self._profile)
+        rows = []
+        for (filename, line, func), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+            rows.append(
+                {
+                    "func": f"{_short_path(filename)}:{line}({func})",
+                    "ncalls": ncalls,
+                    "tottime_ms": round(tottime * 1000, 3),
+                    "cumtime_ms": round(cumtime * 1000, 3),
+                }
+            )
+        rows.sort(key=lambda row: row["tottime_ms"], reverse=True)
+        return rows[: self.config.top]
+
+    def _alloc_top(self, end_snapshot: tracemalloc.Snapshot) -> list[dict]:
+        if self._start_snapshot is None:
+            return []
+        diff = end_snapshot.filter_traces(_WAIT_ALLOCATION_FILTERS).compare_to(
+            self._start_snapshot.filter_traces(_WAIT_ALLOCATION_FILTERS), "lineno"
+        )
+        rows = []
+        for stat in diff[: self.config.top]:
+            if stat.size_diff <= 0:
+                continue
+            frame = stat.traceback[0]
+            rows.append(
+                {
+                    "site": f"{_short_path(frame.filename)}:{frame.lineno}",
+                    "size_bytes": stat.size_diff,
+                    "count": stat.count_diff,
+                }
+            )
+        return rows
+
+
+def _short_path(filename: str) -> str:
+    # Keep the package-relative tail so reports stay short and comparable.
+    idx = filename.rfind("site-packages/")
+    if idx != -1:
+        return filename[idx + len("site-packages/"):]
+    idx = filename.rfind("swim_planner_llm/")
+    return filename[idx:] if idx != -1 else filename
+
+
+_SESSION: ContextVar[Optional[ProfileSession]] = ContextVar("swim_planner_profile", default=None)
+# cProfile hooks are per thread and only one can be active, so one request is
+# profiled at a time; sampled requests that arrive meanwhile run unprofiled.
+_BUSY = threading.Lock()
+_RNG = random.Random()
+
+
+def _wanted(profile: Optional[bool], config: ProfileConfig) -> bool:
+    if profile is not None:
+        return profile
+    return config.rate > 0 and _RNG.random() < config.rate
+
+
+class ProfileScope:
+    """Wraps one generate_swim_plan call; session is None when the call is not profiled."""
+
+    def __init__(self, profile: Optional[bool], meta: dict):
+        self._profile = profile
+        self.meta = dict(meta)
+        self.session: Optional[ProfileSession] = None
+        self.report: Optional[dict] = None
+        self._finished = False
+        self._token = None
+
+    def __enter__(self) -> "ProfileScope":
+        if self._profile is False:
+            return self
+        config = ProfileConfig.from_env()
+        if not _wanted(self._profile, config) or _SESSION.get() is not None:
+            return self
+        if not _BUSY.acquire(blocking=False):
+            return self
+        session = ProfileSession(config)
+        try:
+            session.start()
+        except ValueError:  # another profiler (debugger, coverage) owns the hook
+            if session._owns_tracemalloc:
+                tracemalloc.stop()
+            _BUSY.release()
+            return self
+        self.session = session
+        self._token = _SESSION.set(session)
+        return self
+
+    def finish(self, plan_id: str, **meta) -> None:
+        if self.session is not None and not self._finished:
+            self._finished = True
+            self.meta.update(meta)
+            self.report = self.session.finish(str(plan_id), self.meta)
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if self.session is None:
+            return False
+        try:
+            if exc is not None:
+                self.finish(f"failed-{time.time_ns()}", outcome="failed", error=type(exc).__name__)
+            else:
+                self.finish(f"unfinished-{time.time_ns()}")
+        finally:
+            _SESSION.reset(self._token)
+            _BUSY.release()
+        return False
+
+
+class _Paused:
+    __slots__ = ("_session",)
+
+    def __enter__(self) -> None:
+        self._session = _SESSION.get()
+        if self._session is not None:
+            self._session.pause()
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if self._session is not None:
+            self._session.resume()
+        return False
+
+
+class _LocalWork:
+    __slots__ = ("_session",)
+
+    def __enter__(self) -> None:
+        session = _SESSION.get()
+        self._session = session if session is not None and session.is_paused else None
+        if self._session is not None:
+            self._session.resume()
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if self._session is not None:
+            self._session.pause()
+        return False
+
+
+def paused() -> _Paused:
+    """Stops measuring the current request while it waits on the model."""
+    return _Paused()
+
+
+def local_work() -> _LocalWork:
+    """Measures local work (prompt building) done inside a paused() block."""
+    return _LocalWork()
+
+
+__all__ = ["ProfileConfig", "ProfileScope", "ProfileSession", "local_work", "paused"]
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Union
+
+from .llm_client_claude import (
+    request_plan_json_claude,
+    request_plan_json_claude_async,
+    request_repair_json_claude,
+    request_repair_json_claude_async,
+)
+
+# request_plan(payload, seed, *, version, stream, timeout, output_format)
+# request_repair(payload, bad_output, error_text, seed, *, version, timeout, violations, output_format)
+# The async variants take the same arguments minus timeout; callers bound them
+# with asyncio.wait_for instead.
+ProviderCall = Callable[..., Union[str, dict]]
+AsyncProviderCall = Callable[..., Awaitable[Union[str, dict]]]
+
+
+@dataclass(frozen=True)
+class Provider:
+    name: str
+    request_plan: ProviderCall
+    request_repair: ProviderCall
+    request_plan_async: AsyncProviderCall
+    request_repair_async: AsyncProviderCall
+
+    def calls(self, *, asynchronous: bool = False) -> tuple[Any, Any]:
+        if asynchronous:
+            return self.request_plan_async, self.request_repair_async
+        return self.request_plan, self.request_repair
+
+
+_DISABLED_PROVIDERS = {
+    "openai": "OpenAI provider is disabled for now. Use provider='claude'.",
+}
+
+_lock = threading.Lock()
+_PROVIDERS: dict[str, Provider] = {}
+
+
+def _register_default_fake() -> None:
+    from .fake_provider import register_fake_provider
+
+    register_fake_provider()
+
+
+# Registered on the first get_provider(name), so importing the package never
+# reads their configuration from the environment.
+_LAZY_PROVIDERS: dict[str, Callable[[], None]] = {"fake": _register_default_fake}
+_lazy_lock = threading.Lock()
+
+
+def register_provider(provider: Provider, *, replace: bool = False) -> Provider:
+    with _lock:
+        if provider.name in _DISABLED_PROVIDERS:
+            raise ValueError(f"Provider name '{provider.name}' is reserved.")
+        if provider.name in _PROVIDERS and not replace:
+            raise ValueError(f"Provider '{provider.name}' is already registered.")
+        _PROVIDERS[provider.name] = provider
+    return provider
+
+
+def unregister_provider(name: str) -> None:
+    with _lock:
+        _PROVIDERS.pop(name, None)
+
+
+def provider_names() -> list[str]:
+    with _lock:
+        return sorted(set(_PROVIDERS) | set(_LAZY_PROVIDERS))
+
+
+def get_provider(name: str) -> Provider:
+    if name in _DISABLED_PROVIDERS:
+        raise ValueError(_DISABLED_PROVIDERS[name])
+    with _lock:
+        provider = _PROVIDERS.get(name)
+    if provider is None and name in _LAZY_PROVIDERS:
+        with _lazy_lock:
+            with _lock:
+                provider = _PROVIDERS.get(name)
+            if provider is None:
+                _LAZY_PROVIDERS[name]()
+                with _lock:
+                    provider = _PROVIDERS.get(name)
+    if provider is None:
+        raise ValueError(f"Unknown provider '{name}'. Use one of {provider_names()}.")
+    return provider
+
+
+CLAUDE_PROVIDER = register_provider(
+    Provider(
+        name="claude",
+        request_plan=request_plan_json_claude,
+        request_repair=request_repair_json_claude,
+        request_plan_async=request_plan_json_claude_async,
+        request_repair_async=request_repair_json_claude_async,
+    )
+)
+
+
+__all__ = [
+    "CLAUDE_PROVIDER",
+    "Provider",
+    "get_provider",
+    "provider_names",
+    "register_provider",
+    "unregister_provider",
+]
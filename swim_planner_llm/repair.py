@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import Counter
+from typing import Callable, Optional, Sequence
+
+from .models import PYRAMID_KINDS, Section, SessionRequested, Step, SwimPlanResponse
+from .validator import ValidationIssue, Violation, validate_invariants, validate_schema
+from .v2.types import GenerationSpecV2
+
+GEAR_FLAGS = ("fins", "pull", "paddles")
+
+StepRule = Callable[[Step, str, set[str], str], Optional[dict]]
+
+
+def _round_50(value: int) -> int:
+    return max(50, int(round(value / 50)) * 50)
+
+
+def _intervals_single_rep(step: Step, section_name: str, tags: set[str], version: str) -> Optional[dict]:
+    if step.kind == "intervals" and step.reps == 1:
+        return {"kind": "continuous"}
+    return None
+
+
+def _pyramid_reps(step: Step, section_name: str, tags: set[str], version: str) -> Optional[dict]:
+    if step.kind in PYRAMID_KINDS and step.pyramid_sequence_m and step.reps != len(step.pyramid_sequence_m):
+        return {"reps": len(step.pyramid_sequence_m)}
+    return None
+
+
+def _round_distances(step: Step, section_name: str, tags: set[str], version: str) -> Optional[dict]:
+    if step.kind in PYRAMID_KINDS and step.pyramid_sequence_m:
+        rounded = [_round_50(d) for d in step.pyramid_sequence_m]
+        if rounded != step.pyramid_sequence_m:
+            return {"pyramid_sequence_m": rounded}
+        return None
+    if step.distance_per_rep_m % 50 != 0:
+        return {"distance_per_rep_m": _round_50(step.distance_per_rep_m)}
+    return None
+
+
+def _timing_conflict(step: Step, section_name: str, tags: set[str], version: str) -> Optional[dict]:
+    update: dict = {}
+    if step.kind not in PYRAMID_KINDS:
+        if step.rest_sequence_s is not None:
+            update["rest_sequence_s"] = None
+        if step.sendoff_sequence_s is not None:
+            update["sendoff_sequence_s"] = None
+    elif step.rest_sequence_s is not None or step.sendoff_sequence_s is not None:
+        # A per-rep sequence wins over the scalar fields; rest wins over sendoff.
+        if step.rest_sequence_s is not None and step.sendoff_sequence_s is not None:
+            update["sendoff_sequence_s"] = None
+        if step.rest_seconds is not None:
+            update["rest_seconds"] = None
+        if step.sendoff_seconds is not None:
+            update["sendoff_seconds"] = None
+    return update or None
+
+
+def _breath_hold_rest(step: Step, section_name: str, tags: set[str], version: str) -> Optional[dict]:
+    update: dict = {}
+    if section_name != "main_set":
+        if step.hypoxic is True:
+            update["hypoxic"] = False
+        if step.underwater is True:
+            update["underwater"] = False
+        return update or None
+
+    if step.underwater is True and (step.rest_seconds is None or step.rest_seconds < 30):
+        update.update(rest_seconds=30, sendoff_seconds=None)
+    elif step.underwater is True and step.sendoff_seconds is not None:
+        update["sendoff_seconds"] = None
+    elif step.hypoxic is True and (step.rest_seconds is None or step.rest_seconds < 20):
+        update.update(rest_seconds=20, sendoff_seconds=None)
+    return update or None
+
+
+def _unrequested_gear(step: Step, section_name: str, tags: set[str], version: str) -> Optional[dict]:
+    update: dict = {}
+    for flag in GEAR_FLAGS:
+        if not getattr(step, flag):
+            continue
+        if flag not in tags or (version == "v2" and section_name != "main_set"):
+            update[flag] = False
+    return update or None
+
+
+TIMING_CONFLICT_CODES = frozenset(
+    {"rest_sequence_kind", "rest_sequence_conflict", "sendoff_sequence_kind", "sendoff_sequence_conflict"}
+)
+
+# Order matters: reps/kind fixes first so later rules see the final shape.
+# A rule with codes only touches steps the validator flagged with one of them.
+STEP_RULES: tuple[tuple[str, StepRule, Optional[frozenset[str]]], ...] = (
+    ("intervals_single_rep", _intervals_single_rep, None),
+    ("pyramid_reps", _pyramid_reps, None),
+    ("round_distance_50", _round_distances, None),
+    ("timing_conflict", _timing_conflict, TIMING_CONFLICT_CODES),
+    ("breath_hold_rest", _breath_hold_rest, None),
+    ("unrequested_gear", _unrequested_gear, None),
+)
+
+
+def _codes_by_step(violations: Sequence[Violation]) -> dict[str, set[str]]:
+    # Step violation paths look like "main_set.<step_id>[.<field>]".
+    codes: dict[str, set[str]] = {}
+    for violation in violations:
+        section_name, _, rest = violation.path.partition(".")
+        if rest:
+            codes.setdefault(f"{section_name}.{rest.split('.', 1)[0]}", set()).add(violation.code)
+    return codes
+
+
+def _repair_section(
+    section: Section,
+    section_name: str,
+    tags: set[str],
+    version: str,
+    fired: list[str],
+    flagged: dict[str, set[str]],
+) -> Section:
+    steps: list[Step] = []
+    for step in section.steps:
+        step_codes = flagged.get(f"{section_name}.{step.step_id}", set())
+        for name, rule, codes in STEP_RULES:
+            if codes is not None and not codes & step_codes:
+                continue
+            update = rule(step, section_name, tags, version)
+            if update:
+                step = step.model_copy(update=update)
+                fired.append(name)
+        steps.append(step)
+
+    distance = sum(s.step_distance_m for s in steps)
+    if distance != section.section_distance_m:
+        fired.append("section_distance")
+    return section.model_copy(update={"steps": steps, "section_distance_m": distance})
+
+
+def repair_plan(
+    plan: SwimPlanResponse,
+    request: SessionRequested,
+    requested_tags: list[str],
+    *,
+    version: str = "v1",
+    violations: Sequence[Violation] = (),
+) -> tuple[SwimPlanResponse, list[str]]:
+    """
+    Apply the mechanical fix-up rules to a normalized plan. Returns the
+    repaired copy and the names of the rules that changed something.
+    violations are what the validator reported for the plan.
+    """
+    tags = {t.strip().lower() for t in (request.requested_tags + requested_tags) if t and t.strip()}
+    fired: list[str] = []
+    flagged = _codes_by_step(violations)
+
+    sections = plan.sections.model_copy(
+        update={
+            name: _repair_section(getattr(plan.sections, name), name, tags, version, fired, flagged)
+            for name in ("warm_up", "main_set", "cool_down")
+        }
+    )
+    total = (
+        sections.warm_up.section_distance_m
+        + sections.main_set.section_distance_m
+        + sections.cool_down.section_distance_m
+    )
+    if total != plan.estimated_distance_m:
+        fired.append("estimated_distance")
+
+    repaired = plan.model_copy(update={"sections": sections, "estimated_distance_m": total})
+    return repaired, fired
+
+
+class LocalRepairer:
+    """Runs repair_plan and re-validates; counts attempts, outcomes and rule hits."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.rule_counts: Counter[str] = Counter()
+        self.attempts = 0
+        self.fixed = 0
+        self.escalated = 0
+
+    def try_repair(
+        self,
+        plan: SwimPlanResponse,
+        payload,
+        *,
+        version: str,
+        v2_spec: GenerationSpecV2 | None = None,
+        violations: Sequence[Violation] = (),
+    ) -> Optional[SwimPlanResponse]:
+        repaired, fired = repair_plan(
+            plan,
+            payload.session_requested,
+            payload.requested_tags,
+            version=version,
+            violations=violations,
+        )
+        ok = False
+        if fired:
+            try:
+                validate_schema(repaired)
+                validate_invariants(
+                    repaired,
+                    payload.session_requested,
+                    payload.history_profile,
+                    payload.requested_tags,
+                    version=version,
+                    v2_spec=v2_spec,
+                )
+                ok = True
+            except ValidationIssue:
+                ok = False
+
+        with self._lock:
+            self.attempts += 1
+            self.rule_counts.update(fired)
+            if ok:
+                self.fixed += 1
+            else:
+                self.escalated += 1
+        return repaired if ok else None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "attempts": self.attempts,
+                "fixed": self.fixed,
+                "escalated": self.escalated,
+                "rules": dict(self.rule_counts),
+            }
+
+
+def local_repair_enabled() -> bool:
+    return os.getenv("SWIM_PLANNER_LOCAL_REPAIR", "1").strip().lower() not in {"0", "false", "no", "off"}
+
+
+LOCAL_REPAIRER = LocalRepairer()
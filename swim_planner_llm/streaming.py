@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import json
+from typing import Optional
+
+from pydantic import ValidationError
+
+from .dsl import dsl_section_header, parse_dsl_section
+from .models import LLMPlanDraftSection
+from .v2.types import GenerationSpecV2, SectionBlueprint
+from .validator import ValidationIssue
+
+SECTION_NAMES = ("warm_up", "main_set", "cool_down")
+
+
+class StreamAborted(ValidationIssue):
+    """Raised when a streamed plan is rejected before the model finished writing it."""
+
+    def __init__(self, message: str, partial_text: str) -> None:
+        super().__init__(message, code="stream_aborted")
+        self.partial_text = partial_text
+
+
+class _Frame:
+    __slots__ = ("kind", "key", "start", "pending_key")
+
+    def __init__(self, kind: str, key: Optional[str], start: int) -> None:
+        self.kind = kind
+        self.key = key
+        self.start = start
+        self.pending_key: Optional[str] = None
+
+
+class SectionStreamParser:
+    """
+    Incremental JSON scanner that yields each sections.<name> object as soon
+    as its closing brace arrives. It only tracks nesting and keys; full
+    parsing of a closed section is left to json.loads.
+    """
+
+    def __init__(self) -> None:
+        self.buffer: list[str] = []
+        self._pos = 0
+        self._stack: list[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_chars: list[str] = []
+        self._last_string: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        return "".join(self.buffer)
+
+    def feed(self, chunk: str) -> list[tuple[str, str]]:
+        closed: list[tuple[str, str]] = []
+        self.buffer.append(chunk)
+
+        for ch in chunk:
+            pos = self._pos
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    self._string_chars.append(ch)
+                elif ch == "\\":
+                    self._escape = True
+                    self._string_chars.append(ch)
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = "".join(self._string_chars)
+                else:
+                    self._string_chars.append(ch)
+                continue
+
+            if ch == '"':
+                if self._stack:
+                    self._in_string = True
+                    self._string_chars = []
+            elif ch == ":":
+                if self._stack and self._stack[-1].kind == "{":
+                    self._stack[-1].pending_key = self._last_string
+            elif ch == ",":
+                if self._stack and self._stack[-1].kind == "{":
+                    self._stack[-1].pending_key = None
+            elif ch in "{[":
+                parent_key = self._stack[-1].pending_key if self._stack else None
+                self._stack.append(_Frame(ch, parent_key, pos))
+            elif ch in "}]":
+                if not self._stack:
+                    continue
+                frame = self._stack.pop()
+                if (
+                    ch == "}"
+                    and frame.key in SECTION_NAMES
+                    and len(self._stack) == 2
+                    and self._stack[-1].key == "sections"
+                ):
+                    text = self.text
+                    closed.append((frame.key, text[frame.start:pos + 1]))
+
+        return closed
+
+
+class DslSectionStreamParser:
+    """
+    Line-based counterpart of SectionStreamParser for the compact plan format:
+    a section is complete once the next section header arrives. The last
+    section is never yielded; it is checked with the whole plan.
+    """
+
+    def __init__(self) -> None:
+        self.buffer: list[str] = []
+        self._partial = ""
+        self._current: Optional[str] = None
+        self._lines: list[str] = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self.buffer)
+
+    def feed(self, chunk: str) -> list[tuple[str, str]]:
+        closed: list[tuple[str, str]] = []
+        self.buffer.append(chunk)
+
+        *lines, self._partial = (self._partial + chunk).split("\n")
+        for line in lines:
+            name = dsl_section_header(line)
+            if name is None:
+                if self._current is not None:
+                    self._lines.append(line)
+                continue
+            if self._current is not None:
+                closed.append((self._current, "\n".join(self._lines)))
+            self._current = name
+            self._lines = [line]
+
+        return closed
+
+
+def _check_blueprint(name: str, section: LLMPlanDraftSection, blueprint: SectionBlueprint) -> None:
+    if len(section.steps) != blueprint.steps:
+        raise ValidationIssue(f"v2 blueprint mismatch: {name} step count differs", code="blueprint_step_count")
+    for idx, (step, allowed) in enumerate(
+        zip(section.steps, blueprint.allowed_kinds_by_step),
+        start=1,
+    ):
+        if step.kind not in allowed:
+            raise ValidationIssue(
+                f"v2 blueprint violation: {name} step {idx} kind '{step.kind}' not allowed",
+                code="blueprint_kind",
+            )
+
+
+def check_streamed_section(
+    name: str,
+    section_text: str,
+    *,
+    v2_spec: Optional[GenerationSpecV2] = None,
+    output_format: str = "json",
+) -> None:
+    if output_format == "dsl":
+        section = parse_dsl_section(section_text)
+        if v2_spec is not None:
+            _check_blueprint(name, section, getattr(v2_spec.blueprint, name))
+        return
+
+    try:
+        section = LLMPlanDraftSection.model_validate(json.loads(section_text))
+    except json.JSONDecodeError as exc:
+        raise ValidationIssue(f"{name}: json parse failed: {exc}", code="json_parse_failed") from exc
+    except ValidationError as exc:
+        raise ValidationIssue(f"{name}: draft schema failed: {exc}", code="draft_schema_invalid") from exc
+
+    if v2_spec is not None:
+        _check_blueprint(name, section, getattr(v2_spec.blueprint, name))
+
+
+class StreamMonitor:
+    """Feeds streamed text through the parser and aborts on the first hard violation."""
+
+    def __init__(self, v2_spec: Optional[GenerationSpecV2] = None, output_format: str = "json") -> None:
+        self.parser = DslSectionStreamParser() if output_format == "dsl" else SectionStreamParser()
+        self.v2_spec = v2_spec
+        self.output_format = output_format
+        self.checked_sections: list[str] = []
+
+    def on_text(self, chunk: str) -> None:
+        for name, section_text in self.parser.feed(chunk):
+            try:
+                check_streamed_section(name, section_text, v2_spec=self.v2_spec, output_format=self.output_format)
+            except ValidationIssue as exc:
+                raise StreamAborted(
+                    f"stream aborted at {name}: {exc}",
+                    self.parser.text,
+                ) from exc
+            self.checked_sections.append(name)
+
+    @property
+    def text(self) -> str:
+        return self.parser.text
@@ -2,11 +2,11 @@ from __future__ import annotations
 
 from typing import Iterable
 
-from .models import HistoricSession, SwimPlanInput
+from .history import VARIED_HISTORY_TAGS, HistoryLike, as_history_profile
+from .models import SwimPlanInput
 
 VARIED_REQUEST_TAGS = {"fun", "mixed", "technique", "speed", "kick"}
 STRAIGHTFORWARD_REQUEST_TAGS = {"recovery", "steady", "freestyle"}
-VARIED_HISTORY_TAGS = {"fun", "mixed", "varied", "technique"}
 
 
 def _normalize_tags(tags: Iterable[str]) -> list[str]:
@@ -25,7 +25,7 @@ def _normalize_tags(tags: Iterable[str]) -> list[str]:
 
 def infer_prefer_varied(
     requested_tags: list[str],
-    historic_sessions: list[HistoricSession],
+    historic_sessions: HistoryLike,
 ) -> bool:
     score = 0
 
@@ -35,20 +35,11 @@ def infer_prefer_varied(
         if tag in STRAIGHTFORWARD_REQUEST_TAGS:
             score -= 1
 
-    for session in historic_sessions:
-        tags = set(_normalize_tags(session.tags))
-        varied_like = bool(tags.intersection(VARIED_HISTORY_TAGS))
-        if not varied_like:
-            continue
-
-        if session.thumb == 1:
-            score += 1
-        elif session.thumb == 0:
-            score -= 1
+    score += as_history_profile(historic_sessions).varied_history_score
 
     return score > 0
 
 
 def infer_prefer_varied_from_payload(payload: SwimPlanInput) -> bool:
     merged_tags = payload.session_requested.requested_tags + payload.requested_tags
-    return infer_prefer_varied(merged_tags, payload.historic_sessions)
+    return infer_prefer_varied(merged_tags, payload.history_profile)
@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+import json
+import os
+import secrets
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Mapping, Optional, Protocol, Union
+
+# SWIM_PLANNER_TRACE: unset/"off" (default, no-op), "otel" (spans go to the
+# globally configured OpenTelemetry tracer provider, and from there to whatever
+# exporter/collector the host set up) or "jsonl:<path>" (one line per span).
+TRACE_ENV = "SWIM_PLANNER_TRACE"
+
+AttributeValue = Union[str, bool, int, float]
+
+# Called with (span name, duration in seconds, exception or None) when a span
+# ends, whichever tracer is installed; metrics hang their stage timings here.
+SpanSink = Callable[[str, float, Optional[BaseException]], None]
+
+
+class Span(Protocol):
+    recording: bool
+
+    def set_attribute(self, key: str, value: Any) -> None: ...
+
+    def record_error(self, exc: BaseException) -> None: ...
+
+    def end(self) -> None: ...
+
+
+class Tracer(Protocol):
+    def start_span(self, name: str, attributes: Mapping[str, Any], parent: Optional[Span]) -> Span: ...
+
+
+def _attribute(value: Any) -> AttributeValue:
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return ",".join(str(v) for v in value)
+    return str(value)
+
+
+def _error_attributes(exc: BaseException) -> dict[str, AttributeValue]:
+    attributes: dict[str, AttributeValue] = {"error.type": type(exc).__name__, "error.message": str(exc)[:2000]}
+    violations = getattr(exc, "violations", ())
+    if violations:
+        attributes["error.codes"] = ",".join(v.code for v in violations)
+    return attributes
+
+
+class _NoopSpan:
+    __slots__ = ()
+    recording = False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_error(self, exc: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    # Doubles as its own context manager so a disabled span() allocates nothing.
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class NoopTracer:
+    def start_span(self, name: str, attributes: Mapping[str, Any], parent: Optional[Span]) -> Span:
+        return NOOP_SPAN
+
+
+class _FileSpan:
+    recording = True
+
+    def __init__(self, tracer: "JsonlTracer", name: str, attributes: Mapping[str, Any], parent: Optional[Span]):
+        self._tracer = tracer
+        self.name = name
+        if isinstance(parent, _FileSpan):
+            self.trace_id = parent.trace_id
+            self.parent_id: Optional[str] = parent.span_id
+        else:
+            self.trace_id = secrets.token_hex(16)
+            self.parent_id = None
+        self.span_id = secrets.token_hex(8)
+        self.attributes = {key: _attribute(value) for key, value in attributes.items()}
+        self.status = "ok"
+        self._start_unix = time.time()
+        self._start = time.perf_counter()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = _attribute(value)
+
+    def record_error(self, exc: BaseException) -> None:
+        self.status = "error"
+        self.attributes.update(_error_attributes(exc))
+
+    def end(self) -> None:
+        self._tracer._write(
+            {
+                "trace_id": self.trace_id,
+                "span_id": self.span_id,
+                "parent_id": self.parent_id,
+                "name": self.name,
+                "start": round(self._start_unix, 6),
+                "duration_ms": round((time.perf_counter() - self._start) * 1000, 3),
+                "status": self.status,
+                "attributes": self.attributes,
+            }
+        )
+
+
+class JsonlTracer:
+    """Appends every finished span to a JSONL file; children finish (and are written) before parents."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._fh = None
+
+    def start_span(self, name: str, attributes: Mapping[str, Any], parent: Optional[Span]) -> Span:
+        return _FileSpan(self, name, attributes, parent)
+
+    def _write(self, record: dict) -> None:
+        line = json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._fh is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._fh = open(self.path, "a", encoding="utf-8")
+            self._fh.write(line)
+            self._fh.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+class _OtelSpan:
+    recording = True
+
+    def __init__(self, span, status_cls, status_code):
+        self._span = span
+        self._status_cls = status_cls
+        self._status_code = status_code
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self._span.set_attribute(key, _attribute(value))
+
+    def record_error(self, exc: BaseException) -> None:
+        self._span.record_exception(exc)
+        self._span.set_attributes(_error_attributes(exc))
+        self._span.set_status(self._status_cls(self._status_code.ERROR, str(exc)[:500]))
+
+    def end(self) -> None:
+        self._span.end()
+
+
+class OpenTelemetryTracer:
+    """
+    Bridges spans to OpenTelemetry. Exporters (OTLP collector, console, ...)
+    are configured by the host application on the tracer provider as usual.
+    """
+
+    def __init__(self, tracer=None):
+        try:
+            from opentelemetry import trace
+        except Exception as exc:  # pragma: no cover
+            raise RuntimeError("opentelemetry-api package not available") from exc
+        self._trace = trace
+        self._tracer = tracer or trace.get_tracer("swim_planner_llm")
+
+    def start_span(self, name: str, attributes: Mapping[str, Any], parent: Optional[Span]) -> Span:
+        # Without one of our spans as parent, the span joins the caller's
+        # current OpenTelemetry context (e.g. the web request span).
+        context = self._trace.set_span_in_context(parent._span) if isinstance(parent, _OtelSpan) else None
+        span = self._tracer.start_span(
+            name,
+            context=context,
+            attributes={key: _attribute(value) for key, value in attributes.items()},
+        )
+        return _OtelSpan(span, self._trace.Status, self._trace.StatusCode)
+
+
+def tracer_from_env() -> Tracer:
+    value = (os.getenv(TRACE_ENV) or "").strip()
+    if value.lower() in {"", "0", "off", "false", "no", "none"}:
+        return NoopTracer()
+    if value.lower() == "otel":
+        return OpenTelemetryTracer()
+    if value.startswith("jsonl:") and value[len("jsonl:"):]:
+        return JsonlTracer(value[len("jsonl:"):])
+    raise ValueError(f"Unknown {TRACE_ENV} value '{value}'. Use 'off', 'otel' or 'jsonl:<path>'.")
+
+
+_TRACER: Optional[Tracer] = None
+_TRACER_LOCK = threading.Lock()
+_ACTIVE: ContextVar[Span] = ContextVar("swim_planner_span", default=NOOP_SPAN)
+_SPAN_SINKS: tuple[SpanSink, ...] = ()
+
+
+def get_tracer() -> Tracer:
+    global _TRACER
+    if _TRACER is None:
+        with _TRACER_LOCK:
+            if _TRACER is None:
+                _TRACER = tracer_from_env()
+    return _TRACER
+
+
+def set_tracer(tracer: Optional[Tracer]) -> Optional[Tracer]:
+    """Installs a tracer (None re-reads SWIM_PLANNER_TRACE on next use); returns the previous one."""
+    global _TRACER
+    with _TRACER_LOCK:
+        previous, _TRACER = _TRACER, tracer
+    return previous
+
+
+def add_span_sink(sink: SpanSink) -> None:
+    global _SPAN_SINKS
+    with _TRACER_LOCK:
+        _SPAN_SINKS = _SPAN_SINKS + (sink,)
+
+
+def remove_span_sink(sink: SpanSink) -> None:
+    global _SPAN_SINKS
+    with _TRACER_LOCK:
+        _SPAN_SINKS = tuple(s for s in _SPAN_SINKS if s is not sink)
+
+
+def current_span() -> Span:
+    return _ACTIVE.get()
+
+
+class _Scope:
+    __slots__ = ("_tracer", "_name", "_attributes", "_span", "_token", "_started")
+
+    def __init__(self, tracer: Optional[Tracer], name: str, attributes: Mapping[str, Any]):
+        self._tracer = tracer
+        self._name = name
+        self._attributes = attributes
+
+    def __enter__(self) -> Span:
+        # With only sinks listening (tracer None) there is no span to activate.
+        if self._tracer is None:
+            self._span: Span = NOOP_SPAN
+            self._token = None
+        else:
+            self._span = self._tracer.start_span(self._name, self._attributes, _ACTIVE.get())
+            self._token = _ACTIVE.set(self._span)
+        self._started = time.perf_counter()
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        elapsed = time.perf_counter() - self._started
+        if self._token is not None:
+            if exc is not None:
+                self._span.record_error(exc)
+            _ACTIVE.reset(self._token)
+            self._span.end()
+        for sink in _SPAN_SINKS:
+            sink(self._name, elapsed, exc)
+        return False
+
+
+def span(name: str, **attributes: Any):
+    """Context manager for one pipeline stage; an exception leaving it marks the span failed."""
+    tracer = get_tracer()
+    if isinstance(tracer, NoopTracer):
+        return _Scope(None, name, attributes) if _SPAN_SINKS else NOOP_SPAN
+    return _Scope(tracer, name, attributes)
+
+
+__all__ = [
+    "JsonlTracer",
+    "NoopTracer",
+    "OpenTelemetryTracer",
+    "Span",
+    "SpanSink",
+    "add_span_sink",
+    "Tracer",
+    "current_span",
+    "get_tracer",
+    "remove_span_sink",
+    "set_tracer",
+    "span",
+    "tracer_from_env",
+]
@@ -1,26 +1,52 @@
 from __future__ import annotations
 
 import json
+from functools import lru_cache
+from typing import TYPE_CHECKING, Sequence
 
 from swim_planner_llm.llm_client import (
+    OUTPUT_FORMATS,
+    PLAN_TOOL_NAME,
     _distance_guidance,
+    _final_instruction,
+    _output_shape_block,
+    _repair_final_instruction,
+    _repair_task_block,
     _schema_excerpt,
     _section_proportion_guidance,
     _swim_level_hint,
+    _validation_error_block,
 )
 from swim_planner_llm.models import SwimPlanInput
 
 from .types import GenerationSpecV2
 
-
-def build_system_prompt_v2() -> str:
+if TYPE_CHECKING:
+    from swim_planner_llm.validator import Violation
+
+
+def build_system_prompt_v2(output_format: str = "json") -> str:
+    if output_format == "dsl":
+        output_rule = (
+            "Return the plan in the compact line format described in the request. "
+            "Do not include JSON, markdown, comments, or explanations."
+        )
+    elif output_format == "tool":
+        output_rule = (
+            f"Submit the plan by calling the {PLAN_TOOL_NAME} tool with input matching its schema exactly. "
+            "Do not include extra keys."
+        )
+    else:
+        output_rule = (
+            "Return valid JSON matching the provided schema exactly. "
+            "Do not include markdown, comments, explanations, or extra keys."
+        )
     return (
         "You design fun-first swimming sessions for recreational swimmers. "
         "Your sessions feel readable, intentional, and satisfying to complete. "
         "This is not a performance training plan: avoid test-like language by default. "
         "Follow the selected session archetype as a mandatory structure. "
-        "Return valid JSON matching the provided schema exactly. "
-        "Do not include markdown, comments, explanations, or extra keys."
+        f"{output_rule}"
     )
 
 
@@ -86,37 +112,8 @@ def _tag_modifier_hints(tags: list[str], archetype_name: str, swim_level: str |
     return " ".join(hints) if hints else "No special tag modifiers required beyond compatibility."
 
 
-def build_user_prompt_v2(
-    payload: SwimPlanInput,
-    history_summary: str,
-    spec: GenerationSpecV2,
-) -> str:
-    req = payload.session_requested
-    requested_tags = list(spec.requested_tags)
-    swim_level = req.swim_level
-
-    schema_excerpt = _schema_excerpt()
-    distance_guidance = _distance_guidance(req.duration_minutes, req.effort)
-    section_proportions = _section_proportion_guidance(req.effort, req.duration_minutes)
-
-    archetype = spec.archetype
-    archetype_contract = (
-        f"Selected archetype: {archetype.display_name}\n"
-        f"- main_set steps must be {archetype.min_main_steps}-{archetype.max_main_steps}\n"
-        f"- allowed main_set kinds: {sorted(archetype.allowed_main_kinds)}\n"
-        f"- one main idea only: do not add extra mechanics outside this archetype\n"
-    )
-
-    swim_level_block = (
-        f"SWIM LEVEL:\n"
-        f"The swimmer's level is '{swim_level}'.\n"
-        f"{_swim_level_hint(swim_level)}\n\n"
-        if swim_level
-        else ""
-    )
-
-    tag_hints = _tag_modifier_hints(requested_tags, archetype.display_name, swim_level)
-
+@lru_cache(maxsize=len(OUTPUT_FORMATS))
+def _user_prompt_prefix_v2(output_format: str) -> str:
     return (
         "Generate a personalised swim session plan.\n\n"
         "DECISION PRIORITY (follow in this order):\n"
@@ -126,18 +123,6 @@ def build_user_prompt_v2(
         "4. Match requested duration_minutes and effort.\n"
         "5. Apply tags as modifiers only (do not change the session shape).\n"
         "6. Use history to avoid disliked mechanics and repetition.\n\n"
-        "REQUEST:\n"
-        f"{json.dumps(req.model_dump(), sort_keys=True)}\n\n"
-        f"{swim_level_block}"
-        "REQUESTED TAGS (modifiers only):\n"
-        f"{json.dumps(requested_tags)}\n"
-        f"{tag_hints}\n\n"
-        "HISTORIC GUIDANCE:\n"
-        f"{history_summary}\n\n"
-        "ARCHETYPE CONTRACT (MANDATORY):\n"
-        f"{archetype_contract}\n"
-        "LOCKED BLUEPRINT (DO NOT CHANGE STEP COUNTS):\n"
-        f"{_blueprint_block(spec)}\n\n"
         "EFFORT EXPRESSION:\n"
         "- easy: smooth, comfortable; longer repeats or easier rest.\n"
         "- medium: steady, repeatable; moderate rest.\n"
@@ -147,10 +132,6 @@ def build_user_prompt_v2(
         "- Use plain, everyday language.\n"
         "- Do not write test-like or race-like instructions unless explicitly requested.\n"
         "- Do not reference metres, distances, or rep lengths in descriptions; cue effort and feel instead.\n\n"
-        "DISTANCE GUIDANCE:\n"
-        f"{distance_guidance}\n\n"
-        "SECTION PROPORTIONS:\n"
-        f"{section_proportions}\n\n"
         "HARD CONSTRAINTS:\n"
         "- Return exactly ONE JSON object.\n"
         "- Do not include markdown.\n"
@@ -179,34 +160,90 @@ def build_user_prompt_v2(
         "- fins: true may only be set when 'fins' is in requested_tags.\n"
         "- pull: true may only be set when 'pull' is in requested_tags.\n"
         "- paddles: true may only be set when 'paddles' is in requested_tags.\n\n"
-        "OUTPUT SHAPE EXAMPLE:\n"
-        f"{schema_excerpt}\n\n"
-        "Return the final JSON object only."
+        f"{_output_shape_block(_schema_excerpt(), output_format)}"
+    )
+
+
+def build_user_prompt_v2(
+    payload: SwimPlanInput,
+    history_summary: str,
+    spec: GenerationSpecV2,
+    output_format: str = "json",
+) -> str:
+    return "".join(build_user_prompt_v2_parts(payload, history_summary, spec, output_format))
+
+
+def build_user_prompt_v2_parts(
+    payload: SwimPlanInput,
+    history_summary: str,
+    spec: GenerationSpecV2,
+    output_format: str = "json",
+) -> tuple[str, str]:
+    req = payload.session_requested
+    requested_tags = list(spec.requested_tags)
+    swim_level = req.swim_level
+
+    distance_guidance = _distance_guidance(req.duration_minutes, req.effort)
+    section_proportions = _section_proportion_guidance(req.effort, req.duration_minutes)
+
+    archetype = spec.archetype
+    archetype_contract = (
+        f"Selected archetype: {archetype.display_name}\n"
+        f"- main_set steps must be {archetype.min_main_steps}-{archetype.max_main_steps}\n"
+        f"- allowed main_set kinds: {sorted(archetype.allowed_main_kinds)}\n"
+        f"- one main idea only: do not add extra mechanics outside this archetype\n"
+    )
+
+    swim_level_block = (
+        f"SWIM LEVEL:\n"
+        f"The swimmer's level is '{swim_level}'.\n"
+        f"{_swim_level_hint(swim_level)}\n\n"
+        if swim_level
+        else ""
+    )
+
+    tag_hints = _tag_modifier_hints(requested_tags, archetype.display_name, swim_level)
+
+    suffix = (
+        "REQUEST:\n"
+        f"{json.dumps(req.model_dump(), sort_keys=True)}\n\n"
+        f"{swim_level_block}"
+        "REQUESTED TAGS (modifiers only):\n"
+        f"{json.dumps(requested_tags)}\n"
+        f"{tag_hints}\n\n"
+        "HISTORIC GUIDANCE:\n"
+        f"{history_summary}\n\n"
+        "ARCHETYPE CONTRACT (MANDATORY):\n"
+        f"{archetype_contract}\n"
+        "LOCKED BLUEPRINT (DO NOT CHANGE STEP COUNTS):\n"
+        f"{_blueprint_block(spec)}\n\n"
+        "DISTANCE GUIDANCE:\n"
+        f"{distance_guidance}\n\n"
+        "SECTION PROPORTIONS:\n"
+        f"{section_proportions}\n\n"
+        f"{_final_instruction(output_format)}"
     )
+    return _user_prompt_prefix_v2(output_format), suffix
 
 
 def build_repair_prompt_v2(
     original_text: str,
     error_text: str,
     spec: GenerationSpecV2,
+    violations: Sequence[Violation] = (),
+    output_format: str = "json",
 ) -> str:
     archetype = spec.archetype
     return (
-        "Your previous response was invalid.\n\n"
-        "TASK:\n"
-        "Return a corrected version of the JSON only.\n"
-        "Do not explain the error.\n"
-        "Do not include markdown.\n"
-        "Do not include any text before or after the JSON.\n\n"
+        f"{_repair_task_block(output_format)}"
         "IMPORTANT:\n"
         f"- Selected archetype is mandatory: {archetype.display_name}\n"
         f"- main_set steps must be {archetype.min_main_steps}-{archetype.max_main_steps}\n"
         f"- allowed main_set kinds: {sorted(archetype.allowed_main_kinds)}\n"
         "- Follow the locked blueprint exactly (do not change step counts).\n"
         f"{_blueprint_block(spec)}\n\n"
-        "VALIDATION ERROR:\n"
-        f"{error_text}\n\n"
+        f"{_validation_error_block(error_text, violations)}"
         "PREVIOUS OUTPUT:\n"
         f"{original_text}\n\n"
-        "Return one corrected JSON object only."
+        f"{_repair_final_instruction(output_format)}"
     )
@@ -2,17 +2,14 @@ from __future__ import annotations
 
 from typing import Iterable
 
-from swim_planner_llm.models import HistoricSession, SwimPlanInput
+from swim_planner_llm.models import SwimPlanInput
 from swim_planner_llm.style_inference import infer_prefer_varied_from_payload
 
-from .archetypes import ARCHETYPES, DISPLAY_NAME_TO_ID
+from .archetypes import ARCHETYPES
 from .blueprint import build_blueprint_v2
 from .types import ArchetypeId, GenerationSpecV2
 
 
-_RISK_TAGS = {"pace-too-fast", "long", "tiring"}
-
-
 def _normalize_tags(tags: Iterable[str]) -> list[str]:
     out: list[str] = []
     seen: set[str] = set()
@@ -31,36 +28,6 @@ def _merged_requested_tags(payload: SwimPlanInput) -> list[str]:
     )
 
 
-def _has_sensitive_down_feedback(historic_sessions: list[HistoricSession]) -> bool:
-    for session in historic_sessions:
-        if session.thumb != 0:
-            continue
-        lowered = {t.strip().lower() for t in session.tags if t and t.strip()}
-        if lowered.intersection(_RISK_TAGS):
-            return True
-    return False
-
-
-def _extract_last_v2_archetype_id(historic_sessions: list[HistoricSession]) -> ArchetypeId | None:
-    for session in reversed(historic_sessions):
-        plan = session.session_plan or {}
-        title = (
-            (plan.get("sections") or {})
-            .get("main_set", {})
-            .get("title", "")
-        )
-        if not isinstance(title, str) or "—" not in title:
-            continue
-        _, _, suffix = title.partition("—")
-        name = suffix.strip().lower()
-        if not name:
-            continue
-        archetype_id = DISPLAY_NAME_TO_ID.get(name)
-        if archetype_id:
-            return archetype_id
-    return None
-
-
 def _route_archetype_id(
     payload: SwimPlanInput,
     requested_tags: set[str],
@@ -112,7 +79,7 @@ def build_generation_spec_v2(payload: SwimPlanInput) -> GenerationSpecV2:
 
     archetype_id, forced_by_tags = _route_archetype_id(payload, requested_tags)
 
-    sensitive = _has_sensitive_down_feedback(payload.historic_sessions)
+    sensitive = payload.history_profile.risk_down
     if sensitive and archetype_id in {"stroke_switch_ladder", "punchy_pops"}:
         # Avoid spiky / cognitively heavier sessions unless explicitly requested.
         if archetype_id == "stroke_switch_ladder" and "mixed" not in requested_tags:
@@ -120,7 +87,7 @@ def build_generation_spec_v2(payload: SwimPlanInput) -> GenerationSpecV2:
         if archetype_id == "punchy_pops" and not ({"speed", "sprints"} & requested_tags):
             archetype_id = "flow_reset"
 
-    last = _extract_last_v2_archetype_id(payload.historic_sessions)
+    last = payload.history_profile.last_archetype_id
     archetype_id = _rotate_if_repeating(
         archetype_id,
         last_archetype_id=last,
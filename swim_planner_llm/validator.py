@@ -1,14 +1,14 @@
 from __future__ import annotations
 
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Sequence
 from uuid import UUID, uuid4, uuid5
 
 from pydantic import ValidationError
 
 from .models import (
     PYRAMID_KINDS,
-    HistoricSession,
     LLMPlanDraft,
     Section,
     Sections,
@@ -16,12 +16,29 @@ from .models import (
     Step,
     SwimPlanResponse,
 )
+from .history import HistoryLike, as_history_profile
 from .style_inference import infer_prefer_varied
 from .v2.types import GenerationSpecV2
 
 
+@dataclass(frozen=True)
+class Violation:
+    code: str
+    path: str
+    message: str
+
+
 class ValidationIssue(ValueError):
-    pass
+    def __init__(self, message: str, violations: Sequence[Violation] = (), *, code: Optional[str] = None) -> None:
+        super().__init__(message)
+        self.violations: tuple[Violation, ...] = tuple(violations)
+        # Stable snake_case label for metrics; defaults to the first violation's code.
+        self.code: Optional[str] = code or (self.violations[0].code if self.violations else None)
+
+
+def _raise_first(violations: list[Violation]) -> None:
+    if violations:
+        raise ValidationIssue(violations[0].message, violations)
 
 
 ALLOWED_STEP_KINDS = {
@@ -62,219 +79,195 @@ def _step_signature(step: Step) -> tuple:
     )
 
 
-def _has_sensitive_down_feedback(historic_sessions: list[HistoricSession]) -> bool:
-    risk_tags = {"pace-too-fast", "long", "tiring"}
-    for session in historic_sessions:
-        if session.thumb != 0:
-            continue
-        lowered = {tag.strip().lower() for tag in session.tags if tag and tag.strip()}
-        if lowered.intersection(risk_tags):
-            return True
-    return False
+def _step_issue(out: list[Violation], step: Step, section_name: str, code: str, field: str, message: str) -> None:
+    path = f"{section_name}.{step.step_id}.{field}" if field else f"{section_name}.{step.step_id}"
+    out.append(Violation(code, path, f"{section_name}.{step.step_id}: {message}"))
 
 
-def _validate_step_fields(step: Step, section_name: str) -> None:
+def _collect_step_fields(step: Step, section_name: str, out: list[Violation]) -> None:
+    def issue(code: str, field: str, message: str) -> None:
+        _step_issue(out, step, section_name, code, field, message)
+
     if step.kind not in ALLOWED_STEP_KINDS:
-        raise ValidationIssue(
-            f"{section_name}.{step.step_id}: invalid kind '{step.kind}'"
-        )
+        issue("invalid_kind", "kind", f"invalid kind '{step.kind}'")
 
     if step.kind == "intervals" and step.reps == 1:
-        raise ValidationIssue(
-            f"{section_name}.{step.step_id}: intervals steps must have reps >= 2 (use kind 'continuous' for a single rep)"
+        issue(
+            "intervals_single_rep",
+            "reps",
+            "intervals steps must have reps >= 2 (use kind 'continuous' for a single rep)",
         )
 
     if step.stroke not in ALLOWED_STROKES:
-        raise ValidationIssue(
-            f"{section_name}.{step.step_id}: invalid stroke '{step.stroke}'"
-        )
+        issue("invalid_stroke", "stroke", f"invalid stroke '{step.stroke}'")
 
     if step.effort not in ALLOWED_EFFORTS:
-        raise ValidationIssue(
-            f"{section_name}.{step.step_id}: invalid effort '{step.effort}'"
-        )
+        issue("invalid_effort", "effort", f"invalid effort '{step.effort}'")
 
     if step.reps <= 0:
-        raise ValidationIssue(
-            f"{section_name}.{step.step_id}: reps must be > 0"
-        )
+        issue("reps_not_positive", "reps", "reps must be > 0")
 
     if step.kind in PYRAMID_KINDS:
         seq = step.pyramid_sequence_m
         if not seq:
-            raise ValidationIssue(
-                f"{section_name}.{step.step_id}: pyramid_sequence_m is required for kind '{step.kind}'"
-            )
-        if step.reps != len(seq):
-            raise ValidationIssue(
-                f"{section_name}.{step.step_id}: reps must equal pyramid_sequence_m length"
+            issue(
+                "pyramid_sequence_missing",
+                "pyramid_sequence_m",
+                f"pyramid_sequence_m is required for kind '{step.kind}'",
             )
-        for d in seq:
-            if d < 50 or d % 50 != 0:
-                raise ValidationIssue(
-                    f"{section_name}.{step.step_id}: every pyramid_sequence_m value must be a multiple of 50 and >= 50"
+        else:
+            if step.reps != len(seq):
+                issue("pyramid_reps_mismatch", "reps", "reps must equal pyramid_sequence_m length")
+            if any(d < 50 or d % 50 != 0 for d in seq):
+                issue(
+                    "pyramid_distance_not_50",
+                    "pyramid_sequence_m",
+                    "every pyramid_sequence_m value must be a multiple of 50 and >= 50",
                 )
     else:
         if step.distance_per_rep_m <= 0:
-            raise ValidationIssue(
-                f"{section_name}.{step.step_id}: distance_per_rep_m must be > 0"
-            )
-        if step.distance_per_rep_m % 50 != 0:
-            raise ValidationIssue(
-                f"{section_name}.{step.step_id}: distance_per_rep_m must be divisible by 50"
-            )
+            issue("distance_not_positive", "distance_per_rep_m", "distance_per_rep_m must be > 0")
+        elif step.distance_per_rep_m % 50 != 0:
+            issue("distance_not_50", "distance_per_rep_m", "distance_per_rep_m must be divisible by 50")
 
     if step.rest_sequence_s is not None:
         if step.kind not in PYRAMID_KINDS:
-            raise ValidationIssue(
-                f"{section_name}.{step.step_id}: rest_sequence_s is only valid for pyramid/descending/ascending kinds"
+            issue(
+                "rest_sequence_kind",
+                "rest_sequence_s",
+                "rest_sequence_s is only valid for pyramid/descending/ascending kinds",
             )
         if step.pyramid_sequence_m and len(step.rest_sequence_s) != len(step.pyramid_sequence_m):
-            raise ValidationIssue(
-                f"{section_name}.{step.step_id}: rest_sequence_s length must match pyramid_sequence_m"
+            issue(
+                "rest_sequence_length",
+                "rest_sequence_s",
+                "rest_sequence_s length must match pyramid_sequence_m",
             )
-        for v in step.rest_sequence_s:
-            if v < 0:
-                raise ValidationIssue(
-                    f"{section_name}.{step.step_id}: rest_sequence_s values must be >= 0"
-                )
+        if any(v < 0 for v in step.rest_sequence_s):
+            issue("rest_sequence_negative", "rest_sequence_s", "rest_sequence_s values must be >= 0")
         if step.rest_seconds is not None:
-            raise ValidationIssue(
-                f"{section_name}.{step.step_id}: rest_sequence_s and rest_seconds are mutually exclusive"
+            issue(
+                "rest_sequence_conflict",
+                "rest_seconds",
+                "rest_sequence_s and rest_seconds are mutually exclusive",
             )
         if step.sendoff_seconds is not None:
-            raise ValidationIssue(
-                f"{section_name}.{step.step_id}: rest_sequence_s and sendoff_seconds are mutually exclusive"
+            issue(
+                "rest_sequence_conflict",
+                "sendoff_seconds",
+                "rest_sequence_s and sendoff_seconds are mutually exclusive",
             )
 
     if step.sendoff_sequence_s is not None:
         if step.kind not in PYRAMID_KINDS:
-            raise ValidationIssue(
-                f"{section_name}.{step.step_id}: sendoff_sequence_s is only valid for pyramid/descending/ascending kinds"
+            issue(
+                "sendoff_sequence_kind",
+                "sendoff_sequence_s",
+                "sendoff_sequence_s is only valid for pyramid/descending/ascending kinds",
             )
         if step.pyramid_sequence_m and len(step.sendoff_sequence_s) != len(step.pyramid_sequence_m):
-            raise ValidationIssue(
-                f"{section_name}.{step.step_id}: sendoff_sequence_s length must match pyramid_sequence_m"
+            issue(
+                "sendoff_sequence_length",
+                "sendoff_sequence_s",
+                "sendoff_sequence_s length must match pyramid_sequence_m",
             )
-        for v in step.sendoff_sequence_s:
-            if v < 1:
-                raise ValidationIssue(
-                    f"{section_name}.{step.step_id}: sendoff_sequence_s values must be >= 1"
-                )
+        if any(v < 1 for v in step.sendoff_sequence_s):
+            issue("sendoff_sequence_min", "sendoff_sequence_s", "sendoff_sequence_s values must be >= 1")
         if step.sendoff_seconds is not None:
-            raise ValidationIssue(
-                f"{section_name}.{step.step_id}: sendoff_sequence_s and sendoff_seconds are mutually exclusive"
+            issue(
+                "sendoff_sequence_conflict",
+                "sendoff_seconds",
+                "sendoff_sequence_s and sendoff_seconds are mutually exclusive",
             )
         if step.rest_sequence_s is not None:
-            raise ValidationIssue(
-                f"{section_name}.{step.step_id}: rest_sequence_s and sendoff_sequence_s are mutually exclusive"
+            issue(
+                "sendoff_sequence_conflict",
+                "rest_sequence_s",
+                "rest_sequence_s and sendoff_sequence_s are mutually exclusive",
             )
 
     if step.hypoxic is True and section_name != "main_set":
-        raise ValidationIssue(
-            f"{section_name}.{step.step_id}: hypoxic: true is only permitted on main_set steps"
-        )
+        issue("hypoxic_section", "hypoxic", "hypoxic: true is only permitted on main_set steps")
 
     if step.hypoxic is True and (step.rest_seconds is None or step.rest_seconds < 20):
-        raise ValidationIssue(
-            f"{section_name}.{step.step_id}: hypoxic steps must have rest_seconds >= 20"
-        )
+        issue("hypoxic_rest", "rest_seconds", "hypoxic steps must have rest_seconds >= 20")
 
     if step.underwater is True and section_name != "main_set":
-        raise ValidationIssue(
-            f"{section_name}.{step.step_id}: underwater: true is only permitted on main_set steps"
-        )
+        issue("underwater_section", "underwater", "underwater: true is only permitted on main_set steps")
 
     if step.underwater is True and step.sendoff_seconds is not None:
-        raise ValidationIssue(
-            f"{section_name}.{step.step_id}: underwater steps must use rest_seconds, not sendoff_seconds"
+        issue(
+            "underwater_sendoff",
+            "sendoff_seconds",
+            "underwater steps must use rest_seconds, not sendoff_seconds",
         )
 
     if step.underwater is True and (step.rest_seconds is None or step.rest_seconds < 30):
-        raise ValidationIssue(
-            f"{section_name}.{step.step_id}: underwater steps must have rest_seconds >= 30"
-        )
+        issue("underwater_rest", "rest_seconds", "underwater steps must have rest_seconds >= 30")
 
     if step.kind == "broken":
         if step.broken_pause_s is None or step.broken_pause_s < 5:
-            raise ValidationIssue(
-                f"{section_name}.{step.step_id}: broken steps must have broken_pause_s >= 5"
-            )
+            issue("broken_pause", "broken_pause_s", "broken steps must have broken_pause_s >= 5")
 
     if step.kind == "build" and step.reps != 1:
-        raise ValidationIssue(
-            f"{section_name}.{step.step_id}: build steps must have reps == 1"
-        )
+        issue("single_rep_kind", "reps", "build steps must have reps == 1")
 
     if step.kind == "negative_split":
         if step.reps != 1:
-            raise ValidationIssue(
-                f"{section_name}.{step.step_id}: negative_split steps must have reps == 1"
-            )
+            issue("single_rep_kind", "reps", "negative_split steps must have reps == 1")
         if not (step.split_instruction or "").strip():
-            raise ValidationIssue(
-                f"{section_name}.{step.step_id}: negative_split steps must include split_instruction"
+            issue(
+                "split_instruction_missing",
+                "split_instruction",
+                "negative_split steps must include split_instruction",
             )
 
     if step.kind == "fartlek" and step.reps != 1:
-        raise ValidationIssue(
-            f"{section_name}.{step.step_id}: fartlek steps must have reps == 1"
-        )
+        issue("single_rep_kind", "reps", "fartlek steps must have reps == 1")
 
     if step.kind == "time_trial" and step.reps != 1:
-        raise ValidationIssue(
-            f"{section_name}.{step.step_id}: time_trial steps must have reps == 1"
-        )
+        issue("single_rep_kind", "reps", "time_trial steps must have reps == 1")
 
     if step.step_distance_m <= 0:
-        raise ValidationIssue(
-            f"{section_name}.{step.step_id}: computed step distance must be > 0"
-        )
-
-    if step.step_distance_m % 50 != 0:
-        raise ValidationIssue(
-            f"{section_name}.{step.step_id}: computed step distance must be divisible by 50"
-        )
+        issue("step_distance_not_positive", "", "computed step distance must be > 0")
+    elif step.step_distance_m % 50 != 0:
+        issue("step_distance_not_50", "", "computed step distance must be divisible by 50")
 
     if step.rest_seconds is not None and step.rest_seconds < 0:
-        raise ValidationIssue(
-            f"{section_name}.{step.step_id}: rest_seconds must be >= 0 or null"
-        )
+        issue("rest_negative", "rest_seconds", "rest_seconds must be >= 0 or null")
 
     if not step.step_id.strip():
-        raise ValidationIssue(
-            f"{section_name}: step_id must not be empty"
-        )
+        out.append(Violation("step_id_empty", f"{section_name}.step_id", f"{section_name}: step_id must not be empty"))
 
     if not step.description.strip():
-        raise ValidationIssue(
-            f"{section_name}.{step.step_id}: description must not be empty"
-        )
+        issue("description_empty", "description", "description must not be empty")
 
 
-def _validate_section(section: Section, section_name: str) -> int:
+def _collect_section(section: Section, section_name: str, out: list[Violation]) -> int:
     if not section.title.strip():
-        raise ValidationIssue(f"{section_name}: title must not be empty")
+        out.append(Violation("title_empty", f"{section_name}.title", f"{section_name}: title must not be empty"))
 
     if not section.steps:
-        raise ValidationIssue(f"{section_name}: must contain at least one step")
+        out.append(
+            Violation("section_empty", f"{section_name}.steps", f"{section_name}: must contain at least one step")
+        )
 
     step_sum = 0
     for step in section.steps:
-        _validate_step_fields(step, section_name)
+        _collect_step_fields(step, section_name, out)
         step_sum += step.step_distance_m
 
+    path = f"{section_name}.section_distance_m"
     if section.section_distance_m <= 0:
-        raise ValidationIssue(f"{section_name}: section_distance_m must be > 0")
-
-    if section.section_distance_m % 50 != 0:
-        raise ValidationIssue(
-            f"{section_name}: section_distance_m must be divisible by 50"
+        out.append(Violation("section_distance_not_positive", path, f"{section_name}: section_distance_m must be > 0"))
+    elif section.section_distance_m % 50 != 0:
+        out.append(
+            Violation("section_distance_not_50", path, f"{section_name}: section_distance_m must be divisible by 50")
         )
 
     if step_sum != section.section_distance_m:
-        raise ValidationIssue(
-            f"{section_name}: section_distance_m does not match step sum"
+        out.append(
+            Violation("section_distance_mismatch", path, f"{section_name}: section_distance_m does not match step sum")
         )
 
     return step_sum
@@ -284,123 +277,191 @@ def validate_schema(plan: SwimPlanResponse) -> None:
     try:
         SwimPlanResponse.model_validate(plan.model_dump())
     except ValidationError as exc:
-        raise ValidationIssue(f"schema validation failed: {exc}") from exc
+        raise ValidationIssue(
+            f"schema validation failed: {exc}",
+            [Violation("schema_invalid", "", f"schema validation failed: {exc}")],
+        ) from exc
 
 
-def validate_invariants(
+def collect_violations(
     plan: SwimPlanResponse,
     request: SessionRequested,
-    historic_sessions: list[HistoricSession],
+    historic_sessions: HistoryLike,
     requested_tags: list[str],
     *,
     version: str = "v1",
     v2_spec: GenerationSpecV2 | None = None,
-) -> None:
-    warm_sum = _validate_section(plan.sections.warm_up, "warm_up")
-    main_sum = _validate_section(plan.sections.main_set, "main_set")
-    cool_sum = _validate_section(plan.sections.cool_down, "cool_down")
+) -> list[Violation]:
+    """
+    Walks the whole plan once and returns every violation found, in the order
+    validate_invariants would have reported them.
+    """
+    out: list[Violation] = []
+    history = as_history_profile(historic_sessions)
+
+    warm_sum = _collect_section(plan.sections.warm_up, "warm_up", out)
+    main_sum = _collect_section(plan.sections.main_set, "main_set", out)
+    cool_sum = _collect_section(plan.sections.cool_down, "cool_down", out)
 
     total = warm_sum + main_sum + cool_sum
     if total != plan.estimated_distance_m:
-        raise ValidationIssue(
-            "estimated_distance_m does not match total section distances"
+        out.append(
+            Violation(
+                "estimated_distance_mismatch",
+                "estimated_distance_m",
+                "estimated_distance_m does not match total section distances",
+            )
         )
 
     if plan.estimated_distance_m <= 0:
-        raise ValidationIssue("estimated_distance_m must be > 0")
-
-    if plan.estimated_distance_m % 50 != 0:
-        raise ValidationIssue("estimated_distance_m must be divisible by 50")
+        out.append(Violation("estimated_distance_not_positive", "estimated_distance_m", "estimated_distance_m must be > 0"))
+    elif plan.estimated_distance_m % 50 != 0:
+        out.append(
+            Violation("estimated_distance_not_50", "estimated_distance_m", "estimated_distance_m must be divisible by 50")
+        )
 
     if plan.duration_minutes <= 0:
-        raise ValidationIssue("duration_minutes must be > 0")
+        out.append(Violation("duration_not_positive", "duration_minutes", "duration_minutes must be > 0"))
 
     # Keep contract aligned to the user request.
     if plan.duration_minutes != request.duration_minutes:
-        raise ValidationIssue(
-            "duration_minutes must match requested duration_minutes"
+        out.append(
+            Violation(
+                "duration_mismatch",
+                "duration_minutes",
+                "duration_minutes must match requested duration_minutes",
+            )
         )
 
     if version == "v1":
         prefer_varied = infer_prefer_varied(
             request.requested_tags + requested_tags,
-            historic_sessions,
+            history,
         )
 
         if not prefer_varied:
             signatures = {_step_signature(step) for step in plan.sections.main_set.steps}
             if len(signatures) > 1:
-                raise ValidationIssue(
-                    "straightforward style requires one main_set pattern signature"
+                out.append(
+                    Violation(
+                        "style_straightforward",
+                        "main_set.steps",
+                        "straightforward style requires one main_set pattern signature",
+                    )
                 )
 
         if prefer_varied:
             if len(plan.sections.main_set.steps) < 2:
-                raise ValidationIssue(
-                    "varied style should include at least 2 main_set steps"
+                out.append(
+                    Violation(
+                        "style_varied",
+                        "main_set.steps",
+                        "varied style should include at least 2 main_set steps",
+                    )
                 )
     elif version == "v2":
         if v2_spec is None:
-            raise ValidationIssue("v2_spec is required for v2 validation")
-        _validate_v2_archetype_contract(plan, request, requested_tags, v2_spec)
+            out.append(Violation("v2_spec_missing", "", "v2_spec is required for v2 validation"))
+        else:
+            _collect_v2_archetype_contract(plan, request, requested_tags, v2_spec, out)
     else:
-        raise ValidationIssue(f"unknown validation version '{version}'")
+        out.append(Violation("unknown_version", "", f"unknown validation version '{version}'"))
 
-    if _has_sensitive_down_feedback(historic_sessions):
+    if history.risk_down:
         for step in plan.sections.main_set.steps:
             if (
                 step.kind == "continuous"
                 and step.effort == "hard"
                 and step.step_distance_m > 500
             ):
-                raise ValidationIssue(
-                    "main_set contains long hard continuous block despite sensitive thumbs-down history"
+                out.append(
+                    Violation(
+                        "history_long_hard_continuous",
+                        f"main_set.{step.step_id}",
+                        "main_set contains long hard continuous block despite sensitive thumbs-down history",
+                    )
                 )
+                break
+
+    return out
+
+
+def validate_invariants(
+    plan: SwimPlanResponse,
+    request: SessionRequested,
+    historic_sessions: HistoryLike,
+    requested_tags: list[str],
+    *,
+    version: str = "v1",
+    v2_spec: GenerationSpecV2 | None = None,
+) -> None:
+    _raise_first(
+        collect_violations(
+            plan,
+            request,
+            historic_sessions,
+            requested_tags,
+            version=version,
+            v2_spec=v2_spec,
+        )
+    )
 
 
-def _validate_v2_archetype_contract(
+def _collect_v2_archetype_contract(
     plan: SwimPlanResponse,
     request: SessionRequested,
     requested_tags: list[str],
     spec: GenerationSpecV2,
+    out: list[Violation],
 ) -> None:
     tags = {t.strip().lower() for t in (request.requested_tags + requested_tags) if t and t.strip()}
     archetype = spec.archetype
 
+    def issue(code: str, path: str, message: str) -> None:
+        out.append(Violation(code, path, message))
+
     # Locked blueprint: exact step counts per section.
     if len(plan.sections.warm_up.steps) != spec.blueprint.warm_up.steps:
-        raise ValidationIssue("v2 blueprint mismatch: warm_up step count differs")
+        issue("v2_blueprint_step_count", "warm_up.steps", "v2 blueprint mismatch: warm_up step count differs")
     if len(plan.sections.main_set.steps) != spec.blueprint.main_set.steps:
-        raise ValidationIssue("v2 blueprint mismatch: main_set step count differs")
+        issue("v2_blueprint_step_count", "main_set.steps", "v2 blueprint mismatch: main_set step count differs")
     if len(plan.sections.cool_down.steps) != spec.blueprint.cool_down.steps:
-        raise ValidationIssue("v2 blueprint mismatch: cool_down step count differs")
+        issue("v2_blueprint_step_count", "cool_down.steps", "v2 blueprint mismatch: cool_down step count differs")
 
     # Archetype contract: main_set step count bounds + allowed kinds.
     main_steps = plan.sections.main_set.steps
     if not (archetype.min_main_steps <= len(main_steps) <= archetype.max_main_steps):
-        raise ValidationIssue("v2 archetype contract violation: main_set step count out of bounds")
+        issue(
+            "v2_archetype_step_count",
+            "main_set.steps",
+            "v2 archetype contract violation: main_set step count out of bounds",
+        )
 
     for idx, step in enumerate(main_steps, start=1):
         if step.kind not in archetype.allowed_main_kinds:
-            raise ValidationIssue(
-                f"v2 archetype contract violation: main_set step {idx} kind '{step.kind}' not allowed"
+            issue(
+                "v2_archetype_kind",
+                f"main_set.{step.step_id}.kind",
+                f"v2 archetype contract violation: main_set step {idx} kind '{step.kind}' not allowed",
             )
 
-    # Per-step allowed kinds from blueprint (positionally).
-    for idx, step in enumerate(plan.sections.warm_up.steps, start=1):
-        allowed = spec.blueprint.warm_up.allowed_kinds_by_step[idx - 1]
-        if step.kind not in allowed:
-            raise ValidationIssue(f"v2 blueprint violation: warm_up step {idx} kind '{step.kind}' not allowed")
-
-    for idx, step in enumerate(plan.sections.main_set.steps, start=1):
-        allowed = spec.blueprint.main_set.allowed_kinds_by_step[idx - 1]
-        if step.kind not in allowed:
-            raise ValidationIssue(f"v2 blueprint violation: main_set step {idx} kind '{step.kind}' not allowed")
-
-    for idx, step in enumerate(plan.sections.cool_down.steps, start=1):
-        allowed = spec.blueprint.cool_down.allowed_kinds_by_step[idx - 1]
-        if step.kind not in allowed:
-            raise ValidationIssue(f"v2 blueprint violation: cool_down step {idx} kind '{step.kind}' not allowed")
+    # Per-step allowed kinds from blueprint (positionally; extra steps are
+    # already reported as a step count mismatch above).
+    for section_name, section, section_blueprint in (
+        ("warm_up", plan.sections.warm_up, spec.blueprint.warm_up),
+        ("main_set", plan.sections.main_set, spec.blueprint.main_set),
+        ("cool_down", plan.sections.cool_down, spec.blueprint.cool_down),
+    ):
+        for idx, (step, allowed) in enumerate(
+            zip(section.steps, section_blueprint.allowed_kinds_by_step),
+            start=1,
+        ):
+            if step.kind not in allowed:
+                issue(
+                    "v2_blueprint_kind",
+                    f"{section_name}.{step.step_id}.kind",
+                    f"v2 blueprint violation: {section_name} step {idx} kind '{step.kind}' not allowed",
+                )
 
     # Gear rules: never enable gear unless requested; gear only in main_set for v2.
     requested_gear = {"fins", "pull", "paddles"} & tags
@@ -410,48 +471,81 @@ def _validate_v2_archetype_contract(
     ):
         for step in section.steps:
             if step.fins or step.pull or step.paddles:
-                raise ValidationIssue(f"v2 gear rule violation: gear used in {section_name}")
+                issue(
+                    "v2_gear_section",
+                    f"{section_name}.{step.step_id}",
+                    f"v2 gear rule violation: gear used in {section_name}",
+                )
 
     for step in plan.sections.main_set.steps:
-        if step.fins and "fins" not in tags:
-            raise ValidationIssue("v2 gear rule violation: fins used without 'fins' tag")
-        if step.pull and "pull" not in tags:
-            raise ValidationIssue("v2 gear rule violation: pull used without 'pull' tag")
-        if step.paddles and "paddles" not in tags:
-            raise ValidationIssue("v2 gear rule violation: paddles used without 'paddles' tag")
+        for flag in ("fins", "pull", "paddles"):
+            if getattr(step, flag) and flag not in tags:
+                issue(
+                    "v2_gear_unrequested",
+                    f"main_set.{step.step_id}.{flag}",
+                    f"v2 gear rule violation: {flag} used without '{flag}' tag",
+                )
 
         gear_count = sum(bool(x) for x in (step.fins, step.pull, step.paddles))
         if gear_count > 1:
-            raise ValidationIssue("v2 gear rule violation: multiple gear flags set on one step")
+            issue(
+                "v2_gear_multiple",
+                f"main_set.{step.step_id}",
+                "v2 gear rule violation: multiple gear flags set on one step",
+            )
 
     if archetype.archetype_id == "gear_change_up":
         if not requested_gear:
-            raise ValidationIssue("v2 gear_change_up requires an explicit gear tag")
+            issue("v2_gear_change_up_tag", "", "v2 gear_change_up requires an explicit gear tag")
         any_gear = any(bool(s.fins or s.pull or s.paddles) for s in plan.sections.main_set.steps)
         if not any_gear:
-            raise ValidationIssue("v2 gear_change_up requires at least one main_set gear step")
+            issue(
+                "v2_gear_change_up_missing",
+                "main_set.steps",
+                "v2 gear_change_up requires at least one main_set gear step",
+            )
 
     # Safety: hypoxic/underwater only when explicitly requested and archetype allows.
     if any(s.hypoxic is True for s in plan.sections.main_set.steps):
         if "hypoxic" not in tags:
-            raise ValidationIssue("v2 safety rule violation: hypoxic used without 'hypoxic' tag")
+            issue("v2_hypoxic_untagged", "main_set.steps", "v2 safety rule violation: hypoxic used without 'hypoxic' tag")
         if not archetype.allow_hypoxic_if_tagged:
-            raise ValidationIssue("v2 safety rule violation: hypoxic not allowed for this archetype")
+            issue(
+                "v2_hypoxic_archetype",
+                "main_set.steps",
+                "v2 safety rule violation: hypoxic not allowed for this archetype",
+            )
 
     if any(s.underwater is True for s in plan.sections.main_set.steps):
         if "underwater" not in tags:
-            raise ValidationIssue("v2 safety rule violation: underwater used without 'underwater' tag")
+            issue(
+                "v2_underwater_untagged",
+                "main_set.steps",
+                "v2 safety rule violation: underwater used without 'underwater' tag",
+            )
         if not archetype.allow_underwater_if_tagged:
-            raise ValidationIssue("v2 safety rule violation: underwater not allowed for this archetype")
+            issue(
+                "v2_underwater_archetype",
+                "main_set.steps",
+                "v2 safety rule violation: underwater not allowed for this archetype",
+            )
 
     # Archetype-specific rules.
-    if archetype.archetype_id == "playful_alternator":
-        if plan.sections.main_set.steps[0].kind != "intervals":
-            raise ValidationIssue("v2 playful_alternator requires first main_set step kind 'intervals'")
-        if len(plan.sections.main_set.steps) == 2:
-            step2 = plan.sections.main_set.steps[1]
+    if archetype.archetype_id == "playful_alternator" and main_steps:
+        if main_steps[0].kind != "intervals":
+            issue(
+                "v2_playful_alternator_first",
+                f"main_set.{main_steps[0].step_id}.kind",
+                "v2 playful_alternator requires first main_set step kind 'intervals'",
+            )
+        if len(main_steps) == 2:
+            step2 = main_steps[1]
             if step2.kind != "continuous" or step2.effort != "easy":
-                raise ValidationIssue("v2 playful_alternator second step must be an easy continuous reset")
+                issue(
+                    "v2_playful_alternator_reset",
+                    f"main_set.{step2.step_id}",
+                    "v2 playful_alternator second step must be an easy continuous reset",
+                )
 
     if archetype.archetype_id == "stroke_switch_ladder":
         has_pyramid_kind = any(s.kind in {"pyramid", "ascending", "descending"} for s in main_steps)
@@ -461,12 +555,20 @@ def _validate_v2_archetype_contract(
                 for s in main_steps
             )
             if not has_mapping:
-                raise ValidationIssue("v2 stroke_switch_ladder requires a ladder-like step or an odd/even stroke mapping")
+                issue(
+                    "v2_stroke_switch_ladder_shape",
+                    "main_set.steps",
+                    "v2 stroke_switch_ladder requires a ladder-like step or an odd/even stroke mapping",
+                )
 
     if archetype.archetype_id == "choice_session":
         has_choice = any(s.stroke == "choice" for s in main_steps)
         if not has_choice:
-            raise ValidationIssue("v2 choice_session requires at least one main_set step with stroke 'choice'")
+            issue(
+                "v2_choice_session_stroke",
+                "main_set.steps",
+                "v2 choice_session requires at least one main_set step with stroke 'choice'",
+            )
 
     if archetype.archetype_id == "benchmark_lite":
         challenge = 0
@@ -476,7 +578,11 @@ def _validate_v2_archetype_contract(
             elif "golf" in s.description.lower():
                 challenge += 1
         if challenge != 1:
-            raise ValidationIssue("v2 benchmark_lite requires exactly one challenge element step")
+            issue(
+                "v2_benchmark_lite_challenge",
+                "main_set.steps",
+                "v2 benchmark_lite requires exactly one challenge element step",
+            )
 
 
 def _deterministic_plan_id(request: SessionRequested, seed: int) -> UUID:
@@ -524,7 +630,7 @@ def _convert_steps(
         out.append(step)
 
     if not out:
-        raise ValidationIssue(f"{prefix}: no steps provided")
+        raise ValidationIssue(f"{prefix}: no steps provided", code="section_empty")
 
     return out
 
@@ -569,7 +675,7 @@ def enforce_and_normalize(
             ),
         )
     except ValidationError as exc:
-        raise ValidationIssue(f"step/section normalization failed: {exc}") from exc
+        raise ValidationIssue(f"step/section normalization failed: {exc}", code="normalization_failed") from exc
 
     total = (
         sections.warm_up.section_distance_m
@@ -603,6 +709,6 @@ def enforce_and_normalize(
             sections=sections,
         )
     except ValidationError as exc:
-        raise ValidationIssue(f"response normalization failed: {exc}") from exc
+        raise ValidationIssue(f"response normalization failed: {exc}", code="normalization_failed") from exc
 
     return plan
@@ -1,110 +1,556 @@
 from __future__ import annotations
 
+import asyncio
 import json
-from typing import Optional
+import time
+from typing import Callable, Optional, Union
 
 from pydantic import ValidationError
 
+from .budget import usage_labels
+from .cache import PlanCache, plan_cache_key
+from .dsl import parse_plan_dsl
+from .fallback import build_deterministic_fallback
 from .formatter import plan_to_canonical_text
-from .llm_client_claude import request_plan_json_claude, request_repair_json_claude
+from .hedging import HEDGE_LOOP, BranchResult, HedgeBranch, HedgePolicy, race_branches
+from .llm_client import OUTPUT_FORMATS
+from .metrics import METRICS
 from .models import LLMPlanDraft, SwimPlanInput, SwimPlanResponse
-from .validator import ValidationIssue, enforce_and_normalize, validate_invariants, validate_schema
+from .profiling import ProfileScope, paused
+from .providers import get_provider
+from .repair import LOCAL_REPAIRER, local_repair_enabled
+from .streaming import StreamAborted
+from .tracing import current_span, span
+from .validator import (
+    ValidationIssue,
+    Violation,
+    enforce_and_normalize,
+    validate_invariants,
+    validate_schema,
+)
 from .v2.router import build_generation_spec_v2
 
+# A repair call that starts with less budget than this will not finish in time;
+# serve the fallback straight away instead.
+MIN_REPAIR_BUDGET_S = 2.0
+
 
 def _parse_llm_json(raw_text: str) -> dict:
     try:
         data = json.loads(raw_text)
     except json.JSONDecodeError as exc:
-        raise ValidationIssue(f"json parse failed: {exc}") from exc
+        raise ValidationIssue(f"json parse failed: {exc}", code="json_parse_failed") from exc
 
     if not isinstance(data, dict):
-        raise ValidationIssue("llm output must be a single JSON object")
+        raise ValidationIssue("llm output must be a single JSON object", code="json_not_object")
     return data
 
 
+def _parse_draft(raw: Union[str, dict], output_format: str) -> LLMPlanDraft:
+    if output_format == "dsl":
+        return parse_plan_dsl(raw)
+    # Tool mode hands over the structured tool input; there is no text to parse.
+    data = raw if isinstance(raw, dict) else _parse_llm_json(raw)
+    try:
+        return LLMPlanDraft.model_validate(data)
+    except ValidationError as exc:
+        raise ValidationIssue(f"draft schema failed: {exc}", code="draft_schema_invalid") from exc
+
+
+def _raw_text(raw: Union[str, dict]) -> str:
+    return json.dumps(raw) if isinstance(raw, dict) else raw
+
+
+def _check_output_format(output_format: str, stream: bool) -> None:
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output_format '{output_format}'. Use one of {list(OUTPUT_FORMATS)}.")
+    if stream and output_format == "tool":
+        raise ValueError("stream=True is not supported with output_format='tool'.")
+
+
 def _build_valid_plan_from_llm(
-    raw_text: str,
+    raw: Union[str, dict],
     payload: SwimPlanInput,
     seed: Optional[int],
     *,
     version: str,
     v2_spec=None,
-) -> SwimPlanResponse:
-    data = _parse_llm_json(raw_text)
-    try:
-        draft = LLMPlanDraft.model_validate(data)
-    except ValidationError as exc:
-        raise ValidationIssue(f"draft schema failed: {exc}") from exc
-
-    plan = enforce_and_normalize(draft, payload.session_requested, seed)
+    output_format: str = "json",
+) -> tuple[SwimPlanResponse, bool]:
+    # Returns the plan and whether the local repairer had to fix it.
+    with span("swim_plan.parse", output_format=output_format):
+        draft = _parse_draft(raw, output_format)
+    with span("swim_plan.enforce_and_normalize"):
+        plan = enforce_and_normalize(draft, payload.session_requested, seed)
     if version == "v2" and v2_spec is not None:
         plan.sections.main_set.title = f"Main Set — {v2_spec.archetype.display_name}"
-    validate_schema(plan)
-    validate_invariants(
-        plan,
-        payload.session_requested,
-        payload.historic_sessions,
-        payload.requested_tags,
-        version=version,
-        v2_spec=v2_spec,
-    )
+    try:
+        with span("swim_plan.validate_schema"):
+            validate_schema(plan)
+        with span("swim_plan.validate_invariants", version=version):
+            validate_invariants(
+                plan,
+                payload.session_requested,
+                payload.history_profile,
+                payload.requested_tags,
+                version=version,
+                v2_spec=v2_spec,
+            )
+    except ValidationIssue as exc:
+        # Mechanically fixable problems are patched locally; anything else
+        # escalates to the model repair call with the original error.
+        if not local_repair_enabled():
+            raise
+        with span("swim_plan.local_repair") as repair_span:
+            repaired = LOCAL_REPAIRER.try_repair(
+                plan, payload, version=version, v2_spec=v2_spec, violations=exc.violations
+            )
+            repair_span.set_attribute("fixed", repaired is not None)
+        METRICS.local_repair(repaired is not None)
+        if repaired is None:
+            raise
+        return repaired, True
+    return plan, False
+
+
+def _build_spec(parsed_payload: SwimPlanInput, version: str):
+    if version != "v2":
+        return None
+    with span("swim_plan.build_spec"):
+        spec = build_generation_spec_v2(parsed_payload)
+    METRICS.route(spec.archetype.archetype_id)
+    return spec
+
+
+def _trace_labels(parsed_payload: SwimPlanInput, version: str, v2_spec) -> dict[str, str]:
+    # Archetype inference is only worth paying for when spans are recorded.
+    root = current_span()
+    if not root.recording:
+        return {}
+    labels = {"version": version, "archetype": usage_labels(parsed_payload, version, "plan", v2_spec)["archetype"]}
+    root.set_attribute("archetype", labels["archetype"])
+    return labels
+
+
+def _outcome(plan: SwimPlanResponse, version: str, outcome: str) -> SwimPlanResponse:
+    METRICS.outcome(version, outcome)
+    current_span().set_attribute("outcome", outcome)
     return plan
 
 
-def generate_swim_plan(
-    payload: dict,
-    seed: Optional[int] = None,
+def _failed(version: str) -> None:
+    METRICS.outcome(version, "failed")
+    current_span().set_attribute("outcome", "failed")
+
+
+def _profiled(scope: ProfileScope, plan: SwimPlanResponse, outcome: str) -> SwimPlanResponse:
+    scope.finish(plan.plan_id, outcome="fallback" if plan.is_fallback else outcome)
+    return plan
+
+
+def _resolve_provider(provider: str, *, asynchronous: bool = False):
+    return get_provider(provider).calls(asynchronous=asynchronous)
+
+
+def _generation_failed(first_error: Optional[str], repair_error: Exception) -> ValidationIssue:
+    return ValidationIssue(
+        "Plan generation failed after initial call and one repair attempt. "
+        f"Initial error: {first_error}. Repair error: {repair_error}",
+        code="generation_failed",
+    )
+
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def _deadline_fallback(payload: SwimPlanInput, seed: Optional[int]) -> SwimPlanResponse:
+    with span("swim_plan.fallback"):
+        plan = build_deterministic_fallback(payload, seed)
+    return plan.model_copy(update={"is_fallback": True})
+
+
+def _cache_key(
+    cache: Optional[PlanCache],
+    parsed_payload: SwimPlanInput,
+    seed: Optional[int],
+    version: str,
+    output_format: str = "json",
     provider: str = "claude",
+) -> Optional[str]:
+    # Unseeded requests ask for a fresh plan each time, so they bypass the cache.
+    if cache is None or seed is None:
+        return None
+    return plan_cache_key(parsed_payload, seed, version, output_format, provider)
+
+
+def _cache_store(cache: Optional[PlanCache], key: Optional[str], plan: SwimPlanResponse) -> None:
+    if cache is not None and key is not None and not plan.is_fallback:
+        cache.set(key, plan)
+
+
+def _generate_parsed(
+    parsed_payload: SwimPlanInput,
+    seed: Optional[int],
+    provider: str,
     *,
-    version: str = "v1",
+    version: str,
+    stream: bool,
+    deadline: Optional[float],
+    output_format: str = "json",
 ) -> SwimPlanResponse:
-    parsed_payload = SwimPlanInput.model_validate(payload)
-
-    if provider == "openai":
-        raise ValueError("OpenAI provider is disabled for now. Use provider='claude'.")
-    if provider == "claude":
-        _request_plan = request_plan_json_claude
-        _request_repair = request_repair_json_claude
-    else:
-        raise ValueError(f"Unknown provider '{provider}'. Use 'claude'.")
+    _request_plan, _request_repair = _resolve_provider(provider)
 
     first_error: Optional[str] = None
+    first_violations: tuple[Violation, ...] = ()
     first_raw = ""
-    v2_spec = build_generation_spec_v2(parsed_payload) if version == "v2" else None
+    v2_spec = _build_spec(parsed_payload, version)
+    labels = _trace_labels(parsed_payload, version, v2_spec)
 
     try:
-        first_raw = _request_plan(parsed_payload, seed, version=version)
-        return _build_valid_plan_from_llm(
+        with span("swim_plan.llm_call", call="plan", **labels), paused():
+            first_raw = _request_plan(
+                parsed_payload,
+                seed,
+                version=version,
+                stream=stream,
+                timeout=_remaining(deadline),
+                output_format=output_format,
+            )
+        plan, locally_repaired = _build_valid_plan_from_llm(
             first_raw,
             parsed_payload,
             seed,
             version=version,
             v2_spec=v2_spec,
+            output_format=output_format,
         )
+        return _outcome(plan, version, "local_repair" if locally_repaired else "first_pass")
+    except StreamAborted as exc:
+        first_raw = exc.partial_text
+        first_error = str(exc)
+        METRICS.issue("plan", exc)
+    except ValidationIssue as exc:
+        first_error = str(exc)
+        first_violations = exc.violations
+        METRICS.issue("plan", exc)
     except Exception as exc:
         first_error = str(exc)
+        METRICS.issue("plan", exc)
+
+    remaining = _remaining(deadline)
+    if remaining is not None and remaining < MIN_REPAIR_BUDGET_S:
+        return _outcome(_deadline_fallback(parsed_payload, seed), version, "fallback")
 
     try:
-        repair_raw = _request_repair(
+        with span("swim_plan.repair", first_error=first_error or "", **labels):
+            with span("swim_plan.llm_call", call="repair", **labels), paused():
+                repair_raw = _request_repair(
+                    parsed_payload,
+                    bad_output=_raw_text(first_raw) or "<empty>",
+                    error_text=first_error or "unknown validation failure",
+                    violations=first_violations,
+                    seed=seed,
+                    version=version,
+                    timeout=remaining,
+                    output_format=output_format,
+                )
+            plan, _ = _build_valid_plan_from_llm(
+                repair_raw,
+                parsed_payload,
+                seed,
+                version=version,
+                v2_spec=v2_spec,
+                output_format=output_format,
+            )
+        return _outcome(plan, version, "repaired")
+    except Exception as exc:
+        METRICS.issue("repair", exc)
+        remaining = _remaining(deadline)
+        if remaining is not None and (isinstance(exc, TimeoutError) or remaining <= 0):
+            return _outcome(_deadline_fallback(parsed_payload, seed), version, "fallback")
+        _failed(version)
+        raise _generation_failed(first_error, exc) from exc
+
+
+def generate_swim_plan(
+    payload: dict,
+    seed: Optional[int] = None,
+    provider: str = "claude",
+    *,
+    version: str = "v1",
+    stream: bool = False,
+    deadline_s: Optional[float] = None,
+    hedge: Optional[HedgePolicy] = None,
+    cache: Optional[PlanCache] = None,
+    output_format: str = "json",
+    profile: Optional[bool] = None,
+) -> SwimPlanResponse:
+    """
+    With deadline_s set, each model call is bounded by the remaining budget and
+    a budget that runs out (or cannot fit the repair call) yields the
+    deterministic fallback plan, flagged with is_fallback, instead of an error.
+
+    With hedge set, the request is raced against the policy's hedge branches on
+    a shared background event loop; see HedgePolicy.
+
+    With cache set, seeded requests are served from and stored into the cache
+    (fallback plans are never stored).
+
+    output_format="dsl" asks the model for the compact line format (see
+    formatter.plan_to_dsl_text) instead of JSON, which cuts output tokens;
+    output_format="tool" forces a tool call whose input schema is LLMPlanDraft,
+    so no free-text JSON is parsed (not combinable with stream).
+
+    profile=True runs the request under cProfile and tracemalloc, with the
+    model calls excluded, and writes a report named after the plan_id to
+    SWIM_PLANNER_PROFILE_DIR; profile=None samples SWIM_PLANNER_PROFILE_RATE of
+    requests. Hedged requests are never profiled.
+    """
+    _check_output_format(output_format, stream)
+    METRICS.install_from_env()
+    if hedge is not None:
+        return HEDGE_LOOP.run(
+            generate_swim_plan_async(
+                payload,
+                seed,
+                provider,
+                version=version,
+                stream=stream,
+                deadline_s=deadline_s,
+                hedge=hedge,
+                cache=cache,
+                output_format=output_format,
+            )
+        )
+
+    with ProfileScope(profile, {"version": version, "provider": provider}) as profiled, span(
+        "swim_plan.generate", version=version, provider=provider, output_format=output_format, stream=stream
+    ):
+        with span("swim_plan.validate_payload"):
+            parsed_payload = SwimPlanInput.model_validate(payload)
+        _resolve_provider(provider)
+        deadline = time.monotonic() + deadline_s if deadline_s is not None else None
+
+        cache_key = _cache_key(cache, parsed_payload, seed, version, output_format, provider)
+        if cache_key is not None:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return _profiled(profiled, _outcome(cached, version, "cache_hit"), "cache_hit")
+
+        plan = _generate_parsed(
             parsed_payload,
-            bad_output=first_raw or "<empty>",
-            error_text=first_error or "unknown validation failure",
-            seed=seed,
+            seed,
+            provider,
             version=version,
+            stream=stream,
+            deadline=deadline,
+            output_format=output_format,
         )
-        return _build_valid_plan_from_llm(
-            repair_raw,
+        _cache_store(cache, cache_key, plan)
+        return _profiled(profiled, plan, "generated")
+
+
+async def _attempt_async(
+    parsed_payload: SwimPlanInput,
+    seed: Optional[int],
+    provider: str,
+    *,
+    version: str,
+    stream: bool,
+    deadline: Optional[float],
+    on_first_attempt: Optional[Callable[[bool, float], None]] = None,
+    output_format: str = "json",
+    record_failure: bool = True,
+) -> BranchResult:
+    # Returns the plan with its outcome label; recording the outcome is left to
+    # the caller so a hedged request is counted once, not once per branch.
+    _request_plan, _request_repair = _resolve_provider(provider, asynchronous=True)
+
+    first_error: Optional[str] = None
+    first_violations: tuple[Violation, ...] = ()
+    first_raw = ""
+    v2_spec = _build_spec(parsed_payload, version)
+    labels = _trace_labels(parsed_payload, version, v2_spec)
+    started = time.monotonic()
+
+    try:
+        with span("swim_plan.llm_call", call="plan", **labels), paused():
+            first_raw = await asyncio.wait_for(
+                _request_plan(
+                    parsed_payload,
+                    seed,
+                    version=version,
+                    stream=stream,
+                    output_format=output_format,
+                ),
+                timeout=_remaining(deadline),
+            )
+        plan, locally_repaired = _build_valid_plan_from_llm(
+            first_raw,
             parsed_payload,
             seed,
             version=version,
             v2_spec=v2_spec,
+            output_format=output_format,
         )
+        if on_first_attempt is not None:
+            on_first_attempt(True, time.monotonic() - started)
+        return plan, "local_repair" if locally_repaired else "first_pass"
+    except StreamAborted as exc:
+        first_raw = exc.partial_text
+        first_error = str(exc)
+        METRICS.issue("plan", exc)
+    except ValidationIssue as exc:
+        first_error = str(exc)
+        first_violations = exc.violations
+        METRICS.issue("plan", exc)
+    except Exception as exc:
+        first_error = str(exc)
+        METRICS.issue("plan", exc)
+
+    if on_first_attempt is not None:
+        on_first_attempt(False, time.monotonic() - started)
+
+    remaining = _remaining(deadline)
+    if remaining is not None and remaining < MIN_REPAIR_BUDGET_S:
+        return _deadline_fallback(parsed_payload, seed), "fallback"
+
+    try:
+        with span("swim_plan.repair", first_error=first_error or "", **labels):
+            with span("swim_plan.llm_call", call="repair", **labels), paused():
+                repair_raw = await asyncio.wait_for(
+                    _request_repair(
+                        parsed_payload,
+                        bad_output=_raw_text(first_raw) or "<empty>",
+                        error_text=first_error or "unknown validation failure",
+                        violations=first_violations,
+                        seed=seed,
+                        version=version,
+                        output_format=output_format,
+                    ),
+                    timeout=remaining,
+                )
+            plan, _ = _build_valid_plan_from_llm(
+                repair_raw,
+                parsed_payload,
+                seed,
+                version=version,
+                v2_spec=v2_spec,
+                output_format=output_format,
+            )
+        return plan, "repaired"
     except Exception as exc:
-        raise ValidationIssue(
-            "Plan generation failed after initial call and one repair attempt. "
-            f"Initial error: {first_error}. Repair error: {exc}"
-        ) from exc
+        METRICS.issue("repair", exc)
+        remaining = _remaining(deadline)
+        if remaining is not None and (isinstance(exc, TimeoutError) or remaining <= 0):
+            return _deadline_fallback(parsed_payload, seed), "fallback"
+        if record_failure:
+            _failed(version)
+        raise _generation_failed(first_error, exc) from exc
+
+
+async def _generate_parsed_async(
+    parsed_payload: SwimPlanInput,
+    seed: Optional[int],
+    provider: str,
+    *,
+    version: str,
+    stream: bool,
+    deadline: Optional[float],
+    output_format: str = "json",
+) -> SwimPlanResponse:
+    plan, outcome = await _attempt_async(
+        parsed_payload,
+        seed,
+        provider,
+        version=version,
+        stream=stream,
+        deadline=deadline,
+        output_format=output_format,
+    )
+    return _outcome(plan, version, outcome)
+
+
+async def _generate_hedged(
+    parsed_payload: SwimPlanInput,
+    seed: Optional[int],
+    provider: str,
+    version: str,
+    stream: bool,
+    deadline: Optional[float],
+    hedge: HedgePolicy,
+    output_format: str,
+) -> SwimPlanResponse:
+    def _run_branch(branch: HedgeBranch, on_first_attempt: Callable[[bool, float], None]):
+        return _attempt_async(
+            parsed_payload,
+            branch.seed_for(seed),
+            provider,
+            version=branch.version,
+            stream=stream,
+            deadline=deadline,
+            on_first_attempt=on_first_attempt,
+            output_format=output_format,
+            record_failure=False,
+        )
+
+    try:
+        plan, outcome = await race_branches(hedge, version, _run_branch)
+    except ValidationIssue:
+        _failed(version)
+        raise
+    return _outcome(plan, version, outcome)
+
+
+async def generate_swim_plan_async(
+    payload: dict,
+    seed: Optional[int] = None,
+    provider: str = "claude",
+    *,
+    version: str = "v1",
+    stream: bool = False,
+    deadline_s: Optional[float] = None,
+    hedge: Optional[HedgePolicy] = None,
+    cache: Optional[PlanCache] = None,
+    output_format: str = "json",
+    profile: Optional[bool] = None,
+) -> SwimPlanResponse:
+    _check_output_format(output_format, stream)
+    METRICS.install_from_env()
+    # Hedge branches interleave on the loop, so pausing for one branch's model
+    # call would hide the other's local work.
+    profile = False if hedge is not None else profile
+    with ProfileScope(profile, {"version": version, "provider": provider}) as profiled, span(
+        "swim_plan.generate", version=version, provider=provider, output_format=output_format, stream=stream
+    ):
+        with span("swim_plan.validate_payload"):
+            parsed_payload = SwimPlanInput.model_validate(payload)
+        _resolve_provider(provider, asynchronous=True)
+        deadline = time.monotonic() + deadline_s if deadline_s is not None else None
+
+        cache_key = _cache_key(cache, parsed_payload, seed, version, output_format, provider)
+        if cache_key is not None:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return _profiled(profiled, _outcome(cached, version, "cache_hit"), "cache_hit")
+
+        if hedge is None:
+            plan = await _generate_parsed_async(
+                parsed_payload,
+                seed,
+                provider,
+                version=version,
+                stream=stream,
+                deadline=deadline,
+                output_format=output_format,
+            )
+        else:
+            plan = await _generate_hedged(parsed_payload, seed, provider, version, stream, deadline, hedge, output_format)
+        _cache_store(cache, cache_key, plan)
+        return _profiled(profiled, plan, "generated")
 
 
-__all__ = ["generate_swim_plan", "plan_to_canonical_text"]
+__all__ = ["generate_swim_plan", "generate_swim_plan_async", "plan_to_canonical_text"]
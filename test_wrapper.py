@@ -1,15 +1,34 @@
 #!/usr/bin/env python3
+"""
+Load harness: drives generate_swim_plan_async over a payload corpus at a fixed
+concurrency (closed loop) or a target request rate (open loop) and reports,
+per (version, archetype, provider), latency percentiles, first-pass validity,
+local-repair rate, repair rate, fallback rate and failure reasons as JSON.
+
+    python test_wrapper.py --provider fake --requests 200 --concurrency 16
+    python -m swim_planner_llm.corpus corpus.jsonl -n 500
+    python test_wrapper.py --corpus corpus.jsonl --rps 5 --versions v1,v2 --output load.json
+"""
 
 from __future__ import annotations
 
+import argparse
+import asyncio
+import contextvars
 import json
+import sys
 import time
+from collections import Counter, defaultdict
 from pathlib import Path
 from typing import Optional
 
-from swim_planner_llm import generate_swim_plan, plan_to_canonical_text
-from swim_planner_llm.models import SwimPlanInput, SwimPlanResponse
-from swim_planner_llm.style_inference import infer_prefer_varied_from_payload
+from swim_planner_llm import generate_swim_plan_async
+from swim_planner_llm.budget import usage_labels
+from swim_planner_llm.corpus import read_corpus
+from swim_planner_llm.llm_client_claude import USAGE
+from swim_planner_llm.models import SwimPlanInput
+from swim_planner_llm.providers import Provider, get_provider, register_provider
+from swim_planner_llm.repair import LOCAL_REPAIRER
 from swim_planner_llm.v2.router import build_generation_spec_v2
 
 
@@ -23,6 +42,10 @@ DEFAULT_SYNTHETIC_PAYLOAD = {
     "historic_sessions": [],
 }
 
+# Per-request record the tap provider writes into; each request runs in its own
+# task, so concurrent requests never share one.
+_CURRENT: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("load_request", default=None)
+
 
 def _load_payload() -> dict:
     file_path = Path("synthetic_payload.json")
@@ -31,130 +54,280 @@ def _load_payload() -> dict:
     return DEFAULT_SYNTHETIC_PAYLOAD
 
 
-def _pattern_count_for_main_set(plan: SwimPlanResponse) -> int:
-    signatures = {
-        (
-            step.kind,
-            step.distance_per_rep_m,
-            step.stroke,
-            step.rest_seconds,
-            step.effort,
-        )
-        for step in plan.sections.main_set.steps
-    }
-    return len(signatures)
+def _load_corpus(path: Optional[Path]) -> list[dict]:
+    if path is None:
+        return [_load_payload()]
+    payloads = read_corpus(path)
+    if not payloads:
+        raise SystemExit(f"corpus {path} is empty")
+    return payloads
+
+
+def _reason(text: str) -> str:
+    # "json parse failed: Expecting ..." -> "json parse failed"; a bare path
+    # prefix keeps its clause: "cd: no steps provided".
+    parts = text.split(":", 2)
+    head = parts[0].strip()
+    if len(parts) > 1 and " " not in head:
+        head = f"{head}:{parts[1]}"
+    return head[:80] or "unknown"
 
 
-def _assert_plan_valid(plan: SwimPlanResponse, prefer_varied: bool) -> None:
-    assert plan.sections.warm_up is not None
-    assert plan.sections.main_set is not None
-    assert plan.sections.cool_down is not None
+def _tap(inner: Provider) -> Provider:
+    """Wraps a provider so every model call is attributed to the current request."""
 
-    for section in [plan.sections.warm_up, plan.sections.main_set, plan.sections.cool_down]:
-        step_sum = sum(s.step_distance_m for s in section.steps)
-        assert step_sum == section.section_distance_m
+    async def request_plan_async(*args, **kwargs):
+        record = _CURRENT.get()
+        if record is not None:
+            record["plan_calls"] += 1
+        return await inner.request_plan_async(*args, **kwargs)
 
-    section_total = (
-        plan.sections.warm_up.section_distance_m
-        + plan.sections.main_set.section_distance_m
-        + plan.sections.cool_down.section_distance_m
+    async def request_repair_async(payload, bad_output, error_text, seed, *, violations=(), **kwargs):
+        record = _CURRENT.get()
+        if record is not None:
+            record["repair_calls"] += 1
+            record["first_pass_reason"] = violations[0].code if violations else _reason(error_text)
+        return await inner.request_repair_async(payload, bad_output, error_text, seed, violations=violations, **kwargs)
+
+    return Provider(
+        name=f"load-tap-{inner.name}",
+        request_plan=inner.request_plan,
+        request_repair=inner.request_repair,
+        request_plan_async=request_plan_async,
+        request_repair_async=request_repair_async,
     )
-    assert section_total == plan.estimated_distance_m
 
-    if not prefer_varied:
-        assert _pattern_count_for_main_set(plan) <= 1
-    else:
-        assert len(plan.sections.main_set.steps) >= 2
 
-    for section in [plan.sections.warm_up, plan.sections.main_set, plan.sections.cool_down]:
-        for step in section.steps:
-            assert step.reps > 0
-            assert step.distance_per_rep_m > 0
+def _tap_local_repair() -> None:
+    """Marks the current request when the local repairer fixes its first-pass plan."""
+    inner = LOCAL_REPAIRER.try_repair
 
+    def try_repair(*args, **kwargs):
+        repaired = inner(*args, **kwargs)
+        record = _CURRENT.get()
+        if repaired is not None and record is not None and record["repair_calls"] == 0:
+            record["local_repair"] = True
+        return repaired
 
-def _run_provider(
-    provider: str,
+    LOCAL_REPAIRER.try_repair = try_repair
+
+
+def _archetype(payload: SwimPlanInput, version: str) -> str:
+    spec = build_generation_spec_v2(payload) if version == "v2" else None
+    return usage_labels(payload, version, "plan", spec)["archetype"]
+
+
+async def _one(
     payload: dict,
-    prefer_varied: bool,
-    *,
     version: str,
-    seed: int = 42,
-) -> tuple[Optional[SwimPlanResponse], float]:
-    label = f"{provider.upper()} {version.upper()}"
-    print(f"\n{'=' * 60}")
-    print(f"  {label}")
-    print(f"{'=' * 60}")
+    seed: int,
+    provider: str,
+    tap_name: str,
+    output_format: str,
+    deadline_s: Optional[float],
+    scheduled_at: Optional[float] = None,
+) -> dict:
+    parsed = SwimPlanInput.model_validate(payload)
+    record = {
+        "version": version,
+        "archetype": _archetype(parsed, version),
+        "provider": provider,
+        "plan_calls": 0,
+        "repair_calls": 0,
+        "local_repair": False,
+        "first_pass_reason": None,
+        "outcome": "ok",
+        "failure_reason": None,
+    }
+    _CURRENT.set(record)
+    started = time.perf_counter()
     try:
-        t0 = time.perf_counter()
-        plan = generate_swim_plan(payload, seed=seed, provider=provider, version=version)
-        elapsed = time.perf_counter() - t0
-        if version == "v1":
-            _assert_plan_valid(plan, prefer_varied)
-        else:
-            assert "—" in (plan.sections.main_set.title or "")
-        print(f"  distance : {plan.estimated_distance_m}m")
-        print(f"  duration : {plan.duration_minutes} min")
-        print(f"  main steps: {len(plan.sections.main_set.steps)}")
-        print(f"  main title: {plan.sections.main_set.title}")
-        print(f"  time     : {elapsed:.2f}s")
-        print()
-        print(plan_to_canonical_text(plan))
-        return plan, elapsed
+        plan = await generate_swim_plan_async(
+            payload,
+            seed,
+            tap_name,
+            version=version,
+            deadline_s=deadline_s,
+            output_format=output_format,
+        )
+        if plan.is_fallback:
+            record["outcome"] = "fallback"
     except Exception as exc:
-        print(f"  ERROR: {exc}")
-        return None, 0.0
-
-
-def _compare(
-    v1_plan: Optional[SwimPlanResponse],
-    v2_plan: Optional[SwimPlanResponse],
-    v1_elapsed: float,
-    v2_elapsed: float,
-) -> None:
-    print(f"\n{'=' * 60}")
-    print("  COMPARISON")
-    print(f"{'=' * 60}")
-
-    if v1_plan is None or v2_plan is None:
-        print("  Cannot compare — v1 or v2 failed.")
-        return
-
-    distance_match = v1_plan.estimated_distance_m == v2_plan.estimated_distance_m
-    main_steps_match = len(v1_plan.sections.main_set.steps) == len(v2_plan.sections.main_set.steps)
-    faster = "v1" if v1_elapsed < v2_elapsed else "v2"
-    time_diff = abs(v1_elapsed - v2_elapsed)
-
-    print(f"  v1 distance : {v1_plan.estimated_distance_m}m")
-    print(f"  v2 distance : {v2_plan.estimated_distance_m}m")
-    print(f"  Distance match   : {'yes' if distance_match else 'no'}")
-    print()
-    print(f"  v1 main steps : {len(v1_plan.sections.main_set.steps)}")
-    print(f"  v2 main steps : {len(v2_plan.sections.main_set.steps)}")
-    print(f"  Main step count match : {'yes' if main_steps_match else 'no'}")
-    print()
-    print(f"  v1 main title : {v1_plan.sections.main_set.title}")
-    print(f"  v2 main title : {v2_plan.sections.main_set.title}")
-    print()
-    print(f"  v1 time : {v1_elapsed:.2f}s")
-    print(f"  v2 time : {v2_elapsed:.2f}s")
-    print(f"  Faster  : {faster} by {time_diff:.2f}s")
-
-
-def main() -> None:
-    payload = _load_payload()
-    parsed_payload = SwimPlanInput.model_validate(payload)
-    prefer_varied = infer_prefer_varied_from_payload(parsed_payload)
-    v2_spec = build_generation_spec_v2(parsed_payload)
-
-    print(f"\nInput  : {payload['session_requested']}")
-    print(f"Style  : {'varied' if prefer_varied else 'straightforward'}")
-    print(f"v2 pick : {v2_spec.archetype.display_name}")
-
-    v1_plan, v1_elapsed = _run_provider("claude", payload, prefer_varied, version="v1")
-    v2_plan, v2_elapsed = _run_provider("claude", payload, prefer_varied, version="v2")
-
-    _compare(v1_plan, v2_plan, v1_elapsed, v2_elapsed)
+        cause = exc.__cause__ or exc
+        record["outcome"] = "failed"
+        record["failure_reason"] = f"{type(cause).__name__}: {_reason(str(cause))}"
+    finished = time.perf_counter()
+    # Open loop: latency runs from the scheduled release, so time spent waiting
+    # behind the concurrency cap counts (no coordinated omission).
+    record["latency_s"] = finished - (scheduled_at if scheduled_at is not None else started)
+    record["service_s"] = finished - started
+    return record
+
+
+async def _drive(
+    jobs: list[tuple[dict, str, int]],
+    *,
+    provider: str,
+    tap_name: str,
+    concurrency: int,
+    rps: Optional[float],
+    output_format: str,
+    deadline_s: Optional[float],
+) -> list[dict]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(job: tuple[dict, str, int], start_at: Optional[float]) -> dict:
+        if start_at is not None:
+            delay = start_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        async with semaphore:
+            return await _one(*job, provider, tap_name, output_format, deadline_s, start_at)
+
+    t0 = time.perf_counter()
+    if rps:
+        # Open loop: request i is released at i / rps whether or not earlier
+        # ones finished (up to the concurrency cap).
+        tasks = [asyncio.create_task(run(job, t0 + idx / rps)) for idx, job in enumerate(jobs)]
+    else:
+        tasks = [asyncio.create_task(run(job, None)) for job in jobs]
+    return list(await asyncio.gather(*tasks))
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    pos = (len(sorted_values) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def _summarize(records: list[dict]) -> dict:
+    n = len(records)
+    latencies = sorted(r["latency_s"] * 1000 for r in records)
+    service = sorted(r["service_s"] * 1000 for r in records)
+    outcomes = Counter(r["outcome"] for r in records)
+    first_pass = [r for r in records if r["outcome"] == "ok" and r["repair_calls"] == 0]
+    local_repaired = sum(1 for r in first_pass if r["local_repair"])
+    first_pass_valid = len(first_pass) - local_repaired
+    return {
+        "requests": n,
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 0.50), 2),
+            "p95": round(_percentile(latencies, 0.95), 2),
+            "p99": round(_percentile(latencies, 0.99), 2),
+            "mean": round(sum(latencies) / n, 2) if n else 0.0,
+            "max": round(latencies[-1], 2) if latencies else 0.0,
+        },
+        "service_ms": {
+            "p50": round(_percentile(service, 0.50), 2),
+            "p95": round(_percentile(service, 0.95), 2),
+            "p99": round(_percentile(service, 0.99), 2),
+        },
+        "first_pass_valid_rate": round(first_pass_valid / n, 4) if n else 0.0,
+        "local_repair_rate": round(local_repaired / n, 4) if n else 0.0,
+        "repair_rate": round(sum(1 for r in records if r["repair_calls"]) / n, 4) if n else 0.0,
+        "fallback_rate": round(outcomes["fallback"] / n, 4) if n else 0.0,
+        "failure_rate": round(outcomes["failed"] / n, 4) if n else 0.0,
+        "first_pass_failure_reasons": dict(
+            Counter(r["first_pass_reason"] for r in records if r["first_pass_reason"]).most_common()
+        ),
+        "failure_reasons": dict(Counter(r["failure_reason"] for r in records if r["failure_reason"]).most_common()),
+    }
+
+
+def build_report(records: list[dict], elapsed_s: float, config: dict, before: dict) -> dict:
+    groups: dict[tuple[str, str, str], list[dict]] = defaultdict(list)
+    for record in records:
+        groups[(record["version"], record["archetype"], record["provider"])].append(record)
+
+    local_repair = LOCAL_REPAIRER.snapshot()
+    usage = USAGE.snapshot()
+    return {
+        "config": config,
+        "elapsed_s": round(elapsed_s, 3),
+        "achieved_rps": round(len(records) / elapsed_s, 3) if elapsed_s > 0 else 0.0,
+        "overall": _summarize(records),
+        "groups": [
+            {"version": version, "archetype": archetype, "provider": provider, **_summarize(items)}
+            for (version, archetype, provider), items in sorted(groups.items())
+        ],
+        "local_repair": {
+            key: local_repair[key] - before["local_repair"][key] for key in ("attempts", "fixed", "escalated")
+        },
+        "tokens": {
+            key: usage[key] - before["usage"][key] for key in ("calls", "input_tokens", "output_tokens")
+        },
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Concurrent end-to-end load test for generate_swim_plan.")
+    parser.add_argument("--provider", default="fake", help="registered provider name (default: fake)")
+    parser.add_argument("--corpus", type=Path, help="JSONL payload corpus (default: synthetic_payload.json or built-in)")
+    parser.add_argument("--versions", default="v1,v2")
+    parser.add_argument("--requests", type=int, default=100, help="total requests (corpus x versions is cycled)")
+    parser.add_argument("--concurrency", type=int, default=8, help="max requests in flight")
+    parser.add_argument("--rps", type=float, help="open-loop target request rate (default: closed loop)")
+    parser.add_argument("--output-format", default="json", choices=("json", "dsl", "tool"))
+    parser.add_argument("--deadline", type=float, help="per-request deadline_s")
+    parser.add_argument("--seed", type=int, default=0, help="request i uses seed + i")
+    parser.add_argument("--output", type=Path, help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    if args.concurrency < 1:
+        raise SystemExit("--concurrency must be >= 1")
+    versions = [v.strip() for v in args.versions.split(",") if v.strip()]
+    corpus = _load_corpus(args.corpus)
+    combos = [(payload, version) for payload in corpus for version in versions]
+    jobs = [(*combos[idx % len(combos)], args.seed + idx) for idx in range(args.requests)]
+
+    tap = register_provider(_tap(get_provider(args.provider)), replace=True)
+    _tap_local_repair()
+    before = {"local_repair": LOCAL_REPAIRER.snapshot(), "usage": USAGE.snapshot()}
+    started = time.perf_counter()
+    records = asyncio.run(
+        _drive(
+            jobs,
+            provider=args.provider,
+            tap_name=tap.name,
+            concurrency=args.concurrency,
+            rps=args.rps,
+            output_format=args.output_format,
+            deadline_s=args.deadline,
+        )
+    )
+    elapsed = time.perf_counter() - started
+
+    config = {
+        "provider": args.provider,
+        "corpus": str(args.corpus) if args.corpus else None,
+        "corpus_size": len(corpus),
+        "versions": versions,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "rps": args.rps,
+        "output_format": args.output_format,
+        "deadline_s": args.deadline,
+    }
+    result = build_report(records, elapsed, config, before)
+    report = json.dumps(result, indent=2)
+    if args.output is not None:
+        args.output.write_text(report + "\n", encoding="utf-8")
+    else:
+        print(report)
+
+    overall = result["overall"]
+    print(
+        f"{overall['requests']} requests in {elapsed:.2f}s: p50 {overall['latency_ms']['p50']}ms, "
+        f"p99 {overall['latency_ms']['p99']}ms, first-pass valid {overall['first_pass_valid_rate']:.1%}, "
+        f"local repair {overall['local_repair_rate']:.1%}, "
+        f"repair {overall['repair_rate']:.1%}, failed {overall['failure_rate']:.1%}",
+        file=sys.stderr,
+    )
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import json
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from swim_planner_llm.batches import BatchJob, LocalBatchEndpoint
+from swim_planner_llm.corpus import sample_corpus
+from swim_planner_llm.fake_provider import _render, synthesize_plan
+from swim_planner_llm.models import SwimPlanInput, SwimPlanResponse
+
+PAYLOAD = next(iter(sample_corpus(1, seed=2)))["payload"]
+GOOD = _render(synthesize_plan(SwimPlanInput.model_validate(PAYLOAD), "v1", random.Random(0)), "json")
+
+
+def _message(text: str) -> SimpleNamespace:
+    return SimpleNamespace(content=[SimpleNamespace(text=text)], usage=None, stop_reason="end_turn")
+
+
+class _Endpoint(LocalBatchEndpoint):
+    """First plan request comes back unparseable; repairs succeed. Optionally loses the first submit."""
+
+    def __init__(self, crash_on_submit: bool = False) -> None:
+        super().__init__(self._create)
+        self.plan_outputs = ["not json", GOOD]
+        self.submitted: list[list[str]] = []
+        self.crash_on_submit = crash_on_submit
+
+    def _create(self, **params) -> SimpleNamespace:
+        content = params["messages"][0]["content"]
+        text = content if isinstance(content, str) else "".join(block["text"] for block in content)
+        if "PREVIOUS OUTPUT" in text:
+            return _message(GOOD)
+        return _message(self.plan_outputs.pop(0))
+
+    def submit(self, requests: list[dict]) -> str:
+        batch_id = super().submit(requests)
+        self.submitted.append([request["custom_id"] for request in requests])
+        if self.crash_on_submit:
+            self.crash_on_submit = False
+            raise KeyboardInterrupt("process died before the batch id was saved")
+        return batch_id
+
+
+def _assert_done(job: BatchJob, endpoint: _Endpoint) -> None:
+    results = job.run(poll_interval_s=0)
+    assert job.stage == "done"
+    assert all(isinstance(result, SwimPlanResponse) for result in results)
+    first, second = job.state["items"]
+    assert endpoint.submitted == [[first, second], [first]]
+
+
+def test_plan_then_repair_then_done(tmp_path) -> None:
+    endpoint = _Endpoint()
+    job = BatchJob.create(tmp_path / "job.json", [PAYLOAD, PAYLOAD], endpoint=endpoint)
+
+    assert job.step() is False
+    assert job.stage == "plan_submitted"
+    assert job.step() is False
+    assert job.stage == "repair_submitted"
+    assert job.step() is True
+    _assert_done(job, endpoint)
+
+
+def test_resume_from_saved_state(tmp_path) -> None:
+    path = tmp_path / "job.json"
+    endpoint = _Endpoint()
+    BatchJob.create(path, [PAYLOAD, PAYLOAD], endpoint=endpoint).step()
+
+    assert json.loads(path.read_text())["stage"] == "plan_submitted"
+    _assert_done(BatchJob.load(path, endpoint=endpoint), endpoint)
+
+
+def test_resume_adopts_batch_submitted_before_crash(tmp_path) -> None:
+    path = tmp_path / "job.json"
+    endpoint = _Endpoint(crash_on_submit=True)
+    with pytest.raises(KeyboardInterrupt):
+        BatchJob.create(path, [PAYLOAD, PAYLOAD], endpoint=endpoint).step()
+
+    state = json.loads(path.read_text())
+    assert state["stage"] == "plan_submitting" and state["plan_batch_id"] is None
+
+    job = BatchJob.load(path, endpoint=endpoint)
+    job.step()
+    assert job.stage == "plan_submitted"
+    _assert_done(job, endpoint)
+
+
+def test_resume_resubmits_when_nothing_was_accepted(tmp_path) -> None:
+    path = tmp_path / "job.json"
+    endpoint = _Endpoint()
+    job = BatchJob.create(path, [PAYLOAD, PAYLOAD], endpoint=endpoint)
+    job.state["stage"] = "plan_submitting"
+    job.state["submitting"] = {"custom_ids": list(job.state["items"]), "started_at": 0.0}
+    job._save()
+
+    _assert_done(BatchJob.load(path, endpoint=endpoint), endpoint)
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import random
+
+import pytest
+
+from swim_planner_llm.corpus import sample_corpus
+from swim_planner_llm.dsl import parse_plan_dsl
+from swim_planner_llm.fake_provider import synthesize_plan
+from swim_planner_llm.formatter import DSL_GEAR, DSL_SECTIONS, plan_to_dsl_text
+from swim_planner_llm.models import LLMPlanDraft, SwimPlanInput, SwimPlanResponse
+
+PAYLOADS = [SwimPlanInput.model_validate(record["payload"]) for record in sample_corpus(40, seed=11)]
+
+
+def _plan_sections(plan: SwimPlanResponse) -> dict:
+    sections = {}
+    for attr, _, _, _ in DSL_SECTIONS:
+        section = getattr(plan.sections, attr)
+        steps = []
+        for step in section.steps:
+            data = step.model_dump()
+            # The DSL writes gear flags set to False like None.
+            data.update({flag: data[flag] or None for flag in DSL_GEAR})
+            steps.append(data)
+        sections[attr] = {"title": section.title, "steps": steps}
+    return sections
+
+
+def _draft_sections(draft: LLMPlanDraft) -> dict:
+    sections = {}
+    for attr, _, default_title, id_prefix in DSL_SECTIONS:
+        section = getattr(draft.sections, attr)
+        steps = []
+        for idx, step in enumerate(section.steps, start=1):
+            data = step.model_dump()
+            data["step_id"] = data["step_id"] or f"{id_prefix}-{idx}"
+            steps.append(data)
+        # A bare header means the default title, filled in by normalization.
+        sections[attr] = {"title": section.title or default_title, "steps": steps}
+    return sections
+
+
+def _round_trip(plan: SwimPlanResponse) -> None:
+    draft = parse_plan_dsl(plan_to_dsl_text(plan))
+    assert _draft_sections(draft) == _plan_sections(plan)
+
+
+@pytest.mark.parametrize("version", ["v1", "v2"])
+def test_synthesized_plans_round_trip(version: str) -> None:
+    for idx, payload in enumerate(PAYLOADS):
+        _round_trip(synthesize_plan(payload, version, random.Random(idx)))
+
+
+@pytest.mark.parametrize(
+    "description",
+    [
+        "split: hold even 50s",
+        "Steady swim | split: faster second half",
+        "SPLIT: shouted",
+        "\\split: already escaped",
+        "Easy swim |",
+        "| leading pipe",
+        "a || b | c",
+        "ends in a backslash \\",
+    ],
+)
+@pytest.mark.parametrize("split_instruction", [None, "Faster second half.", "first | second \\ half"])
+def test_escaped_text_round_trips(description: str, split_instruction: str | None) -> None:
+    plan = synthesize_plan(PAYLOADS[0], "v1", random.Random(0))
+    step = plan.sections.main_set.steps[0]
+    step.description = description
+    step.split_instruction = split_instruction
+    _round_trip(plan)